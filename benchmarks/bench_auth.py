@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark del costo de autenticar cada petición (dependencia get_current_user)
+Uso: python benchmarks/bench_auth.py [--calls 50000] [--revoked 1000]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.security import HTTPAuthorizationCredentials
+from src.auth import security
+from src.auth.jwt_handler import JWTHandler
+from src.auth.revocation import InMemoryRevocationList
+from src.models.user import UserResponse, UserRole
+
+def build_user() -> UserResponse:
+    return UserResponse(
+        user_id="user_bench",
+        email="bench@example.com",
+        phone="+573001234567",
+        balance=500000.0,
+        notification_preference="email",
+        role=UserRole.CLIENT,
+        created_at="2025-01-01T00:00:00",
+        updated_at="2025-01-01T00:00:00"
+    )
+
+def dependency_us(handler: JWTHandler, token: str, calls: int) -> float:
+    """Tiempo por llamada a get_current_user con el handler indicado (sin red ni FastAPI)"""
+    security.jwt_handler = handler
+    request = SimpleNamespace(state=SimpleNamespace())
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+    async def run():
+        started = time.perf_counter()
+        for _ in range(calls):
+            await security.get_current_user(request, credentials)
+        return time.perf_counter() - started
+
+    return asyncio.run(run()) / calls * 1_000_000
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la autenticación por petición")
+    parser.add_argument("--calls", type=int, default=50000)
+    parser.add_argument("--revoked", type=int, default=1000, help="Entradas en la lista de revocación")
+    args = parser.parse_args()
+
+    uncached = JWTHandler(revocations=InMemoryRevocationList(), cache_size=0)
+    token = uncached.create_access_token(build_user())
+    cached = JWTHandler(revocations=InMemoryRevocationList())
+
+    # Lista de revocación con entradas de otros tokens y usuarios (se consulta en cada acierto)
+    revoked = InMemoryRevocationList()
+    for index in range(args.revoked):
+        revoked.revoke_token(f"jti_{index}", time.time() + 1800)
+        revoked.revoke_user(f"user_{index}", time.time())
+    cached_with_revocations = JWTHandler(revocations=revoked)
+
+    without_cache = dependency_us(uncached, token, args.calls)
+    with_cache = dependency_us(cached, token, args.calls)
+    with_revocations = dependency_us(cached_with_revocations, token, args.calls)
+
+    print(f"📊 {args.calls} peticiones por medición")
+    print(f"   Sin caché (decode + HMAC):        {without_cache:6.2f} µs")
+    print(f"   Con caché:                        {with_cache:6.2f} µs")
+    print(f"   Con caché y {args.revoked} revocaciones: {with_revocations:6.2f} µs")
+    print(f"   Aceleración:                      {without_cache / with_cache:6.1f}x")
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Benchmark de compresión de respuestas: bytes en la red y costo de CPU por tamaño de payload
+Uso: python benchmarks/bench_compression.py [--sizes 10,100,1000,10000] [--repeat 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+import zlib
+from typing import Callable, List, Tuple
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.api.middleware import brotli
+from src.api.responses import dumps
+from benchmarks.bench_serialization import build_rows
+
+def codecs() -> List[Tuple[str, Callable[[bytes], bytes]]]:
+    """Codificaciones a comparar (brotli solo si está instalado)"""
+    available = [
+        (f"gzip-{level}", lambda body, level=level: zlib.compress(body, level, wbits=31))
+        for level in (1, 6, 9)
+    ]
+    if brotli is not None:
+        available += [
+            (f"br-{quality}", lambda body, quality=quality: brotli.compress(body, quality=quality))
+            for quality in (1, 5, 11)
+        ]
+    return available
+
+def measure(function: Callable[[bytes], bytes], body: bytes, repeat: int) -> Tuple[int, float]:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        compressed = function(body)
+        best = min(best, time.perf_counter() - started)
+    return len(compressed), best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de compresión de respuestas")
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="Filas por payload, separadas por coma")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"📊 Transacciones serializadas (mejor de {args.repeat}, brotli: {'sí' if brotli else 'no'})")
+    print(f"   {'filas':>6} {'codec':>8} {'bytes':>10} {'ratio':>7} {'ms':>8}")
+    for rows in (int(size) for size in args.sizes.split(",")):
+        body = dumps(build_rows(rows))
+        print(f"   {rows:>6} {'plano':>8} {len(body):>10} {1:>7.2f} {0:>8.2f}")
+        for name, function in codecs():
+            size, seconds = measure(function, body, args.repeat)
+            print(f"   {rows:>6} {name:>8} {size:>10} {len(body) / size:>7.2f} {seconds * 1000:>8.2f}")
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark del costo de registrar métricas por petición (objetivo: pocos microsegundos)
+Uso: python benchmarks/bench_metrics.py [--calls 200000]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.api.middleware import MetricsMiddleware
+from src.metrics import MetricsRegistry, observe_db
+
+def per_call_us(function, calls: int) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - started) / calls * 1_000_000
+
+class FakeDB:
+    def get_item_plain(self, table_name: str):
+        return {"id": 1}
+
+    @observe_db("get_item")
+    def get_item(self, table_name: str):
+        return {"id": 1}
+
+async def bare_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+def middleware_us(app, calls: int) -> float:
+    """Tiempo por petición ASGI mínima (sin red ni FastAPI)"""
+    scope = {"type": "http", "method": "GET", "path": "/api/v1/funds", "headers": []}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    async def run():
+        started = time.perf_counter()
+        for _ in range(calls):
+            await app(dict(scope), receive, send)
+        return time.perf_counter() - started
+
+    return asyncio.run(run()) / calls * 1_000_000
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del registro de métricas")
+    parser.add_argument("--calls", type=int, default=200000)
+    args = parser.parse_args()
+
+    registry = MetricsRegistry(multiproc_dir="")
+    histogram = registry.histogram("bench_seconds", "Bench", ("method", "route", "status"))
+    counter = registry.counter("bench_total", "Bench", ("operation", "table"))
+    db = FakeDB()
+
+    observe = per_call_us(lambda: histogram.observe(0.012, "GET", "/api/v1/funds", "200"), args.calls)
+    inc = per_call_us(lambda: counter.inc("get_item", "funds"), args.calls)
+    db_overhead = per_call_us(lambda: db.get_item("funds"), args.calls) - \
+        per_call_us(lambda: db.get_item_plain("funds"), args.calls)
+    request_overhead = middleware_us(MetricsMiddleware(bare_app), args.calls // 10) - \
+        middleware_us(bare_app, args.calls // 10)
+
+    print(f"📊 {args.calls} llamadas por medición")
+    print(f"   Histogram.observe:              {observe:6.2f} µs")
+    print(f"   Counter.inc:                    {inc:6.2f} µs")
+    print(f"   observe_db (sobrecosto):        {db_overhead:6.2f} µs")
+    print(f"   MetricsMiddleware (sobrecosto): {request_overhead:6.2f} µs")
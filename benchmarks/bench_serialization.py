@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark de serialización de listas grandes: validación completa vs camino rápido
+Uso: python benchmarks/bench_serialization.py [--rows 10000] [--repeat 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+from decimal import Decimal
+from typing import List
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from src.api.responses import FastJSONResponse, orjson
+from src.models.transaction import TransactionResponse
+from src.utils import construct_many
+
+def build_rows(count: int) -> List[dict]:
+    """Genero filas como las devuelve DynamoDB (números en Decimal)"""
+    return [
+        {
+            "transaction_id": f"txn_{i}",
+            "user_id": f"user_{i % 500}",
+            "type": "subscription" if i % 3 else "cancellation",
+            "fund_id": "FPV_BTG_PACTUAL_RECAUDADORA",
+            "amount": Decimal("75000"),
+            "balance_before": Decimal("500000"),
+            "balance_after": Decimal("425000"),
+            "status": "completed",
+            "created_at": "2025-01-01T00:00:00"
+        }
+        for i in range(count)
+    ]
+
+def validated_path(rows: List[dict]) -> bytes:
+    """Camino anterior: modelos validados en el servicio, revalidados con el response_model y jsonable_encoder"""
+    models = [TransactionResponse(**row) for row in rows]
+    adapter = TypeAdapter(List[TransactionResponse])
+    revalidated = adapter.validate_python([model.model_dump() for model in models])
+    return JSONResponse(jsonable_encoder(revalidated)).body
+
+def fast_path(rows: List[dict]) -> bytes:
+    """Camino rápido: construcción confiable y FastJSONResponse"""
+    return FastJSONResponse(construct_many(TransactionResponse, rows)).body
+
+def measure(function, rows: List[dict], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(rows)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de serialización de respuestas")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = build_rows(args.rows)
+    validated = measure(validated_path, rows, args.repeat)
+    fast = measure(fast_path, rows, args.repeat)
+
+    print(f"📊 {args.rows} filas (mejor de {args.repeat}, encoder: {'orjson' if orjson else 'json'})")
+    print(f"   Validación completa: {validated * 1000:8.1f} ms")
+    print(f"   Camino rápido:       {fast * 1000:8.1f} ms")
+    print(f"   Mejora:              {validated / fast:8.1f}x")
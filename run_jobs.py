@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Script para ejecutar los jobs por lotes del sistema
+Uso: python run_jobs.py <job> [opciones]
+"""
+
+import argparse
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+def run_ledger_checkpoints(args):
+    """Construyo incrementalmente los checkpoints del ledger de saldos"""
+    from src.services.ledger_service import ledger_service
+
+    summary = ledger_service.build_checkpoints(args.user_id)
+    print(f"✅ Checkpoints generados para {summary['users']} usuarios:")
+    print(f"   Checkpoints nuevos: {summary['checkpoints_written']}")
+    print(f"   Inconsistencias de saldo: {summary['mismatches']}")
+    return summary
+
+def run_rollups_backfill(args):
+    """Recalculo los agregados diarios de transacciones"""
+    from src.services.rollup_service import rollup_service
+
+    summary = rollup_service.backfill(args.date_from, args.date_to)
+    print(f"✅ Agregados recalculados:")
+    print(f"   Transacciones procesadas: {summary['transactions']} ({summary['archived']} del histórico archivado)")
+    print(f"   Agregados escritos: {summary['rollups_written']}")
+    return summary
+
+def run_portfolio_rebuild(args):
+    """Reconstruyo los portafolios materializados desde usuarios y suscripciones"""
+    from src.services.portfolio_service import portfolio_service
+
+    summary = portfolio_service.rebuild_all(args.user_id)
+    print(f"✅ Portafolios reconstruidos:")
+    print(f"   Usuarios: {summary['users']}")
+    print(f"   Posiciones activas: {summary['positions']}")
+    return summary
+
+def run_archive(args):
+    """Muevo a la capa fría los registros antiguos"""
+    from src.services.archive_service import archive_service, ARCHIVABLE_TABLES
+
+    tables = [args.table] if args.table else list(ARCHIVABLE_TABLES)
+    for table_name in tables:
+        summary = archive_service.archive_table(table_name, args.horizon_days)
+        print(f"✅ {table_name}: {summary['archived']} registros archivados en {summary['partitions']} particiones")
+        if summary['skipped']:
+            print(f"   {summary['skipped']} transacciones esperan un checkpoint del ledger que las cubra")
+
+def run_dispatch_notifications(args):
+    """Envío las notificaciones que quedaron pendientes en la tabla"""
+    from src.notifications.notification_manager import notification_manager
+
+    enqueued = notification_manager.drain_pending()
+    notification_manager.wait_idle()
+    notification_manager.stop()
+    stats = notification_manager.stats()
+    print(f"✅ Notificaciones procesadas: {enqueued}")
+    print(f"   Enviadas: {stats['sent']}")
+    print(f"   Fallidas: {stats['failed']}")
+    return stats
+
+def run_retry_notifications(args):
+    """Reencolo las notificaciones fallidas cuyo reintento ya venció"""
+    from src.notifications.notification_manager import notification_manager
+    from src.notifications.retry_scheduler import retry_scheduler
+
+    requeued = retry_scheduler.run_until_empty()
+    notification_manager.wait_idle()
+    notification_manager.stop()
+    stats = notification_manager.stats()
+    print(f"✅ Reintentos encolados: {requeued}")
+    print(f"   Enviadas: {stats['sent']}")
+    print(f"   Fallidas: {stats['failed']}")
+    return stats
+
+def build_parser():
+    """Defino los jobs disponibles"""
+    parser = argparse.ArgumentParser(description="Jobs por lotes de BTG Pactual Funds API")
+    subparsers = parser.add_subparsers(dest="job", required=True)
+
+    ledger = subparsers.add_parser("ledger-checkpoints", help="Construir checkpoints del ledger de saldos")
+    ledger.add_argument("--user-id", help="Procesar solo este usuario")
+    ledger.set_defaults(func=run_ledger_checkpoints)
+
+    rollups = subparsers.add_parser("rollups-backfill", help="Recalcular agregados diarios de transacciones")
+    rollups.add_argument("--date-from", help="Fecha inicial (YYYY-MM-DD)")
+    rollups.add_argument("--date-to", help="Fecha final inclusive (YYYY-MM-DD)")
+    rollups.set_defaults(func=run_rollups_backfill)
+
+    portfolio = subparsers.add_parser("portfolio-rebuild", help="Reconstruir los portafolios materializados")
+    portfolio.add_argument("--user-id", help="Procesar solo este usuario")
+    portfolio.set_defaults(func=run_portfolio_rebuild)
+
+    archive = subparsers.add_parser("archive", help="Archivar transacciones y notificaciones antiguas")
+    archive.add_argument("--table", choices=["transactions", "notifications"], help="Archivar solo esta tabla")
+    archive.add_argument("--horizon-days", type=int, help="Antigüedad mínima en días (por defecto ARCHIVE_HORIZON_DAYS)")
+    archive.set_defaults(func=run_archive)
+
+    dispatch = subparsers.add_parser("dispatch-notifications", help="Enviar las notificaciones pendientes")
+    dispatch.set_defaults(func=run_dispatch_notifications)
+
+    retry = subparsers.add_parser("retry-notifications", help="Reintentar las notificaciones fallidas vencidas")
+    retry.set_defaults(func=run_retry_notifications)
+
+    return parser
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    print(f"🔧 Ejecutando job {args.job}...")
+    try:
+        args.func(args)
+    except Exception as e:
+        print(f"❌ Error ejecutando {args.job}: {e}")
+        sys.exit(1)
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from starlette.types import ASGIApp, Message, Scope
+from src.config import settings
+from src.models.batch import BatchSubRequest, BatchSubResponse
+
+logger = logging.getLogger(__name__)
+
+async def call_asgi(app: ASGIApp, scope: Scope, body: bytes, timeout_seconds: float) -> Tuple[int, Dict[str, str], bytes]:
+    """Ejecuto una petición contra la app ASGI en memoria y junto la respuesta completa"""
+    status = 500
+    headers: Dict[str, str] = {}
+    chunks: List[bytes] = []
+    finished = asyncio.Event()
+    request_sent = False
+
+    async def receive() -> Message:
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # El "cliente" se desconecta solo cuando la respuesta terminó
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: Message) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            headers.update((name.decode("latin-1").lower(), value.decode("latin-1")) for name, value in message.get("headers", []))
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                finished.set()
+
+    await asyncio.wait_for(app(scope, receive, send), timeout_seconds)
+    return status, headers, b"".join(chunks)
+
+def _build_scope(parent: Scope, sub_request: BatchSubRequest, authorization: Optional[str],
+                 current_user: dict, has_body: bool) -> Scope:
+    """Armo el scope de la sub-petición heredando conexión y credenciales del lote"""
+    path, _, query = sub_request.path.partition("?")
+    headers = [(b"accept", b"application/json")]
+    if authorization:
+        headers.append((b"authorization", authorization.encode("latin-1")))
+    if has_body:
+        headers.append((b"content-type", b"application/json"))
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": sub_request.method,
+        "scheme": parent.get("scheme", "http"),
+        "server": parent.get("server"),
+        "client": parent.get("client"),
+        "root_path": parent.get("root_path", ""),
+        "path": path,
+        "raw_path": path.encode("utf-8"),
+        "query_string": query.encode("utf-8"),
+        "headers": headers,
+        # Usuario ya verificado por el lote: las sub-peticiones no vuelven a validar el JWT
+        "state": {"current_user": current_user}
+    }
+
+def _decode_body(headers: Dict[str, str], body: bytes) -> Any:
+    if not body:
+        return None
+    if headers.get("content-type", "").startswith("application/json"):
+        return json.loads(body)
+    return body.decode("utf-8", errors="replace")
+
+async def execute_batch(app: ASGIApp, parent: Scope, sub_requests: List[BatchSubRequest],
+                        authorization: Optional[str], current_user: dict) -> List[BatchSubResponse]:
+    """Ejecuto las sub-peticiones concurrentemente y devuelvo sus respuestas en el mismo orden"""
+    async def execute(sub_request: BatchSubRequest) -> BatchSubResponse:
+        body = json.dumps(sub_request.body).encode("utf-8") if sub_request.body is not None else b""
+        scope = _build_scope(parent, sub_request, authorization, current_user, bool(body))
+        try:
+            # En el loop de la petición: el broker de eventos, singleflight y los contextvars siguen valiendo
+            status, headers, content = await call_asgi(app, scope, body, settings.batch_request_timeout_seconds)
+        except asyncio.TimeoutError:
+            return BatchSubResponse(id=sub_request.id, status=504, body={"error": True, "message": "Tiempo de espera agotado"})
+        except Exception as e:
+            logger.error(f"Error en la sub-petición {sub_request.method} {sub_request.path}: {e}")
+            return BatchSubResponse(id=sub_request.id, status=500, body={"error": True, "message": "Error interno del servidor"})
+        return BatchSubResponse(id=sub_request.id, status=status, body=_decode_body(headers, content))
+
+    return list(await asyncio.gather(*(execute(sub_request) for sub_request in sub_requests)))
@@ -0,0 +1,81 @@
+import base64
+import hashlib
+import hmac
+import json
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Type
+from fastapi import HTTPException, Query, status
+from pydantic import BaseModel
+from src.api.responses import FastJSONResponse
+from src.config import settings
+from src.utils import json_default
+
+@dataclass(frozen=True)
+class Pagination:
+    """Parámetros de página ya validados: tamaño, clave de inicio y campos pedidos"""
+    limit: int
+    exclusive_start_key: Optional[Dict[str, Any]] = None
+    fields: Optional[List[str]] = None
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _b64decode(token: str) -> bytes:
+    return base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+
+def _cursor_signature(payload: bytes) -> bytes:
+    """Firmo el cursor con la clave de la app: el cliente no puede armar claves de inicio arbitrarias"""
+    return hmac.new(settings.secret_key.encode("utf-8"), b"cursor:" + payload, hashlib.sha256).digest()
+
+def encode_cursor(last_key: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Convierto el LastEvaluatedKey de DynamoDB en un token opaco y firmado para el cliente"""
+    if not last_key:
+        return None
+    raw = json.dumps(last_key, default=json_default, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    return f"{_b64encode(raw)}.{_b64encode(_cursor_signature(raw))}"
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Recupero la clave de inicio desde el token; un token alterado o mal formado es un error del cliente"""
+    if not cursor:
+        return None
+    key = None
+    payload, _, signature = cursor.partition(".")
+    try:
+        raw = _b64decode(payload)
+        if hmac.compare_digest(_b64decode(signature), _cursor_signature(raw)):
+            key = json.loads(raw)
+    except ValueError:
+        key = None
+    # Una clave de DynamoDB: atributos con valores escalares (texto o número)
+    if (not isinstance(key, dict) or not key
+            or not all(isinstance(value, (str, int, float)) and not isinstance(value, bool) for value in key.values())):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido")
+    return key
+
+def pagination(model: Type[BaseModel]) -> Callable[..., Pagination]:
+    """Creo la dependencia de paginación de una lista; los campos se validan contra su modelo"""
+    allowed_fields = tuple(model.model_fields)
+
+    def dependency(
+        limit: int = Query(settings.page_default_limit, ge=1, le=settings.page_max_limit),
+        cursor: Optional[str] = Query(None, description="next_cursor de la página anterior"),
+        fields: Optional[str] = Query(None, description="Campos a devolver separados por coma")
+    ) -> Pagination:
+        selected = None
+        if fields:
+            selected = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+            unknown = [name for name in selected if name not in allowed_fields]
+            if unknown:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Campos desconocidos: {', '.join(unknown)}"
+                )
+        return Pagination(limit=limit, exclusive_start_key=decode_cursor(cursor), fields=selected or None)
+
+    return dependency
+
+def paginated_response(items: List[BaseModel], last_key: Optional[Dict[str, Any]], page: Pagination) -> FastJSONResponse:
+    """Armo el sobre {items, next_cursor} con solo los campos pedidos"""
+    if page.fields:
+        items = [{name: item.__dict__.get(name) for name in page.fields} for item in items]
+    return FastJSONResponse({"items": items, "next_cursor": encode_cursor(last_key)})
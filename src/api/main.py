@@ -1,26 +1,63 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
 
 from src.api.routes import router
+from src.api.middleware import (
+    ConditionalGetMiddleware, CompressionMiddleware, MetricsMiddleware, RateLimitMiddleware, ServerTimingMiddleware
+)
+from src.api.responses import FastJSONResponse
+from src.api.routing import ProfiledRoute
 from src.config import settings
 from src.exceptions import BTGException
+from src.metrics import CONTENT_TYPE, metrics_registry
+from src.notifications.notification_manager import notification_manager
+from src.notifications.retry_scheduler import retry_scheduler
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("🚀 Iniciando BTG Pactual Funds API...")
+    # En Lambda el lifespan está desactivado y los reintentos los corre el job
+    retry_scheduler.start()
+    # Con METRICS_MULTIPROC_DIR cada worker vuelca sus métricas para que /metrics las sume
+    metrics_registry.start()
     yield
     print("🛑 Cerrando BTG Pactual Funds API...")
+    retry_scheduler.stop()
+    metrics_registry.stop()
+    # Termino de despachar las notificaciones que ya están en cola
+    notification_manager.stop()
 
 app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
     description="API para gestión de fondos de inversión BTG Pactual",
+    default_response_class=FastJSONResponse,
     lifespan=lifespan
 )
+# Las rutas propias de la app también dejan su plantilla en el scope para las métricas
+app.router.route_class = ProfiledRoute
+
+# El último middleware agregado es el más externo
+
+# Compresión negociada; queda por dentro del ETag para que cada codificación tenga el suyo
+app.add_middleware(CompressionMiddleware)
+
+# ETag, 304 y Cache-Control para las lecturas
+app.add_middleware(ConditionalGetMiddleware)
 
-# CORS middleware
+# Límites por usuario y tope de concurrencia: rechazo antes de cualquier otro trabajo
+app.add_middleware(RateLimitMiddleware)
+
+# Server-Timing y profiler por muestreo (opt-in); envuelve todo para medir la petición completa
+app.add_middleware(ServerTimingMiddleware)
+
+# Latencia y cantidad de peticiones por ruta; por fuera del rate limit para contar también los 429
+app.add_middleware(MetricsMiddleware)
+
+# CORS middleware (más externo: los 429 también llevan cabeceras CORS y los preflight no consumen cupo)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -41,6 +78,15 @@ async def btg_exception_handler(request, exc: BTGException):
 async def health_check():
     return {"status": "healthy", "app": settings.app_name}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Métricas en formato de texto de Prometheus"""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    # Leer los volcados de otros workers y contar la cola en DynamoDB bloquea: va al threadpool
+    body = await run_in_threadpool(metrics_registry.render)
+    return Response(content=body, media_type=CONTENT_TYPE)
+
 # Include routers
 app.include_router(router, prefix="/api/v1")
 
@@ -0,0 +1,422 @@
+import hashlib
+import json
+import logging
+import math
+import random
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from src.auth.jwt_handler import jwt_handler
+from src.config import settings
+from src.metrics import http_request_duration
+from src.profiling import RequestTimings, StackSampler, current_timings, timed
+from src.rate_limit import RateLimitStore, rate_limit_store
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional; sin él solo se ofrece gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+class ConditionalGetMiddleware:
+    """ETag fuerte, If-None-Match → 304 y Cache-Control para las lecturas (ASGI puro)"""
+
+    def __init__(self, app: ASGIApp, max_body_bytes: Optional[int] = None,
+                 cache_control_rules: Optional[Dict[str, str]] = None, default_cache_control: Optional[str] = None):
+        self.app = app
+        self.max_body_bytes = max_body_bytes or settings.etag_max_body_bytes
+        rules = settings.http_cache_control_rules if cache_control_rules is None else cache_control_rules
+        # El prefijo más largo gana
+        self.rules = sorted(rules.items(), key=lambda rule: len(rule[0]), reverse=True)
+        self.default_cache_control = default_cache_control or settings.http_cache_control_default
+
+    def cache_control_for(self, path: str) -> str:
+        for prefix, value in self.rules:
+            if path.startswith(prefix):
+                return value
+        return self.default_cache_control
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        cache_control = self.cache_control_for(scope["path"])
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+        size = 0
+        passthrough = False
+
+        async def send_with_etag(message: Message) -> None:
+            nonlocal start, size, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                start = message
+                headers = MutableHeaders(scope=start)
+                # Solo las respuestas 200 completas (con Content-Length) llevan ETag; los streams pasan directo
+                if start["status"] != 200 or "etag" in headers or "content-length" not in headers:
+                    passthrough = True
+                    await send(start)
+                return
+
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            if message.get("more_body", False):
+                if size > self.max_body_bytes:
+                    # Respuesta demasiado grande para calcular el ETag en memoria
+                    passthrough = True
+                    MutableHeaders(scope=start).setdefault("cache-control", cache_control)
+                    await send(start)
+                    await send({"type": "http.response.body", "body": b"".join(chunks), "more_body": True})
+                return
+
+            await self._finish(start, b"".join(chunks), if_none_match, cache_control, send)
+
+        await self.app(scope, receive, send_with_etag)
+
+    async def _finish(self, start: Message, body: bytes, if_none_match: Optional[str],
+                      cache_control: str, send: Send) -> None:
+        """Envío la respuesta completa con su ETag, o un 304 si el cliente ya la tiene"""
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        headers = MutableHeaders(scope=start)
+        headers["etag"] = etag
+        headers.setdefault("cache-control", cache_control)
+
+        if if_none_match and _etag_matches(etag, if_none_match):
+            not_modified = MutableHeaders()
+            for name in ("etag", "cache-control", "vary"):
+                if name in headers:
+                    not_modified[name] = headers[name]
+            await send({"type": "http.response.start", "status": 304, "headers": not_modified.raw})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        await send(start)
+        await send({"type": "http.response.body", "body": body})
+
+def _etag_matches(etag: str, if_none_match: str) -> bool:
+    """If-None-Match usa comparación débil: ignoro el prefijo W/"""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+# Tipos que vale la pena comprimir (los streams SSE se dejan sin comprimir por los proxies)
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/csv", "text/plain", "text/html")
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Elijo br o gzip según Accept-Encoding y sus pesos q"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        weight = 1.0
+        if params.strip().startswith("q="):
+            try:
+                weight = float(params.strip()[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    wildcard = weights.get("*", 0.0)
+    candidates = [("br", weights.get("br", wildcard)), ("gzip", weights.get("gzip", wildcard))]
+    if brotli is None:
+        candidates = candidates[1:]
+    encoding, weight = max(candidates, key=lambda candidate: candidate[1])
+    return encoding if weight > 0 else None
+
+class _StreamCompressor:
+    """Compresor incremental: cada fragmento sale comprimido de inmediato"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.finish()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH)
+
+class CompressionMiddleware:
+    """Compresión negociada (gzip, o brotli si está instalado) para respuestas completas y streams"""
+
+    def __init__(self, app: ASGIApp, minimum_size: Optional[int] = None,
+                 route_rules: Optional[Dict[str, int]] = None, gzip_level: Optional[int] = None,
+                 brotli_quality: Optional[int] = None):
+        self.app = app
+        self.minimum_size = settings.compression_minimum_size if minimum_size is None else minimum_size
+        rules = settings.compression_route_rules if route_rules is None else route_rules
+        # El prefijo más largo gana; un tamaño negativo desactiva la compresión en esa ruta
+        self.rules = sorted(rules.items(), key=lambda rule: len(rule[0]), reverse=True)
+        self.gzip_level = gzip_level or settings.compression_gzip_level
+        self.brotli_quality = brotli_quality or settings.compression_brotli_quality
+
+    def minimum_size_for(self, path: str) -> Optional[int]:
+        for prefix, minimum_size in self.rules:
+            if path.startswith(prefix):
+                return None if minimum_size < 0 else minimum_size
+        return self.minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        minimum_size = self.minimum_size_for(scope["path"]) if scope["type"] == "http" else None
+        if minimum_size is None:
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+
+        start: Optional[Message] = None
+        compressor: Optional[_StreamCompressor] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, compressor, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                start = message
+                headers = MutableHeaders(scope=start)
+                content_type = headers.get("content-type", "")
+                if "content-encoding" in headers or not content_type.startswith(COMPRESSIBLE_TYPES):
+                    passthrough = True
+                    await send(start)
+                    return
+                # La representación depende de Accept-Encoding aunque esta respuesta salga sin comprimir
+                headers.add_vary_header("Accept-Encoding")
+                if encoding is None:
+                    passthrough = True
+                    await send(start)
+                return
+
+            headers = MutableHeaders(scope=start)
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None and not more_body:
+                # Respuesta completa: solo la comprimo si supera el umbral
+                passthrough = True
+                if len(body) < minimum_size:
+                    await send(start)
+                    await send(message)
+                    return
+                body = _StreamCompressor(encoding, self.gzip_level, self.brotli_quality).finish(body)
+                headers["content-encoding"] = encoding
+                headers["content-length"] = str(len(body))
+                await send(start)
+                await send({"type": "http.response.body", "body": body})
+                return
+
+            if compressor is None:
+                # Stream: no conozco el tamaño total, comprimo fragmento a fragmento
+                compressor = _StreamCompressor(encoding, self.gzip_level, self.brotli_quality)
+                headers["content-encoding"] = encoding
+                if "content-length" in headers:
+                    del headers["content-length"]
+                await send(start)
+
+            if more_body:
+                await send({"type": "http.response.body", "body": compressor.compress(body), "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": compressor.finish(body)})
+
+        await self.app(scope, receive, send_compressed)
+
+class RateLimitMiddleware:
+    """Token bucket por usuario y clase de ruta, más un tope de concurrencia en las rutas costosas"""
+
+    def __init__(self, app: ASGIApp, store: Optional[RateLimitStore] = None,
+                 route_classes: Optional[Dict[str, str]] = None,
+                 class_limits: Optional[Dict[str, Dict[str, float]]] = None):
+        self.app = app
+        self.store = store or rate_limit_store
+        rules = settings.rate_limit_route_classes if route_classes is None else route_classes
+        # El prefijo más largo gana; "GET /ruta" solo aplica a ese método
+        self.rules = sorted(
+            ((rule.partition(" ")[0] if " " in rule else None, rule.partition(" ")[2] or rule, route_class)
+             for rule, route_class in rules.items()),
+            key=lambda rule: (len(rule[1]), rule[0] is not None),
+            reverse=True
+        )
+        self.class_limits = settings.rate_limit_classes if class_limits is None else class_limits
+        self.in_flight: Dict[str, int] = {}
+        # Las sub-peticiones de un lote corren en otros hilos
+        self._lock = threading.Lock()
+
+    def route_class_for(self, method: str, path: str) -> str:
+        for rule_method, prefix, route_class in self.rules:
+            if path.startswith(prefix) and rule_method in (None, method):
+                return route_class
+        return "default"
+
+    def principal_for(self, scope: Scope) -> str:
+        """Identifico al usuario por su JWT; sin token válido limito por IP"""
+        # Las sub-peticiones de un lote ya traen el usuario verificado
+        current_user = (scope.get("state") or {}).get("current_user")
+        if current_user:
+            return f"user:{current_user['user_id']}"
+        authorization = Headers(scope=scope).get("authorization", "")
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() == "bearer" and token:
+            with timed("auth"):
+                user_data = jwt_handler.get_user_from_token(token)
+            if user_data and user_data.get("user_id"):
+                # Lo dejo en el scope para que get_current_user no vuelva a verificar el token
+                scope.setdefault("state", {})["current_user"] = user_data
+                return f"user:{user_data['user_id']}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.rate_limit_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        route_class = self.route_class_for(scope["method"], scope["path"])
+        limits = self.class_limits.get(route_class)
+        if not limits:
+            await self.app(scope, receive, send)
+            return
+
+        key = f"{self.principal_for(scope)}:{route_class}"
+        try:
+            if self.store.blocking:
+                wait = await run_in_threadpool(self.store.acquire, key, limits["rate"], limits.get("burst"))
+            else:
+                wait = self.store.acquire(key, limits["rate"], limits.get("burst"))
+        except Exception as e:
+            # Si el almacén compartido falla prefiero dejar pasar la petición que tumbar la API
+            logger.warning(f"No se pudo consultar el rate limit de {key}: {e}")
+            wait = 0.0
+        if wait:
+            await self._reject(send, wait, "Demasiadas solicitudes, intente más tarde")
+            return
+
+        # Tope de peticiones simultáneas por clase: descarto carga antes de llegar a DynamoDB
+        with self._lock:
+            admitted = not limits.get("concurrency") or self.in_flight.get(route_class, 0) < limits["concurrency"]
+            if admitted:
+                self.in_flight[route_class] = self.in_flight.get(route_class, 0) + 1
+        if not admitted:
+            await self._reject(send, 1, "Servicio ocupado, intente más tarde")
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            with self._lock:
+                self.in_flight[route_class] -= 1
+
+    async def _reject(self, send: Send, wait: float, message: str) -> None:
+        """Respondo 429 con Retry-After en segundos enteros"""
+        body = json.dumps({"error": True, "message": message}, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(wait))).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+class ServerTimingMiddleware:
+    """Desgloso el tiempo de cada petición en fases (Server-Timing) y perfilo las lentas por muestreo"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    def profile_requested(self, scope: Scope) -> bool:
+        """Verifico que la cabecera de perfilado venga de un admin"""
+        headers = Headers(scope=scope)
+        if not headers.get(settings.profile_header):
+            return False
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        user_data = jwt_handler.get_user_from_token(token) if scheme.lower() == "bearer" and token else None
+        if user_data:
+            scope.setdefault("state", {})["current_user"] = user_data
+        return bool(user_data and user_data.get("role") == "admin")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        forced = self.profile_requested(scope)
+        profile = forced or (settings.profile_sample_rate > 0 and random.random() < settings.profile_sample_rate)
+        if not settings.server_timing_enabled and not profile:
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        sampler = StackSampler(threading.get_ident()).start() if profile else None
+        started = time.perf_counter()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append(
+                    "server-timing", timings.server_timing(time.perf_counter() - started)
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_timings.reset(token)
+            if sampler is not None:
+                sampler.stop()
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                # Las muestreadas solo interesan si fueron lentas; la cabecera del admin siempre guarda
+                if forced or elapsed_ms >= settings.profile_slow_ms:
+                    path = sampler.write(f"{scope['method']}_{scope['path']}_{elapsed_ms:.0f}ms")
+                    logger.info(f"Perfil de {scope['method']} {scope['path']} guardado en {path}")
+
+class MetricsMiddleware:
+    """Registro latencia y cantidad de peticiones por ruta (plantilla) y estado"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.metrics_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # La plantilla evita una serie por cada id; lo que no llegó a una ruta (404, 429) va junto
+            route = scope.get("route")
+            http_request_duration.observe(
+                time.perf_counter() - started, scope["method"],
+                getattr(route, "path", "unmatched"), str(status)
+            )
@@ -0,0 +1,30 @@
+import json
+from typing import Any
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from src.utils import json_default
+from src.profiling import timed
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional; sin él uso json de la librería estándar
+    orjson = None
+
+def _default(value: Any) -> Any:
+    """Serializo modelos por sus campos (sin volver a validarlos), Decimal y sets"""
+    if isinstance(value, BaseModel):
+        return {name: value.__dict__.get(name) for name in type(value).model_fields}
+    return json_default(value)
+
+def dumps(content: Any) -> bytes:
+    """Serializo a JSON compacto con orjson si está instalado"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """Respuesta JSON rápida: acepta modelos ya construidos y no pasa por jsonable_encoder"""
+
+    def render(self, content: Any) -> bytes:
+        with timed("serialize"):
+            return dumps(content)
@@ -1,4 +1,7 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Query, Header, Request, status
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
 from datetime import datetime
 
@@ -7,25 +10,45 @@ from src.services.fund_service import fund_service
 from src.services.subscription_service import subscription_service
 from src.services.transaction_service import transaction_service
 from src.services.notification_service import notification_service
+from src.services.export_service import export_service, EXPORT_MEDIA_TYPES
+from src.services.ledger_service import ledger_service
+from src.services.rollup_service import rollup_service
+from src.services.portfolio_service import portfolio_service
+from src.notifications.notification_manager import notification_manager
+from src.notifications.retry_scheduler import retry_scheduler
+from src.notifications.templates import template_registry
+from src.notifications.events import notification_events
+from src.cache import cached_response, response_cache
+from src.services.singleflight import single_flight_stats
+from src.api.dependencies import Pagination, pagination, paginated_response
+from src.api.batch import execute_batch
+from src.api.routing import ProfiledRoute
 
 from src.models.user import UserCreate, UserUpdate, UserResponse, UserLogin, TokenResponse, UserRole
 from src.models.fund import FundCreate, FundUpdate, FundResponse
 from src.models.subscription import SubscriptionCreate, SubscriptionResponse
 from src.models.transaction import TransactionCreate, TransactionType, TransactionStatus, TransactionResponse
 from src.models.notification import NotificationCreate, NotificationType, NotificationChannel, NotificationStatus, NotificationResponse
+from src.models.notification import NotificationRequeueRequest, NotificationRequeueResponse
+from src.models.ledger import LedgerBalanceResponse, LedgerStatementResponse
+from src.models.rollup import TransactionReportResponse
+from src.models.pagination import PageResponse
+from src.models.batch import BatchRequest, BatchResponse
+from src.models.portfolio import PortfolioResponse, PortfolioSummaryResponse
 
 from src.exceptions import (
     UserNotFoundException, 
     FundNotFoundException, 
     SubscriptionNotFoundException,
     InsufficientBalanceException,
+    BalanceChangedException,
     DuplicateUserException
 )
 
 from src.auth.jwt_handler import jwt_handler
-from src.auth.security import get_current_user, get_current_user_full, require_client, require_admin
+from src.auth.security import get_current_user, get_current_user_full, require_client, require_admin, security
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 
 # ==================== MÉTODOS AUXILIARES ====================
 
@@ -51,6 +74,12 @@ def _validate_subscription_request(subscription_data: SubscriptionCreate) -> tup
     
     return fund, user
 
+def _user_cache_tags(resource: str, user_id: str, current_user: dict, **_) -> List[str]:
+    """Etiquetas de caché de una lista por usuario; el admin ve la lista global"""
+    if current_user.get("role") == "admin":
+        return [f"{resource}:all"]
+    return [f"{resource}:user:{user_id}"]
+
 def _create_subscription_transaction(user: UserResponse, fund: FundResponse, amount: float, 
                                    saldo_anterior: float, saldo_nuevo: float, 
                                    tipo_transaccion: TransactionType) -> None:
@@ -67,26 +96,62 @@ def _create_subscription_transaction(user: UserResponse, fund: FundResponse, amo
     transaction_service.create_transaction(transaction_data)
 
 def _create_subscription_notification(user: UserResponse, fund: FundResponse, amount: float, 
-                                    tipo_notificacion: NotificationType, accion: str) -> None:
-    """Envío notificación al usuario sobre su operación"""
+                                    tipo_notificacion: NotificationType) -> None:
+    """Registro la notificación ya reclamada y la encolo; el envío ocurre fuera de la petición"""
     canal = NotificationChannel.EMAIL if user.notification_preference == "email" else NotificationChannel.SMS
-    mensaje = f"Su suscripción al fondo {fund.name} {accion} por COP ${amount:,.0f} ha sido exitosa"
     
+    # Guardo solo la plantilla y sus parámetros; el mensaje se renderiza al despachar
     notification_data = NotificationCreate(
         user_id=user.user_id,
         type=tipo_notificacion,
         channel=canal,
-        content=mensaje,
-        status=NotificationStatus.PENDING
+        template_id=template_registry.resolve(tipo_notificacion.value, canal.value),
+        params={"fund_name": fund.name, "amount": amount},
+        # Nace en processing: mientras espera en la cola, el resumen o el buffer, drain_pending no la reclama
+        status=NotificationStatus.PROCESSING
     )
-    notification_service.create_notification(notification_data)
+    notification = notification_service.create_notification(notification_data)
+    destinatario = user.email if canal == NotificationChannel.EMAIL else user.phone
+    notification_manager.enqueue_claimed(notification, recipient=destinatario)
+
+def _subscribe(subscription_data: SubscriptionCreate) -> SubscriptionResponse:
+    """Valido, creo la suscripción y registro su transacción y notificación (bloqueante: corre en el threadpool)"""
+    # Verifico que todo esté en orden para la suscripción
+    fund, user = _validate_subscription_request(subscription_data)
+    
+    # Creo la nueva suscripción: el portafolio y el saldo del usuario se actualizan en la misma transacción
+    nuevo_saldo = user.balance - subscription_data.amount
+    subscription = subscription_service.create_subscription(subscription_data, fund, nuevo_saldo, user.balance)
+    
+    # Registro la transacción y envío notificación
+    _create_subscription_transaction(user, fund, subscription_data.amount, user.balance, nuevo_saldo, TransactionType.SUBSCRIPTION)
+    _create_subscription_notification(user, fund, subscription_data.amount, NotificationType.SUBSCRIPTION_CONFIRMATION)
+    
+    return subscription
+
+def _cancel(subscription_id: str) -> SubscriptionResponse:
+    """Cancelo la suscripción, devuelvo el saldo y registro la operación (bloqueante: corre en el threadpool)"""
+    # Busco la suscripción que quiere cancelar
+    subscription = subscription_service.get_subscription(subscription_id)
+    user = user_service.get_user(subscription.user_id)
+    fund = fund_service.get_fund(subscription.fund_id)
+    
+    # Cancelo la suscripción, retiro la posición y le devuelvo el dinero al usuario en la misma transacción
+    nuevo_saldo = user.balance + subscription.amount
+    cancelled_subscription = subscription_service.cancel_subscription(subscription_id, nuevo_saldo, user.balance)
+    
+    # Registro la operación y envío notificación
+    _create_subscription_transaction(user, fund, subscription.amount, user.balance, nuevo_saldo, TransactionType.CANCELLATION)
+    _create_subscription_notification(user, fund, subscription.amount, NotificationType.CANCELLATION_CONFIRMATION)
+    
+    return cancelled_subscription
 
 # ==================== AUTENTICACIÓN ====================
 
 @router.post("/auth/login", response_model=TokenResponse)
 async def login(login_data: UserLogin):
     """Inicio sesión y obtengo token JWT"""
-    user = user_service.authenticate_user(login_data)
+    user = await run_in_threadpool(user_service.authenticate_user, login_data)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -101,12 +166,22 @@ async def register(user_data: UserCreate):
     """Registro nuevo cliente y obtengo token JWT"""
     try:
         # Solo se pueden registrar clientes por este endpoint
-        user = user_service.create_user(user_data, role=UserRole.CLIENT)
+        user = await run_in_threadpool(user_service.create_user, user_data, role=UserRole.CLIENT)
         access_token = jwt_handler.create_access_token(user)
         return TokenResponse(access_token=access_token, user=user)
     except (DuplicateUserException, ValueError) as e:
         raise HTTPException(status_code=400, detail=e.message if hasattr(e, 'message') else str(e))
 
+@router.post("/auth/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(all_sessions: bool = Query(False, description="Cerrar también las demás sesiones del usuario"),
+                 credentials: HTTPAuthorizationCredentials = Depends(security),
+                 current_user: dict = Depends(get_current_user)):
+    """Cierro la sesión: el token deja de ser válido de inmediato"""
+    if all_sessions:
+        await run_in_threadpool(jwt_handler.revoke_user, current_user["user_id"])
+    else:
+        await run_in_threadpool(jwt_handler.revoke_token, credentials.credentials)
+
 # ==================== USUARIOS ====================
 
 @router.post("/users", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
@@ -114,7 +189,7 @@ async def create_user(user_data: UserCreate):
     """Creo nuevo cliente"""
     try:
         # Solo se pueden crear clientes por este endpoint
-        return user_service.create_user(user_data, role=UserRole.CLIENT)
+        return await run_in_threadpool(user_service.create_user, user_data, role=UserRole.CLIENT)
     except (DuplicateUserException, ValueError) as e:
         raise HTTPException(status_code=400, detail=e.message if hasattr(e, 'message') else str(e))
 
@@ -122,20 +197,42 @@ async def create_user(user_data: UserCreate):
 async def get_user(user_id: str):
     """Obtengo usuario por ID"""
     try:
-        return user_service.get_user(user_id)
+        return await run_in_threadpool(user_service.get_user, user_id)
     except UserNotFoundException as e:
         raise HTTPException(status_code=404, detail=e.message)
 
-@router.get("/users", response_model=List[UserResponse])
-async def get_all_users():
-    """Obtengo todos los usuarios"""
-    return user_service.get_all_users()
+@router.get("/users", response_model=PageResponse[UserResponse])
+async def get_all_users(page: Pagination = Depends(pagination(UserResponse))):
+    """Obtengo los usuarios por páginas"""
+    # Las listas se serializan directo: el response_model queda solo para la documentación
+    users, last_key = await run_in_threadpool(user_service.get_users_page, page.limit, page.exclusive_start_key, page.fields)
+    return paginated_response(users, last_key, page)
+
+@router.get("/users/{user_id}/portfolio/summary", response_model=PortfolioSummaryResponse)
+async def get_user_portfolio_summary(user_id: str, current_user: dict = Depends(get_current_user)):
+    """Muestro saldo y posiciones activas leyendo solo el documento materializado del usuario"""
+    if current_user.get("role") != "admin" and current_user.get("user_id") != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No puede ver el portafolio de otro usuario")
+    return await run_in_threadpool(portfolio_service.get_summary, user_id)
+
+@router.get("/users/{user_id}/portfolio", response_model=PortfolioResponse)
+async def get_user_portfolio(user_id: str,
+                             transactions_limit: Optional[int] = Query(None, ge=1, le=100),
+                             notifications_limit: Optional[int] = Query(None, ge=1, le=100),
+                             current_user: dict = Depends(get_current_user)):
+    """Muestro saldo, posiciones, últimas transacciones y notificaciones del usuario en una sola vista"""
+    if current_user.get("role") != "admin" and current_user.get("user_id") != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No puede ver el portafolio de otro usuario")
+    # El documento y la actividad reciente se consultan en paralelo; espero en el threadpool para no frenar el event loop
+    return await run_in_threadpool(
+        portfolio_service.get_portfolio, user_id, transactions_limit, notifications_limit
+    )
 
 @router.put("/users/{user_id}", response_model=UserResponse)
 async def update_user(user_id: str, user_data: UserUpdate):
     """Actualizo usuario"""
     try:
-        return user_service.update_user(user_id, user_data)
+        return await run_in_threadpool(user_service.update_user, user_id, user_data)
     except UserNotFoundException as e:
         raise HTTPException(status_code=404, detail=e.message)
 
@@ -145,25 +242,32 @@ async def update_user(user_id: str, user_data: UserUpdate):
 async def create_fund(fund_data: FundCreate):
     """Creo nuevo fondo"""
     try:
-        return fund_service.create_fund(fund_data)
+        return await run_in_threadpool(fund_service.create_fund, fund_data)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/funds", response_model=List[FundResponse])
-async def get_all_funds():
-    """Obtengo todos los fondos"""
-    return fund_service.get_all_funds()
-
-@router.get("/funds/active", response_model=List[FundResponse])
-async def get_active_funds():
-    """Obtengo solo fondos activos"""
-    return fund_service.get_active_funds()
+@router.get("/funds", response_model=PageResponse[FundResponse])
+@cached_response("funds", lambda **_: ["funds"])
+async def get_all_funds(page: Pagination = Depends(pagination(FundResponse))):
+    """Obtengo los fondos por páginas"""
+    funds, last_key = await run_in_threadpool(fund_service.get_funds_page, page.limit, page.exclusive_start_key, page.fields)
+    return paginated_response(funds, last_key, page)
+
+@router.get("/funds/active", response_model=PageResponse[FundResponse])
+@cached_response("funds_active", lambda **_: ["funds"])
+async def get_active_funds(page: Pagination = Depends(pagination(FundResponse))):
+    """Obtengo solo fondos activos por páginas"""
+    funds, last_key = await run_in_threadpool(
+        fund_service.get_funds_page, page.limit, page.exclusive_start_key, page.fields, active_only=True
+    )
+    return paginated_response(funds, last_key, page)
 
 @router.get("/funds/{fund_id}", response_model=FundResponse)
+@cached_response("fund", lambda fund_id, **_: ["funds", f"fund:{fund_id}"])
 async def get_fund(fund_id: str):
     """Obtengo fondo por ID"""
     try:
-        return fund_service.get_fund(fund_id)
+        return await run_in_threadpool(fund_service.get_fund, fund_id)
     except FundNotFoundException as e:
         raise HTTPException(status_code=404, detail=e.message)
 
@@ -171,7 +275,7 @@ async def get_fund(fund_id: str):
 async def update_fund(fund_id: str, fund_data: FundUpdate):
     """Actualizo fondo"""
     try:
-        return fund_service.update_fund(fund_id, fund_data)
+        return await run_in_threadpool(fund_service.update_fund, fund_id, fund_data)
     except FundNotFoundException as e:
         raise HTTPException(status_code=404, detail=e.message)
 
@@ -181,86 +285,199 @@ async def update_fund(fund_id: str, fund_data: FundUpdate):
 async def create_subscription(subscription_data: SubscriptionCreate, current_user: dict = Depends(require_client)):
     """Suscribo al usuario a un fondo de inversión"""
     try:
-        # Verifico que todo esté en orden para la suscripción
-        fund, user = _validate_subscription_request(subscription_data)
-        
-        # Creo la nueva suscripción
-        subscription = subscription_service.create_subscription(subscription_data)
-        
-        # Actualizo el saldo del usuario
-        nuevo_saldo = user.balance - subscription_data.amount
-        user_service.update_balance(subscription_data.user_id, nuevo_saldo)
-        
-        # Registro la transacción y envío notificación
-        _create_subscription_transaction(user, fund, subscription_data.amount, user.balance, nuevo_saldo, TransactionType.SUBSCRIPTION)
-        _create_subscription_notification(user, fund, subscription_data.amount, NotificationType.SUBSCRIPTION_CONFIRMATION, "por")
-        
-        return subscription
-        
+        return await run_in_threadpool(_subscribe, subscription_data)
     except HTTPException:
         raise
     except (UserNotFoundException, FundNotFoundException) as e:
         raise HTTPException(status_code=404, detail=e.message)
+    except BalanceChangedException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/subscriptions/user/{user_id}", response_model=List[SubscriptionResponse])
-async def get_user_subscriptions(user_id: str, current_user: dict = Depends(get_current_user)):
+@router.get("/subscriptions/user/{user_id}", response_model=PageResponse[SubscriptionResponse])
+@cached_response("user_subscriptions", lambda **params: _user_cache_tags("subscriptions", **params))
+async def get_user_subscriptions(user_id: str, page: Pagination = Depends(pagination(SubscriptionResponse)),
+                                 current_user: dict = Depends(get_current_user)):
     """Muestro solo las suscripciones activas del usuario"""
-    return subscription_service.get_active_user_subscriptions(user_id, current_user)
+    subscriptions, last_key = await run_in_threadpool(
+        subscription_service.get_user_subscriptions_page,
+        user_id, current_user, page.limit, page.exclusive_start_key, page.fields
+    )
+    return paginated_response(subscriptions, last_key, page)
 
-@router.get("/subscriptions/user/{user_id}/active", response_model=List[SubscriptionResponse])
-async def get_active_user_subscriptions(user_id: str, current_user: dict = Depends(get_current_user)):
+@router.get("/subscriptions/user/{user_id}/active", response_model=PageResponse[SubscriptionResponse])
+@cached_response("user_active_subscriptions", lambda **params: _user_cache_tags("subscriptions", **params))
+async def get_active_user_subscriptions(user_id: str, page: Pagination = Depends(pagination(SubscriptionResponse)),
+                                        current_user: dict = Depends(get_current_user)):
     """Muestro solo las suscripciones activas del usuario"""
-    return subscription_service.get_active_user_subscriptions(user_id, current_user)
+    subscriptions, last_key = await run_in_threadpool(
+        subscription_service.get_user_subscriptions_page,
+        user_id, current_user, page.limit, page.exclusive_start_key, page.fields
+    )
+    return paginated_response(subscriptions, last_key, page)
 
 @router.delete("/subscriptions/{subscription_id}", response_model=SubscriptionResponse)
 async def cancel_subscription(subscription_id: str, current_user: dict = Depends(require_client)):
     """Cancelo la suscripción del usuario y le devuelvo su dinero"""
     try:
-        # Busco la suscripción que quiere cancelar
-        subscription = subscription_service.get_subscription(subscription_id)
-        user = user_service.get_user(subscription.user_id)
-        fund = fund_service.get_fund(subscription.fund_id)
-        
-        # Procedo a cancelar la suscripción
-        cancelled_subscription = subscription_service.cancel_subscription(subscription_id)
-        
-        # Le devuelvo el dinero al usuario
-        nuevo_saldo = user.balance + subscription.amount
-        user_service.update_balance(subscription.user_id, nuevo_saldo)
-        
-        # Registro la operación y envío notificación
-        _create_subscription_transaction(user, fund, subscription.amount, user.balance, nuevo_saldo, TransactionType.CANCELLATION)
-        _create_subscription_notification(user, fund, subscription.amount, NotificationType.CANCELLATION_CONFIRMATION, "ha sido cancelada. Se ha devuelto")
-        
-        return cancelled_subscription
-        
+        return await run_in_threadpool(_cancel, subscription_id)
     except SubscriptionNotFoundException as e:
         raise HTTPException(status_code=404, detail=e.message)
+    except BalanceChangedException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 # ==================== TRANSACCIONES ====================
 
-@router.get("/transactions/user/{user_id}", response_model=List[TransactionResponse])
-async def get_user_transactions(user_id: str, current_user: dict = Depends(get_current_user)):
-    """Muestro el historial completo de transacciones del usuario"""
-    return transaction_service.get_user_transactions(user_id, current_user)
+@router.get("/transactions/user/{user_id}", response_model=PageResponse[TransactionResponse])
+@cached_response("user_transactions", lambda **params: _user_cache_tags("transactions", **params))
+async def get_user_transactions(user_id: str, include_archived: bool = False,
+                                page: Pagination = Depends(pagination(TransactionResponse)),
+                                current_user: dict = Depends(get_current_user)):
+    """Muestro el historial de transacciones del usuario por páginas, de la más reciente a la más antigua"""
+    transactions, last_key = await run_in_threadpool(
+        transaction_service.get_user_transactions_page, user_id, current_user, page.limit, page.exclusive_start_key, page.fields, include_archived=include_archived
+    )
+    return paginated_response(transactions, last_key, page)
 
 @router.get("/transactions/{transaction_id}", response_model=TransactionResponse)
 async def get_transaction(transaction_id: str, current_user: dict = Depends(require_client)):
     """Obtengo transacción por ID"""
-    return transaction_service.get_transaction(transaction_id)
+    return await run_in_threadpool(transaction_service.get_transaction, transaction_id)
+
+# ==================== LEDGER ====================
+
+@router.get("/ledger/user/{user_id}/balance", response_model=LedgerBalanceResponse)
+async def get_balance_at(user_id: str, at: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    """Consulto el saldo del usuario en una fecha usando el último checkpoint"""
+    if current_user.get("role") != "admin" and current_user.get("user_id") != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No puede ver el saldo de otro usuario")
+    return await run_in_threadpool(ledger_service.get_balance_at, user_id, at)
+
+@router.get("/ledger/user/{user_id}/statement", response_model=LedgerStatementResponse)
+async def get_statement(user_id: str, date_from: str, date_to: str, current_user: dict = Depends(get_current_user)):
+    """Genero el extracto del usuario entre dos fechas"""
+    if current_user.get("role") != "admin" and current_user.get("user_id") != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No puede ver el extracto de otro usuario")
+    return await run_in_threadpool(ledger_service.get_statement, user_id, date_from, date_to)
 
 # ==================== NOTIFICACIONES ====================
 
-@router.get("/notifications/user/{user_id}", response_model=List[NotificationResponse])
-async def get_user_notifications(user_id: str, current_user: dict = Depends(get_current_user)):
-    """Muestro todas las notificaciones del usuario"""
-    return notification_service.get_user_notifications(user_id, current_user)
+@router.get("/notifications/user/{user_id}", response_model=PageResponse[NotificationResponse])
+async def get_user_notifications(user_id: str, include_archived: bool = False,
+                                 page: Pagination = Depends(pagination(NotificationResponse)),
+                                 current_user: dict = Depends(get_current_user)):
+    """Muestro las notificaciones del usuario por páginas, de la más reciente a la más antigua"""
+    notifications, last_key = await run_in_threadpool(
+        notification_service.get_user_notifications_page, user_id, current_user, page.limit, page.exclusive_start_key, page.fields, include_archived=include_archived
+    )
+    return paginated_response(notifications, last_key, page)
+
+@router.get("/notifications/user/{user_id}/stream")
+async def stream_user_notifications(
+    user_id: str,
+    request: Request,
+    last_event_id: Optional[int] = Header(None, alias="Last-Event-ID"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Envío por SSE las notificaciones nuevas y sus cambios de estado, reanudable con Last-Event-ID"""
+    if current_user.get("role") != "admin" and current_user.get("user_id") != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No puede ver las notificaciones de otro usuario")
+    
+    return StreamingResponse(
+        notification_events.stream(user_id, last_event_id, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.get("/notifications/{notification_id}", response_model=NotificationResponse)
 async def get_notification(notification_id: str, current_user: dict = Depends(require_client)):
     """Obtengo notificación por ID"""
-    return notification_service.get_notification(notification_id)
\ No newline at end of file
+    return await run_in_threadpool(notification_service.get_notification, notification_id)
+
+# ==================== ADMINISTRACIÓN ====================
+
+@router.get("/admin/transactions/export")
+async def export_transactions(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    fund_id: Optional[str] = None,
+    type: Optional[TransactionType] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    current_user: dict = Depends(require_admin)
+):
+    """Exporto las transacciones en streaming (NDJSON o CSV) sin cargarlas completas en memoria"""
+    chunks = export_service.export_transactions(
+        export_format=format,
+        fund_id=fund_id,
+        transaction_type=type.value if type else None,
+        date_from=date_from,
+        date_to=date_to
+    )
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename=transactions.{format}"}
+    )
+
+@router.get("/admin/reports/transactions", response_model=TransactionReportResponse)
+async def get_transactions_report(
+    date_from: str,
+    date_to: str,
+    fund_id: Optional[str] = None,
+    type: Optional[TransactionType] = None,
+    current_user: dict = Depends(require_admin)
+):
+    """Reporte de transacciones por día, fondo y tipo servido desde los agregados diarios"""
+    return await run_in_threadpool(rollup_service.get_report, date_from, date_to, fund_id, type.value if type else None)
+
+@router.get("/admin/notifications/stats")
+async def get_notification_stats(current_user: dict = Depends(require_admin)):
+    """Métricas del despachador: cola, workers y throughput/latencia por canal"""
+    return notification_manager.stats()
+
+@router.get("/admin/cache/stats")
+async def get_cache_stats(current_user: dict = Depends(require_admin)):
+    """Métricas de la caché de respuestas y de las lecturas agrupadas (single-flight)"""
+    return {
+        "response_cache": response_cache.stats(),
+        "single_flight": single_flight_stats(),
+        "auth_tokens": jwt_handler.stats()
+    }
+
+@router.post("/admin/users/{user_id}/sessions/revoke")
+async def revoke_user_sessions(user_id: str, current_user: dict = Depends(require_admin)):
+    """Invalido todos los tokens emitidos al usuario (p. ej. después de cambiarle el rol)"""
+    revoked_before = await run_in_threadpool(jwt_handler.revoke_user, user_id)
+    return {"user_id": user_id, "revoked_before": revoked_before}
+
+@router.post("/admin/notifications/dead-letter/requeue", response_model=NotificationRequeueResponse)
+async def requeue_dead_letter_notifications(
+    requeue_data: NotificationRequeueRequest,
+    current_user: dict = Depends(require_admin)
+):
+    """Devuelvo a la cola las notificaciones en dead_letter (las indicadas o las más antiguas)"""
+    notification_ids = await run_in_threadpool(
+        retry_scheduler.requeue_dead_letters, requeue_data.notification_ids, requeue_data.limit
+    )
+    return NotificationRequeueResponse(requeued=len(notification_ids), notification_ids=notification_ids)
+
+# ==================== LOTES ====================
+
+@router.post("/batch", response_model=BatchResponse)
+async def execute_batch_requests(
+    batch: BatchRequest,
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """Ejecuto varias peticiones de la API en paralelo con una sola autenticación"""
+    responses = await execute_batch(
+        request.app,
+        request.scope,
+        batch.requests,
+        request.headers.get("authorization"),
+        current_user
+    )
+    return BatchResponse(responses=responses)
@@ -1,14 +1,28 @@
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+import hashlib
+import secrets
+import threading
+import time
 import jwt
 from src.config import settings
 from src.models.user import UserResponse
+from src.auth.revocation import RevocationList, revocation_list
+from src.metrics import MetricFamily, metrics_registry
 
 class JWTHandler:
-    def __init__(self):
+    def __init__(self, revocations: Optional[RevocationList] = None, cache_size: Optional[int] = None):
         self.secret_key = settings.secret_key
         self.algorithm = settings.algorithm
         self.access_token_expire_minutes = settings.access_token_expire_minutes
+        self.revocations = revocations or revocation_list
+        # Tokens ya verificados (por digest, no guardo el token) → claims; vencen con su exp
+        self.cache_size = settings.auth_token_cache_size if cache_size is None else cache_size
+        self._verified: "OrderedDict[bytes, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
     
     def create_access_token(self, user: UserResponse) -> str:
         """Creo token de acceso JWT"""
@@ -17,19 +31,30 @@ class JWTHandler:
             "sub": user.user_id,
             "email": user.email,
             "role": user.role,
-            "exp": expire
+            "exp": expire,
+            # iat con fracción: una revocación por usuario no alcanza a un token emitido justo después
+            "iat": time.time(),
+            "jti": secrets.token_hex(8)
         }
         return jwt.encode(to_encode, self.secret_key, algorithm=self.algorithm)
     
     def verify_token(self, token: str) -> Optional[Dict[str, Any]]:
         """Verifico y decodifico token JWT"""
-        try:
-            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
-            return payload
-        except jwt.ExpiredSignatureError:
-            return None
-        except jwt.PyJWTError:
+        digest = hashlib.sha256(token.encode()).digest()
+        payload = self._cached_claims(digest)
+        if payload is None:
+            try:
+                payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+            except jwt.ExpiredSignatureError:
+                return None
+            except jwt.PyJWTError:
+                return None
+            self._remember(digest, payload)
+        
+        # La revocación se consulta siempre, también en los aciertos de la caché
+        if self.revocations.is_revoked(self._token_id(payload, digest), payload.get("sub"), payload.get("iat")):
             return None
+        return dict(payload)
     
     def get_user_from_token(self, token: str) -> Optional[Dict[str, Any]]:
         """Obtengo información del usuario desde el token"""
@@ -41,6 +66,68 @@ class JWTHandler:
                 "role": payload.get("role")
             }
         return None
+    
+    def revoke_token(self, token: str) -> bool:
+        """Revoco un token vigente (logout); devuelvo False si ya no era válido"""
+        payload = self.verify_token(token)
+        if payload is None:
+            return False
+        digest = hashlib.sha256(token.encode()).digest()
+        self.revocations.revoke_token(self._token_id(payload, digest), payload["exp"])
+        with self._lock:
+            self._verified.pop(digest, None)
+        return True
+    
+    def revoke_user(self, user_id: str) -> float:
+        """Revoco todos los tokens emitidos hasta ahora para el usuario (logout global o cambio de rol)"""
+        revoked_before = time.time()
+        self.revocations.revoke_user(user_id, revoked_before)
+        return revoked_before
+    
+    def _token_id(self, payload: Dict[str, Any], digest: bytes) -> str:
+        """Identifico el token por su jti; los emitidos antes de tener jti, por su digest"""
+        return payload.get("jti") or digest.hex()
+    
+    def _cached_claims(self, digest: bytes) -> Optional[Dict[str, Any]]:
+        """Obtengo los claims de un token ya verificado que no haya expirado"""
+        with self._lock:
+            payload = self._verified.get(digest)
+            if payload is not None and payload["exp"] > time.time():
+                self._verified.move_to_end(digest)
+                self.hits += 1
+                return payload
+            if payload is not None:
+                del self._verified[digest]
+            self.misses += 1
+            return None
+    
+    def _remember(self, digest: bytes, payload: Dict[str, Any]) -> None:
+        """Guardo los claims verificados; los tokens sin exp no se cachean"""
+        if self.cache_size <= 0 or not isinstance(payload.get("exp"), (int, float)):
+            return
+        with self._lock:
+            self._verified[digest] = payload
+            # Descarto los menos usados al superar el máximo
+            while len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+    
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._verified.clear()
+    
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._verified), "hits": self.hits, "misses": self.misses}
+    
+    def collect_metrics(self) -> List[MetricFamily]:
+        """Aciertos y fallos de la caché de tokens verificados para /metrics"""
+        stats = self.stats()
+        return [
+            MetricFamily("auth_token_cache_hits_total", "counter", "Tokens servidos desde la caché", (), {(): stats["hits"]}),
+            MetricFamily("auth_token_cache_misses_total", "counter", "Tokens verificados con la firma", (), {(): stats["misses"]}),
+            MetricFamily("auth_token_cache_entries", "gauge", "Tokens verificados en caché", (), {(): stats["entries"]})
+        ]
 
 # Instancia global
 jwt_handler = JWTHandler()
+metrics_registry.register_collector(jwt_handler.collect_metrics)
@@ -0,0 +1,169 @@
+import logging
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Optional
+from src.config import settings
+from src.services.database import db_service
+
+logger = logging.getLogger(__name__)
+
+class RevocationList(ABC):
+    """Tokens revocados (por id) y usuarios con sesiones revocadas antes de un instante"""
+
+    @abstractmethod
+    def is_revoked(self, token_id: str, user_id: Optional[str], issued_at: Optional[float]) -> bool:
+        """Indico si el token ya no debe aceptarse"""
+
+    @abstractmethod
+    def revoke_token(self, token_id: str, expires_at: float) -> None:
+        """Revoco un token hasta que expire (después ya no hace falta recordarlo)"""
+
+    @abstractmethod
+    def revoke_user(self, user_id: str, revoked_before: float) -> None:
+        """Revoco todos los tokens del usuario emitidos antes del instante indicado"""
+
+    def clear(self) -> None:
+        pass
+
+class InMemoryRevocationList(RevocationList):
+    """Lista en memoria del proceso; solo guarda entradas que todavía pueden afectar a un token vigente"""
+
+    def __init__(self, token_lifetime_seconds: Optional[float] = None, clock: Callable[[], float] = time.time):
+        self.token_lifetime_seconds = token_lifetime_seconds or settings.access_token_expire_minutes * 60
+        self.clock = clock
+        self._tokens: Dict[str, float] = {}
+        self._users: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def is_revoked(self, token_id: str, user_id: Optional[str], issued_at: Optional[float]) -> bool:
+        # Caso común: nada revocado, no hay nada que buscar
+        if not self._tokens and not self._users:
+            return False
+        expires_at = self._tokens.get(token_id)
+        if expires_at is not None and expires_at > self.clock():
+            return True
+        revoked_before = self._users.get(user_id)
+        # Un token sin iat no prueba que sea posterior a la revocación
+        return revoked_before is not None and (issued_at is None or issued_at < revoked_before)
+
+    def revoke_token(self, token_id: str, expires_at: float) -> None:
+        with self._lock:
+            self._tokens[token_id] = expires_at
+            self._prune()
+
+    def revoke_user(self, user_id: str, revoked_before: float) -> None:
+        with self._lock:
+            self._users[user_id] = max(revoked_before, self._users.get(user_id, 0.0))
+            self._prune()
+
+    def replace(self, tokens: Dict[str, float], users: Dict[str, float]) -> None:
+        """Reemplazo el contenido completo"""
+        with self._lock:
+            self._tokens = dict(tokens)
+            self._users = dict(users)
+            self._prune()
+
+    def merge(self, tokens: Dict[str, float], users: Dict[str, float]) -> None:
+        """Agrego lo leído del almacén compartido sin perder lo revocado localmente mientras leía"""
+        with self._lock:
+            self._tokens.update(tokens)
+            for user_id, revoked_before in users.items():
+                self._users[user_id] = max(revoked_before, self._users.get(user_id, 0.0))
+            self._prune()
+
+    def clear(self) -> None:
+        self.replace({}, {})
+
+    def _prune(self) -> None:
+        """Descarto lo que ya no afecta a ningún token vigente (se llama con el lock tomado)"""
+        now = self.clock()
+        self._tokens = {token_id: expires_at for token_id, expires_at in self._tokens.items() if expires_at > now}
+        # Pasada la vida de un token, todos los emitidos antes de la revocación ya expiraron
+        self._users = {
+            user_id: revoked_before for user_id, revoked_before in self._users.items()
+            if revoked_before + self.token_lifetime_seconds > now
+        }
+
+class DynamoDBRevocationList(InMemoryRevocationList):
+    """Lista compartida entre instancias: se escribe en DynamoDB y cada instancia la recarga periódicamente"""
+
+    def __init__(self, table_name: str = 'revocations', refresh_seconds: Optional[float] = None,
+                 token_lifetime_seconds: Optional[float] = None, clock: Callable[[], float] = time.time):
+        super().__init__(token_lifetime_seconds, clock)
+        self.table_name = table_name
+        self.refresh_seconds = settings.auth_revocation_refresh_seconds if refresh_seconds is None else refresh_seconds
+        self._refreshed = -math.inf
+        self._refresh_lock = threading.Lock()
+
+    def is_revoked(self, token_id: str, user_id: Optional[str], issued_at: Optional[float]) -> bool:
+        # Nunca escaneo en el hilo de la petición: mientras recargo respondo con la última copia
+        if time.monotonic() - self._refreshed >= self.refresh_seconds:
+            self.refresh_in_background()
+        return super().is_revoked(token_id, user_id, issued_at)
+
+    def refresh_in_background(self) -> Optional[threading.Thread]:
+        """Lanzo la recarga en un hilo aparte si no hay otra en curso"""
+        if not self._refresh_lock.acquire(blocking=False):
+            return None
+        try:
+            thread = threading.Thread(target=self._reload, name="revocations-refresh", daemon=True)
+            thread.start()
+        except Exception:
+            self._refresh_lock.release()
+            raise
+        return thread
+
+    def refresh(self) -> None:
+        """Recargo en el hilo actual (jobs y pruebas); si ya hay una recarga en curso no hago nada"""
+        if self._refresh_lock.acquire(blocking=False):
+            self._reload()
+
+    def _reload(self) -> None:
+        """Recargo la tabla (es pequeña: las entradas expiran por TTL); se llama con el lock tomado"""
+        try:
+            tokens: Dict[str, float] = {}
+            users: Dict[str, float] = {}
+            for page in db_service.scan_pages(self.table_name):
+                for item in page:
+                    kind, _, subject = item['revocation_key'].partition('#')
+                    if kind == 'token':
+                        tokens[subject] = float(item['expires_at'])
+                    elif kind == 'user':
+                        users[subject] = float(item['revoked_before'])
+            # Las revocaciones no se deshacen: solo expiran, y eso ya lo resuelve _prune
+            self.merge(tokens, users)
+        except Exception as e:
+            # Sigo con la copia anterior; las revocaciones locales ya están aplicadas
+            logger.warning(f"No pude recargar la lista de revocación: {e!r}")
+        finally:
+            self._refreshed = time.monotonic()
+            self._refresh_lock.release()
+
+    def revoke_token(self, token_id: str, expires_at: float) -> None:
+        db_service.create_item(self.table_name, {
+            'revocation_key': f"token#{token_id}",
+            'expires_at': math.ceil(expires_at)
+        })
+        super().revoke_token(token_id, expires_at)
+
+    def revoke_user(self, user_id: str, revoked_before: float) -> None:
+        db_service.create_item(self.table_name, {
+            'revocation_key': f"user#{user_id}",
+            'revoked_before': revoked_before,
+            'expires_at': math.ceil(revoked_before + self.token_lifetime_seconds)
+        })
+        super().revoke_user(user_id, revoked_before)
+
+def build_revocation_list(kind: Optional[str] = None) -> RevocationList:
+    """Creo la lista configurada en AUTH_REVOCATION_STORE"""
+    kind = kind or settings.auth_revocation_store
+    if kind == "dynamodb":
+        return DynamoDBRevocationList()
+    if kind == "memory":
+        return InMemoryRevocationList()
+    raise ValueError(f"Almacén de revocaciones desconocido: {kind}")
+
+# Instancia global de la lista de revocación
+revocation_list = build_revocation_list()
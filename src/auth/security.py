@@ -1,15 +1,19 @@
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, Request, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
 from src.auth.jwt_handler import jwt_handler
 from src.services.user_service import user_service
+from src.profiling import timed
 
 security = HTTPBearer()
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+async def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     """Obtengo usuario actual desde token JWT"""
-    token = credentials.credentials
-    user_data = jwt_handler.get_user_from_token(token)
+    # El rate limit y los lotes dejan en el scope el usuario ya verificado
+    user_data = getattr(request.state, "current_user", None)
+    if user_data is None:
+        with timed("auth"):
+            user_data = jwt_handler.get_user_from_token(credentials.credentials)
     
     if not user_data:
         raise HTTPException(
@@ -20,9 +24,9 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     
     return user_data
 
-async def get_current_user_full(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+async def get_current_user_full(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     """Obtengo usuario completo desde base de datos"""
-    user_data = await get_current_user(credentials)
+    user_data = await get_current_user(request, credentials)
     user = user_service.get_user(user_data["user_id"])
     return user
 
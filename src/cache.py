@@ -0,0 +1,111 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+from src.config import settings
+from src.metrics import MetricFamily, metrics_registry
+
+class ResponseCache:
+    """Caché en memoria de respuestas con expiración e invalidación por etiquetas"""
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries or settings.response_cache_max_entries
+        self.ttl_seconds = settings.response_cache_ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, Tuple[str, ...]]]" = OrderedDict()
+        self._tags: Dict[str, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Obtengo (encontrado, valor); las entradas vencidas cuentan como fallo"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry:
+                self._remove(key)
+            self.misses += 1
+            return False, None
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str] = (), ttl_seconds: Optional[float] = None) -> None:
+        """Guardo un valor asociado a las etiquetas que lo invalidan"""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        tags = tuple(tags)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            # Descarto las menos usadas al superar el máximo
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, *tags: str) -> int:
+        """Elimino las entradas asociadas a cualquiera de las etiquetas"""
+        removed = 0
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+                    removed += 1
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def collect_metrics(self) -> List[MetricFamily]:
+        """Aciertos y fallos para /metrics (el ratio se calcula en Prometheus sumando los workers)"""
+        stats = self.stats()
+        labels = ("response",)
+        return [
+            MetricFamily("cache_hits_total", "counter", "Aciertos de caché", ("cache",), {labels: stats["hits"]}),
+            MetricFamily("cache_misses_total", "counter", "Fallos de caché", ("cache",), {labels: stats["misses"]}),
+            MetricFamily("cache_entries", "gauge", "Entradas vigentes en caché", ("cache",), {labels: stats["entries"]})
+        ]
+
+    def _remove(self, key: Hashable) -> None:
+        """Quito una entrada y sus referencias por etiqueta (se llama con el lock tomado)"""
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+# Instancia global de la caché de respuestas
+response_cache = ResponseCache()
+metrics_registry.register_collector(response_cache.collect_metrics)
+
+def cached_response(namespace: str, tags: Callable[..., Iterable[str]], ttl_seconds: Optional[float] = None):
+    """Cacheo la respuesta de un endpoint por ruta, usuario y parámetros (opt-in con RESPONSE_CACHE_ENABLED)"""
+    def decorator(endpoint: Callable):
+        @functools.wraps(endpoint)
+        async def wrapper(**kwargs):
+            if not settings.response_cache_enabled:
+                return await endpoint(**kwargs)
+
+            current_user = kwargs.get("current_user") or {}
+            principal = (current_user.get("user_id"), current_user.get("role"))
+            params = tuple(sorted((name, repr(value)) for name, value in kwargs.items() if name != "current_user"))
+            key = (namespace, principal, params)
+
+            found, value = response_cache.get(key)
+            if found:
+                return value
+            value = await endpoint(**kwargs)
+            response_cache.set(key, value, tags(**kwargs), ttl_seconds)
+            return value
+        return wrapper
+    return decorator
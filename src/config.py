@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     # Configuración de AWS
@@ -11,6 +11,10 @@ class Settings(BaseSettings):
     secret_key: str = "btg-funds-secret-key-2025"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    # Tokens ya verificados que se reutilizan sin volver a calcular la firma (0 la desactiva)
+    auth_token_cache_size: int = 10000
+    auth_revocation_store: str = "memory"  # "memory" (por instancia) o "dynamodb" (compartido entre instancias)
+    auth_revocation_refresh_seconds: float = 2.0  # Cada cuánto recarga la lista compartida cada instancia
     
     # Configuración de la aplicación
     app_name: str = "BTG Pactual Funds API"
@@ -26,6 +30,119 @@ class Settings(BaseSettings):
     dynamodb_table_subscriptions: str = "gtc-subscriptions"
     dynamodb_table_transactions: str = "gtc-transactions"
     dynamodb_table_notifications: str = "gtc-notifications"
+    dynamodb_table_ledger: str = "gtc-ledger-checkpoints"
+    dynamodb_table_rollups: str = "gtc-transaction-rollups"
+    dynamodb_table_rate_limits: str = "gtc-rate-limits"
+    dynamodb_table_portfolios: str = "gtc-portfolios"
+    dynamodb_table_revocations: str = "gtc-token-revocations"
+    
+    # Ledger de saldos
+    ledger_checkpoint_interval: int = 50  # Transacciones entre checkpoints
+    
+    # Agregados diarios de transacciones
+    rollup_max_report_days: int = 366
+    
+    # Despacho de notificaciones
+    notification_workers: int = 4
+    notification_queue_size: int = 1000
+    notification_email_backend: str = "file"  # file | loopback | http
+    notification_sms_backend: str = "file"  # file | loopback | http
+    notification_outbox_dir: str = "/tmp/gtc-outbox"
+    notification_email_provider_url: str = "http://127.0.0.1:8025/email/bulk"
+    notification_sms_provider_url: str = "http://127.0.0.1:8025/sms/bulk"
+    notification_email_batch_size: int = 100
+    notification_sms_batch_size: int = 100
+    notification_batch_window_ms: int = 200  # Espera máxima antes de enviar un lote incompleto
+    # Límites de envío (mensajes por segundo, 0 = sin límite); la ráfaga cubre RATE_BURST_SECONDS
+    notification_email_rate_limit: float = 0
+    notification_sms_rate_limit: float = 0
+    notification_provider_rate_limits: Dict[str, float] = {}  # Por proveedor, p. ej. {"127.0.0.1:8025": 50}
+    notification_rate_burst_seconds: float = 1.0
+    notification_max_attempts: int = 5  # Después pasa a dead_letter
+    notification_retry_base_seconds: float = 30.0
+    notification_retry_max_seconds: float = 3600.0
+    notification_retry_batch_size: int = 100
+    notification_retry_interval_seconds: float = 15.0
+    notification_ack_workers: int = 16  # Transiciones de estado concurrentes por lote entregado
+    notification_render_batch_size: int = 50  # Trabajos que un worker toma y renderiza juntos
+    notification_claim_timeout_seconds: float = 300.0  # Tras esto una notificación en processing vuelve a pending
+    default_locale: str = "es"  # Idioma de las plantillas de notificación
+    
+    # Resúmenes (digest): por canal, los tipos que se agrupan por usuario dentro de la ventana
+    notification_digest_window_ms: int = 30000  # 0 desactiva los resúmenes
+    notification_digest_max_items: int = 10
+    notification_digest_rules: Dict[str, List[str]] = {
+        "sms": ["subscription_confirmation", "cancellation_confirmation"]
+    }
+    
+    # Stream SSE de notificaciones
+    notification_events_buffer_size: int = 1000  # Eventos recientes para reanudar con Last-Event-ID
+    notification_events_queue_size: int = 100  # Eventos en espera por conexión
+    notification_events_keepalive_seconds: float = 15.0
+    notification_events_retry_ms: int = 3000
+    
+    # Caché HTTP: ETag/304 para las lecturas y caché de respuestas en el servidor (opt-in)
+    http_cache_control_default: str = "private, no-cache"  # Siempre revalida con el ETag
+    http_cache_control_rules: Dict[str, str] = {"/api/v1/funds": "private, max-age=60"}
+    etag_max_body_bytes: int = 4 * 1024 * 1024
+    response_cache_enabled: bool = False
+    response_cache_ttl_seconds: float = 30.0
+    response_cache_max_entries: int = 5000
+    
+    # Límites por usuario y clase de ruta (se aplican antes de llegar a DynamoDB)
+    rate_limit_enabled: bool = True
+    rate_limit_store: str = "memory"  # "memory" (por instancia) o "dynamodb" (compartido entre instancias)
+    rate_limit_max_keys: int = 10000
+    rate_limit_classes: Dict[str, Dict[str, float]] = {
+        "default": {"rate": 20, "burst": 40},
+        "auth": {"rate": 1, "burst": 10},
+        "expensive": {"rate": 0.5, "burst": 5, "concurrency": 4}
+    }
+    # Prefijo de ruta (opcionalmente con método, p. ej. "GET /api/v1/users") → clase
+    rate_limit_route_classes: Dict[str, str] = {
+        "/api/v1/auth": "auth",
+        "/api/v1/admin": "expensive"
+    }
+    
+    # Lotes de peticiones (POST /api/v1/batch)
+    batch_max_requests: int = 10
+    batch_request_timeout_seconds: float = 10
+    
+    # Lecturas idénticas concurrentes comparten una sola llamada a DynamoDB
+    single_flight_enabled: bool = True
+    
+    # Instrumentación por petición: Server-Timing y profiler por muestreo (opt-in)
+    server_timing_enabled: bool = False
+    profile_header: str = "X-Profile"  # Solo admin: perfila esta petición
+    profile_sample_rate: float = 0.0  # Fracción de peticiones perfiladas
+    profile_slow_ms: float = 500  # Las muestreadas solo se guardan si superan este tiempo
+    profile_interval_ms: float = 5
+    profile_dir: str = "profiles"  # En Lambda usar /tmp/profiles
+    
+    # Portafolio consolidado (GET /users/{user_id}/portfolio): consultas en paralelo
+    portfolio_fanout_workers: int = 16  # Hilos compartidos entre todas las peticiones
+    portfolio_timeout_seconds: float = 5.0
+    portfolio_recent_items: int = 10  # Últimas transacciones y notificaciones que se incluyen
+    
+    # Métricas en formato Prometheus (GET /metrics)
+    metrics_enabled: bool = True
+    metrics_multiproc_dir: Optional[str] = None  # Directorio común para uvicorn con varios workers
+    metrics_flush_seconds: float = 5.0  # Cada cuánto vuelca cada worker sus métricas
+    metrics_queue_depth_ttl_seconds: float = 30.0  # Cacheo del conteo de la cola en DynamoDB
+    
+    # Paginación de listas
+    page_default_limit: int = 50
+    page_max_limit: int = 500
+    
+    # Compresión de respuestas (gzip, o brotli si está instalado)
+    compression_minimum_size: int = 1024  # Bytes; las respuestas más pequeñas van sin comprimir
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 5
+    compression_route_rules: Dict[str, int] = {}  # Prefijo → tamaño mínimo (-1 desactiva)
+    
+    # Archivo histórico (capa fría)
+    archive_dir: str = "archive"
+    archive_horizon_days: int = 365  # Antigüedad a partir de la cual se archiva
     
     class Config:
         env_file = ".env"
@@ -61,8 +61,25 @@ class NotificationNotFoundException(BTGException):
         message = f"Notificación {notification_id} no encontrada"
         super().__init__(message, 404)
 
+class InvalidNotificationTransitionException(BTGException):
+    """Excepción cuando la notificación no está en el estado esperado para la transición"""
+    def __init__(self, notification_id: str, expected_status: str):
+        message = f"La notificación {notification_id} no está en estado {expected_status}"
+        super().__init__(message, 409)
+
+class BalanceChangedException(BTGException):
+    """Excepción cuando el saldo cambió entre la lectura y la escritura"""
+    def __init__(self, user_id: str):
+        message = f"El saldo del usuario {user_id} cambió durante la operación, intente de nuevo"
+        super().__init__(message, 409)
+
 class DuplicateUserException(BTGException):
     """Excepción cuando ya existe un usuario con ese email"""
     def __init__(self, email: str):
         message = f"Ya existe un usuario con el email {email}"
-        super().__init__(message, 400)
\ No newline at end of file
+        super().__init__(message, 400)
+class PortfolioTimeoutException(BTGException):
+    """Excepción cuando una fuente obligatoria del portafolio no respondió a tiempo"""
+    def __init__(self, section: str):
+        message = f"No se pudo obtener {section} a tiempo para armar el portafolio"
+        super().__init__(message, 504)
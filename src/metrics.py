@@ -0,0 +1,314 @@
+import bisect
+import functools
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Formato de exposición de texto de Prometheus (Starlette agrega el charset)
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+@dataclass
+class MetricFamily:
+    """Muestras de una métrica; en los histogramas cada valor es [conteo por bucket..., +Inf, suma]"""
+    name: str
+    type: str  # counter, gauge o histogram
+    help: str
+    labelnames: Tuple[str, ...]
+    samples: Dict[Tuple[str, ...], Any]
+    buckets: Tuple[float, ...] = ()
+
+class Counter:
+    """Contador monotónico por combinación de etiquetas"""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def collect(self) -> MetricFamily:
+        with self._lock:
+            samples = dict(self._values)
+        return MetricFamily(self.name, "counter", self.help, self.labelnames, samples)
+
+class Histogram:
+    """Histograma de latencias; guardo conteos por bucket y acumulo al exponer"""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = HTTP_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        # bisect_left deja el valor en el primer bucket con le >= valor (el último es +Inf)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labelvalues)
+            if counts is None:
+                counts = self._values[labelvalues] = [0.0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def collect(self) -> MetricFamily:
+        with self._lock:
+            samples = {labels: list(counts) for labels, counts in self._values.items()}
+        return MetricFamily(self.name, "histogram", self.help, self.labelnames, samples, self.buckets)
+
+class MetricsRegistry:
+    """Registro de métricas del proceso; con varios workers cada uno vuelca su copia a un directorio común"""
+
+    def __init__(self, multiproc_dir: Optional[str] = None, flush_seconds: Optional[float] = None):
+        self.multiproc_dir = multiproc_dir if multiproc_dir is not None else settings.metrics_multiproc_dir
+        self.flush_seconds = flush_seconds or settings.metrics_flush_seconds
+        self._metrics: Dict[str, Any] = {}
+        # (colector, por_proceso): los por proceso se suman entre workers, los demás se calculan al exponer
+        self._collectors: List[Tuple[Callable[[], List[MetricFamily]], bool]] = []
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = HTTP_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], List[MetricFamily]], per_process: bool = True) -> None:
+        """Agrego un colector que se consulta al exponer (p. ej. contadores que ya lleva otro componente)"""
+        self._collectors.append((collector, per_process))
+
+    def _run_collectors(self, per_process: bool) -> List[MetricFamily]:
+        families = []
+        for collector, collector_per_process in self._collectors:
+            if collector_per_process != per_process:
+                continue
+            # Un colector roto (p. ej. DynamoDB caído) no debe tumbar el resto de la exposición
+            try:
+                families.extend(collector())
+            except Exception as e:
+                logger.warning(f"Colector de métricas {getattr(collector, '__qualname__', collector)} falló: {e}")
+        return families
+
+    def collect_process(self) -> List[MetricFamily]:
+        """Obtengo las métricas propias de este proceso"""
+        return [metric.collect() for metric in list(self._metrics.values())] + self._run_collectors(True)
+
+    def collect(self) -> List[MetricFamily]:
+        """Obtengo las métricas de todos los workers más las que se calculan al momento"""
+        families = self.collect_process()
+        if self.multiproc_dir:
+            families = _merge(families + self._read_other_processes())
+        return families + self._run_collectors(False)
+
+    def render(self) -> str:
+        """Armo la exposición en formato de texto de Prometheus"""
+        lines: List[str] = []
+        for family in self.collect():
+            lines.append(f"# HELP {family.name} {_escape_help(family.help)}")
+            lines.append(f"# TYPE {family.name} {family.type}")
+            for labelvalues, value in sorted(family.samples.items()):
+                labels = list(zip(family.labelnames, labelvalues))
+                if family.type != "histogram":
+                    lines.append(f"{family.name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                cumulative = 0.0
+                for bound, count in zip(family.buckets + (float("inf"),), value):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else _format_value(bound)
+                    lines.append(f"{family.name}_bucket{_format_labels(labels + [('le', le)])} {_format_value(cumulative)}")
+                lines.append(f"{family.name}_sum{_format_labels(labels)} {_format_value(value[-1])}")
+                lines.append(f"{family.name}_count{_format_labels(labels)} {_format_value(cumulative)}")
+        return "\n".join(lines) + "\n"
+
+    # ==================== MULTIPROCESO ====================
+
+    def _snapshot_path(self) -> str:
+        return os.path.join(self.multiproc_dir, f"metrics-{os.getpid()}.json")
+
+    def flush(self) -> None:
+        """Vuelco las métricas del proceso a su archivo (escritura atómica)"""
+        if not self.multiproc_dir:
+            return
+        os.makedirs(self.multiproc_dir, exist_ok=True)
+        snapshot = {
+            "pid": os.getpid(),
+            "families": [
+                {
+                    "name": family.name, "type": family.type, "help": family.help,
+                    "labelnames": list(family.labelnames), "buckets": list(family.buckets),
+                    "samples": [[list(labels), value] for labels, value in family.samples.items()]
+                }
+                for family in self.collect_process()
+            ]
+        }
+        path = self._snapshot_path()
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as handle:
+            json.dump(snapshot, handle)
+        os.replace(temporary, path)
+
+    def _read_other_processes(self) -> List[MetricFamily]:
+        """Leo los volcados de los demás workers; los gauges de procesos muertos se descartan"""
+        families = []
+        own_path = self._snapshot_path()
+        for path in glob.glob(os.path.join(self.multiproc_dir, "metrics-*.json")):
+            if path == own_path:
+                continue
+            try:
+                with open(path, encoding="utf-8") as handle:
+                    snapshot = json.load(handle)
+            except (OSError, ValueError) as e:
+                logger.warning(f"No pude leer el volcado de métricas {path}: {e}")
+                continue
+            alive = _pid_alive(snapshot.get("pid", 0))
+            for data in snapshot.get("families", []):
+                # Los contadores de un worker que murió siguen contando; su gauge ya no existe
+                if data["type"] == "gauge" and not alive:
+                    continue
+                families.append(MetricFamily(
+                    data["name"], data["type"], data["help"], tuple(data["labelnames"]),
+                    {tuple(labels): value for labels, value in data["samples"]}, tuple(data["buckets"])
+                ))
+        return families
+
+    def start(self) -> None:
+        """Inicio el volcado periódico (solo con directorio multiproceso)"""
+        if not self.multiproc_dir or (self._thread and self._thread.is_alive()):
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name="metrics-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Detengo el volcado periódico y dejo escrito el último estado"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def _loop(self) -> None:
+        while not self._stop_event.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except OSError as e:
+                logger.warning(f"No pude volcar las métricas: {e}")
+
+def _merge(families: List[MetricFamily]) -> List[MetricFamily]:
+    """Sumo las muestras de la misma métrica que vienen de distintos procesos"""
+    merged: Dict[str, MetricFamily] = {}
+    for family in families:
+        target = merged.get(family.name)
+        if target is None:
+            merged[family.name] = MetricFamily(
+                family.name, family.type, family.help, family.labelnames,
+                {labels: (list(value) if family.type == "histogram" else value)
+                 for labels, value in family.samples.items()},
+                family.buckets
+            )
+            continue
+        for labels, value in family.samples.items():
+            current = target.samples.get(labels)
+            if current is None:
+                target.samples[labels] = list(value) if family.type == "histogram" else value
+            elif family.type != "histogram":
+                target.samples[labels] = current + value
+            elif len(current) == len(value):
+                # Si cambiaron los buckets entre despliegues, descarto el volcado viejo
+                target.samples[labels] = [a + b for a, b in zip(current, value)]
+    return list(merged.values())
+
+def _pid_alive(pid: int) -> bool:
+    """La señal 0 solo verifica que el proceso exista"""
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+def _format_labels(labels: List[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels:
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+# Instancia global del registro de métricas
+metrics_registry = MetricsRegistry()
+
+http_request_duration = metrics_registry.histogram(
+    "http_request_duration_seconds", "Latencia de las peticiones HTTP por ruta y estado (_count = peticiones)",
+    ("method", "route", "status")
+)
+dynamodb_operation_duration = metrics_registry.histogram(
+    "dynamodb_operation_duration_seconds", "Latencia de las operaciones contra DynamoDB",
+    ("operation", "table"), DB_BUCKETS
+)
+dynamodb_items = metrics_registry.counter(
+    "dynamodb_items_total", "Elementos leídos o escritos en DynamoDB", ("operation", "table")
+)
+dynamodb_errors = metrics_registry.counter(
+    "dynamodb_errors_total", "Operaciones contra DynamoDB que terminaron en error", ("operation", "table")
+)
+
+def _one(result: Any) -> int:
+    return 1
+
+def observe_db(operation: str, count_items: Callable[[Any], int] = _one,
+               table_label: Optional[Callable[[Any], str]] = None):
+    """Registro latencia, elementos y errores de una operación de db_service (el primer argumento es la tabla)"""
+    def decorator(function: Callable):
+        @functools.wraps(function)
+        def wrapper(self, target: Any, *args, **kwargs):
+            if not settings.metrics_enabled:
+                return function(self, target, *args, **kwargs)
+            # Las operaciones que tocan varias tablas derivan la etiqueta de su primer argumento
+            table_name = table_label(target) if table_label else target
+            started = time.perf_counter()
+            try:
+                result = function(self, target, *args, **kwargs)
+            except Exception:
+                dynamodb_errors.inc(operation, table_name)
+                raise
+            finally:
+                dynamodb_operation_duration.observe(time.perf_counter() - started, operation, table_name)
+            dynamodb_items.inc(operation, table_name, amount=count_items(result))
+            return result
+        return wrapper
+    return decorator
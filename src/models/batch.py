@@ -0,0 +1,34 @@
+from pydantic import BaseModel, Field, field_validator
+from typing import Any, List, Optional
+from src.config import settings
+
+# Rutas que responden en streaming (SSE, exportaciones): su respuesta no se puede juntar en el lote
+STREAMING_PATH_SUFFIXES = ("/stream", "/transactions/export")
+
+class BatchSubRequest(BaseModel):
+    # Identificador opcional del cliente para relacionar cada respuesta con su petición
+    id: Optional[str] = None
+    method: str = Field("GET", pattern="^(GET|POST|PUT|DELETE)$")
+    path: str = Field(..., pattern="^/api/v1/")
+    body: Optional[Any] = None
+
+    @field_validator("path")
+    @classmethod
+    def validate_path(cls, path: str) -> str:
+        route = path.split("?", 1)[0].rstrip("/")
+        if route == "/api/v1/batch":
+            raise ValueError("Un lote no puede contener otro lote")
+        if route.endswith(STREAMING_PATH_SUFFIXES):
+            raise ValueError("Un lote no puede contener rutas en streaming")
+        return path
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest] = Field(..., min_length=1, max_length=settings.batch_max_requests)
+
+class BatchSubResponse(BaseModel):
+    id: Optional[str] = None
+    status: int
+    body: Optional[Any] = None
+
+class BatchResponse(BaseModel):
+    responses: List[BatchSubResponse]
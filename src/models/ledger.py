@@ -0,0 +1,29 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from src.models.transaction import TransactionResponse
+
+class LedgerCheckpoint(BaseModel):
+    user_id: str
+    checkpoint_at: str
+    balance: float
+    transaction_id: str
+    transaction_count: int
+    mismatches: int = 0
+    created_at: str
+
+class LedgerBalanceResponse(BaseModel):
+    user_id: str
+    at: str
+    balance: float
+    checkpoint_at: Optional[str] = None
+    tail_transactions: int
+    verified: bool
+
+class LedgerStatementResponse(BaseModel):
+    user_id: str
+    date_from: str
+    date_to: str
+    opening_balance: float
+    closing_balance: float
+    transactions: List[TransactionResponse]
+    verified: bool
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, Field, model_validator
+from typing import Any, Dict, List, Optional
 from enum import Enum
 
 class NotificationType(str, Enum):
@@ -12,23 +12,36 @@ class NotificationChannel(str, Enum):
 
 class NotificationStatus(str, Enum):
     PENDING = "pending"
+    PROCESSING = "processing"
     SENT = "sent"
     FAILED = "failed"
+    DEAD_LETTER = "dead_letter"
 
 class NotificationCreate(BaseModel):
     user_id: str
     type: NotificationType
     channel: NotificationChannel
-    content: str
+    content: Optional[str] = None
+    # Con plantilla se guardan solo el id y los parámetros; el texto se renderiza al enviar
+    template_id: Optional[str] = None
+    params: Optional[Dict[str, Any]] = None
     status: NotificationStatus = NotificationStatus.PENDING
 
+    @model_validator(mode="after")
+    def validate_content(self):
+        if not self.content and not self.template_id:
+            raise ValueError("La notificación requiere contenido o plantilla")
+        return self
+
 class Notification(BaseModel):
     notification_id: str
     user_id: str
     type: NotificationType
     channel: NotificationChannel
     status: NotificationStatus
-    content: str
+    content: Optional[str] = None
+    template_id: Optional[str] = None
+    params: Optional[Dict[str, Any]] = None
     created_at: str
     sent_at: Optional[str] = None
 
@@ -38,6 +51,19 @@ class NotificationResponse(BaseModel):
     type: str
     channel: str
     status: str
-    content: str
+    content: Optional[str] = None
+    template_id: Optional[str] = None
+    params: Optional[Dict[str, Any]] = None
     created_at: str
-    sent_at: Optional[str] = None
\ No newline at end of file
+    sent_at: Optional[str] = None
+    attempts: int = 0
+    next_attempt_at: Optional[str] = None
+    claimed_at: Optional[str] = None
+
+class NotificationRequeueRequest(BaseModel):
+    notification_ids: Optional[List[str]] = None
+    limit: int = Field(100, gt=0, le=1000)
+
+class NotificationRequeueResponse(BaseModel):
+    requeued: int
+    notification_ids: List[str]
\ No newline at end of file
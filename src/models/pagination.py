@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+from typing import Generic, List, Optional, TypeVar
+
+ItemT = TypeVar("ItemT")
+
+class PageResponse(BaseModel, Generic[ItemT]):
+    items: List[ItemT]
+    # Token opaco para pedir la siguiente página; None cuando no hay más
+    next_cursor: Optional[str] = None
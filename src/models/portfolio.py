@@ -0,0 +1,27 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from src.models.transaction import TransactionResponse
+from src.models.notification import NotificationResponse
+
+class PortfolioPosition(BaseModel):
+    subscription_id: str
+    fund_id: str
+    fund_name: Optional[str] = None
+    category: Optional[str] = None
+    amount: float
+    subscribed_at: str
+
+class PortfolioSummaryResponse(BaseModel):
+    user_id: str
+    balance: float
+    total_invested: float
+    positions: List[PortfolioPosition]
+    # Se incrementa en cada escritura del documento materializado
+    version: int
+    updated_at: Optional[str] = None
+
+class PortfolioResponse(PortfolioSummaryResponse):
+    recent_transactions: List[TransactionResponse]
+    recent_notifications: List[NotificationResponse]
+    # Secciones opcionales que no respondieron a tiempo (la respuesta sale igual, sin ellas)
+    unavailable: List[str] = []
@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+class TransactionRollup(BaseModel):
+    day: str
+    fund_id: str
+    type: str
+    count: int
+    amount_sum: float
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+    distinct_users: int
+
+class TransactionReportResponse(BaseModel):
+    date_from: str
+    date_to: str
+    rollups: List[TransactionRollup]
+    total_count: int
+    total_amount: float
+    distinct_users: int
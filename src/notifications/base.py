@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+import urllib.parse
+import urllib.request
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, asdict, field
+from typing import List, Optional
+from src.utils import get_current_timestamp
+
+class DeliveryError(Exception):
+    """El proveedor rechazó o no pudo entregar un mensaje"""
+
+@dataclass
+class OutboundMessage:
+    """Mensaje listo para entregar por un canal"""
+    notification_id: str
+    user_id: str
+    channel: str
+    recipient: str
+    body: str
+    subject: Optional[str] = None
+    created_at: str = field(default_factory=get_current_timestamp)
+    # En un resumen, las demás notificaciones que se confirman junto con esta
+    merged_ids: List[str] = field(default_factory=list)
+
+    @property
+    def notification_ids(self) -> List[str]:
+        return [self.notification_id, *self.merged_ids]
+
+class ChannelBackend(ABC):
+    """Proveedor que entrega los mensajes de un canal"""
+    name = "base"
+
+    @property
+    def provider_id(self) -> str:
+        """Identifico al proveedor para compartir sus límites de envío entre canales"""
+        return self.name
+
+    @abstractmethod
+    def send(self, message: OutboundMessage) -> None:
+        """Entrego un mensaje; lanzo excepción si el proveedor lo rechaza"""
+
+    def send_bulk(self, messages: List[OutboundMessage]) -> List[Optional[str]]:
+        """Entrego un lote; devuelvo el error de cada mensaje (None si se entregó)"""
+        errors = []
+        for message in messages:
+            try:
+                self.send(message)
+                errors.append(None)
+            except Exception as e:
+                errors.append(str(e))
+        return errors
+
+class FileBackend(ChannelBackend):
+    """Sustituto local: escribo cada mensaje como una línea JSON en un archivo"""
+    name = "file"
+
+    def __init__(self, outbox_dir: str, channel: str):
+        self.path = os.path.join(outbox_dir, f"{channel}.jsonl")
+        self._lock = threading.Lock()
+        os.makedirs(outbox_dir, exist_ok=True)
+
+    def send(self, message: OutboundMessage) -> None:
+        self.send_bulk([message])
+
+    def send_bulk(self, messages: List[OutboundMessage]) -> List[Optional[str]]:
+        lines = "".join(json.dumps(asdict(message), ensure_ascii=False) + "\n" for message in messages)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as outbox:
+                outbox.write(lines)
+        return [None] * len(messages)
+
+class LoopbackBackend(ChannelBackend):
+    """Sustituto en memoria: guardo los últimos mensajes enviados (útil en pruebas)"""
+    name = "loopback"
+
+    def __init__(self, max_messages: int = 1000):
+        self.sent = deque(maxlen=max_messages)
+        self.calls = 0
+
+    def send(self, message: OutboundMessage) -> None:
+        self.sent.append(message)
+
+    def send_bulk(self, messages: List[OutboundMessage]) -> List[Optional[str]]:
+        self.calls += 1
+        self.sent.extend(messages)
+        return [None] * len(messages)
+
+    def messages(self) -> List[OutboundMessage]:
+        return list(self.sent)
+
+class HTTPBulkBackend(ChannelBackend):
+    """Proveedor HTTP con API de envío masivo (o el servidor stub local)"""
+    name = "http"
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url
+        self.timeout = timeout
+
+    @property
+    def provider_id(self) -> str:
+        return urllib.parse.urlsplit(self.url).netloc
+
+    def send(self, message: OutboundMessage) -> None:
+        error = self.send_bulk([message])[0]
+        if error:
+            raise DeliveryError(error)
+
+    def send_bulk(self, messages: List[OutboundMessage]) -> List[Optional[str]]:
+        payload = json.dumps({"messages": [asdict(message) for message in messages]}).encode("utf-8")
+        request = urllib.request.Request(
+            self.url,
+            data=payload,
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            results = json.loads(response.read().decode("utf-8")).get("results", [])
+
+        # El proveedor responde un resultado por mensaje, en el mismo orden
+        if len(results) != len(messages):
+            raise DeliveryError("El proveedor devolvió una cantidad de resultados inesperada")
+        return [None if result.get("ok") else result.get("error", "rechazado") for result in results]
+
+def build_backend(backend_name: str, outbox_dir: str, channel: str,
+                  provider_url: Optional[str] = None) -> ChannelBackend:
+    """Creo el proveedor configurado para un canal"""
+    if backend_name == "file":
+        return FileBackend(outbox_dir, channel)
+    if backend_name == "loopback":
+        return LoopbackBackend()
+    if backend_name == "http":
+        return HTTPBulkBackend(provider_url)
+    raise ValueError(f"Proveedor de notificaciones desconocido: {backend_name}")
@@ -0,0 +1,215 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+from src.notifications.base import ChannelBackend, DeliveryError, OutboundMessage
+from src.rate_limit import TokenBucket, acquire_all
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Firma de los oyentes de cada lote: (canal, mensajes, errores por mensaje)
+FlushListener = Callable[[str, List[OutboundMessage], List[Optional[str]]], None]
+
+class ChannelMetrics:
+    """Métricas de rendimiento de un canal: throughput y latencia por lote"""
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self._lock = threading.Lock()
+        self._started_at = time.monotonic()
+        self.messages = 0
+        self.failures = 0
+        self.batches = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.total_queue_wait = 0.0
+        self.throttled = 0
+        self.total_throttle_wait = 0.0
+
+    def record_throttle(self, wait: float) -> None:
+        """Registro un lote que volvió a la cola por falta de tokens"""
+        with self._lock:
+            self.throttled += 1
+            self.total_throttle_wait += wait
+
+    def record_batch(self, size: int, failures: int, latency: float, queue_wait: float) -> None:
+        """Registro el resultado de una llamada al proveedor"""
+        with self._lock:
+            self.messages += size
+            self.failures += failures
+            self.batches += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            self.total_queue_wait += queue_wait
+
+    def snapshot(self) -> Dict[str, float]:
+        """Resumen de las métricas acumuladas"""
+        with self._lock:
+            elapsed = max(time.monotonic() - self._started_at, 1e-9)
+            batches = self.batches or 1
+            messages = self.messages or 1
+            return {
+                "messages": self.messages,
+                "failures": self.failures,
+                "provider_calls": self.batches,
+                "avg_batch_size": round(self.messages / batches, 2),
+                "avg_latency_ms": round(self.total_latency / batches * 1000, 3),
+                "max_latency_ms": round(self.max_latency * 1000, 3),
+                "avg_queue_wait_ms": round(self.total_queue_wait / messages * 1000, 3),
+                "throughput_per_second": round(self.messages / elapsed, 2),
+                "throttled": self.throttled,
+                "throttle_wait_ms": round(self.total_throttle_wait * 1000, 3)
+            }
+
+# Los límites de un proveedor se comparten entre todos los canales que lo usan
+_provider_buckets: Dict[str, TokenBucket] = {}
+_provider_buckets_lock = threading.Lock()
+
+def get_provider_bucket(provider_id: str, rate: float, burst_seconds: float) -> TokenBucket:
+    """Obtengo (o creo) el token bucket compartido de un proveedor"""
+    with _provider_buckets_lock:
+        if provider_id not in _provider_buckets:
+            _provider_buckets[provider_id] = TokenBucket(rate, max(1.0, rate * burst_seconds))
+        return _provider_buckets[provider_id]
+
+def build_rate_buckets(backend: ChannelBackend, channel_rate: float) -> List[TokenBucket]:
+    """Armo los límites configurados para un canal y su proveedor"""
+    burst_seconds = settings.notification_rate_burst_seconds
+    buckets = []
+    if channel_rate > 0:
+        buckets.append(TokenBucket(channel_rate, max(1.0, channel_rate * burst_seconds)))
+    provider_rate = settings.notification_provider_rate_limits.get(backend.provider_id, 0)
+    if provider_rate > 0:
+        buckets.append(get_provider_bucket(backend.provider_id, provider_rate, burst_seconds))
+    return buckets
+
+class BatchingChannel:
+    """Canal que acumula mensajes y los entrega por lotes (por tamaño o ventana de tiempo)"""
+    channel = "base"
+
+    def __init__(self, backend: ChannelBackend, batch_size: int, window_seconds: float,
+                 rate_buckets: Optional[List[TokenBucket]] = None):
+        self.backend = backend
+        # Cada mensaje consume un token de cada bucket (canal y proveedor)
+        self.rate_buckets = rate_buckets or []
+        capacity = min([bucket.capacity for bucket in self.rate_buckets], default=batch_size)
+        # Un lote nunca pide más tokens de los que caben en el bucket
+        self.batch_size = max(1, min(batch_size, int(capacity)))
+        self.window_seconds = window_seconds
+        self.metrics = ChannelMetrics(self.channel)
+        self._buffer: List[Tuple[OutboundMessage, Future, float]] = []
+        self._condition = threading.Condition()
+        self._flusher: Optional[threading.Thread] = None
+        self._listeners: List[FlushListener] = []
+
+    def add_flush_listener(self, listener: FlushListener) -> None:
+        """Registro una función que recibe el resultado de cada lote"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def pending(self) -> int:
+        """Mensajes en el buffer esperando ser enviados"""
+        with self._condition:
+            return len(self._buffer)
+
+    def submit(self, message: OutboundMessage) -> Future:
+        """Agrego un mensaje al buffer; el futuro se resuelve cuando se envía su lote"""
+        future: Future = Future()
+        with self._condition:
+            self._ensure_flusher()
+            self._buffer.append((message, future, time.monotonic()))
+            if len(self._buffer) >= self.batch_size:
+                self._condition.notify()
+        return future
+
+    def send(self, message: OutboundMessage) -> None:
+        """Envío un mensaje y espero a que su lote se entregue"""
+        self.submit(message).result()
+
+    def flush(self) -> None:
+        """Entrego de inmediato todo lo que hay en el buffer, respetando los límites de envío"""
+        while True:
+            with self._condition:
+                batch = self._take_batch()
+                wait = self._admit(batch)
+            if not batch:
+                return
+            if wait:
+                time.sleep(wait)
+                continue
+            self._deliver(batch)
+
+    def _ensure_flusher(self) -> None:
+        """Inicio el hilo que vacía el buffer (se llama con el lock tomado)"""
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(
+                target=self._flusher_loop,
+                name=f"{self.channel}-flusher",
+                daemon=True
+            )
+            self._flusher.start()
+
+    def _take_batch(self) -> List[Tuple[OutboundMessage, Future, float]]:
+        """Saco del buffer hasta un lote completo (se llama con el lock tomado)"""
+        batch = self._buffer[:self.batch_size]
+        del self._buffer[:self.batch_size]
+        return batch
+
+    def _admit(self, batch: List[Tuple[OutboundMessage, Future, float]]) -> float:
+        """Pido tokens para el lote y devuelvo la espera si no alcanzan (se llama con el lock tomado)"""
+        if not batch or not self.rate_buckets:
+            return 0.0
+        wait = acquire_all(self.rate_buckets, len(batch))
+        if wait:
+            # El lote vuelve al frente del buffer para conservar el orden
+            self._buffer[:0] = batch
+            self.metrics.record_throttle(wait)
+        return wait
+
+    def _flusher_loop(self) -> None:
+        """Envío un lote cuando se llena o cuando vence la ventana del mensaje más antiguo"""
+        while True:
+            with self._condition:
+                while not self._buffer:
+                    self._condition.wait()
+                deadline = self._buffer[0][2] + self.window_seconds
+                while self._buffer and len(self._buffer) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._take_batch()
+                wait = self._admit(batch)
+                if wait:
+                    # Sin tokens: el lote espera en el buffer en vez de fallar
+                    self._condition.wait(wait)
+                    continue
+            if batch:
+                self._deliver(batch)
+
+    def _deliver(self, batch: List[Tuple[OutboundMessage, Future, float]]) -> None:
+        """Hago una sola llamada al proveedor para todo el lote"""
+        messages = [message for message, _, _ in batch]
+        started = time.monotonic()
+        try:
+            errors = self.backend.send_bulk(messages)
+        except Exception as e:
+            errors = [str(e)] * len(messages)
+        latency = time.monotonic() - started
+
+        queue_wait = sum(started - queued_at for _, _, queued_at in batch)
+        self.metrics.record_batch(len(batch), sum(1 for error in errors if error), latency, queue_wait)
+
+        for (_, future, _), error in zip(batch, errors):
+            if error:
+                future.set_exception(DeliveryError(error))
+            else:
+                future.set_result(None)
+
+        for listener in self._listeners:
+            try:
+                listener(self.channel, messages, errors)
+            except Exception as e:
+                logger.error(f"Error en el oyente del canal {self.channel}: {e}")
@@ -0,0 +1,141 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from src.notifications.base import OutboundMessage
+from src.notifications.templates import TemplateError, TemplateRegistry, template_registry
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+DigestKey = Tuple[str, str]  # (usuario, canal)
+
+class DigestCoalescer:
+    """Agrupo las notificaciones de un mismo usuario y canal que llegan dentro de una ventana"""
+
+    def __init__(self, emit: Callable[[OutboundMessage], None], window_seconds: Optional[float] = None,
+                 max_items: Optional[int] = None, rules: Optional[Dict[str, List[str]]] = None,
+                 registry: Optional[TemplateRegistry] = None):
+        self.emit = emit
+        self.window_seconds = (settings.notification_digest_window_ms / 1000
+                               if window_seconds is None else window_seconds)
+        self.max_items = max(1, max_items or settings.notification_digest_max_items)
+        self.rules = {channel: set(types) for channel, types in
+                      (settings.notification_digest_rules if rules is None else rules).items()}
+        self.registry = registry or template_registry
+        # Como la ventana es fija, el orden de llegada es también el orden de vencimiento
+        self._buckets: "OrderedDict[DigestKey, Tuple[float, List[OutboundMessage]]]" = OrderedDict()
+        self._condition = threading.Condition()
+        self._flusher: Optional[threading.Thread] = None
+        self.digests = 0
+        self.merged = 0
+
+    def accepts(self, notification_type: str, channel: str) -> bool:
+        """Indico si ese tipo de notificación se agrupa en ese canal"""
+        return self.window_seconds > 0 and notification_type in self.rules.get(channel, ())
+
+    def pending(self) -> int:
+        """Mensajes retenidos esperando que venza su ventana"""
+        with self._condition:
+            return sum(len(messages) for _, messages in self._buckets.values())
+
+    def add(self, message: OutboundMessage) -> None:
+        """Retengo el mensaje en el resumen de su usuario y canal"""
+        key = (message.user_id, message.channel)
+        full = None
+        with self._condition:
+            self._ensure_flusher()
+            if key not in self._buckets:
+                self._buckets[key] = (time.monotonic() + self.window_seconds, [])
+                self._condition.notify()
+            messages = self._buckets[key][1]
+            messages.append(message)
+            if len(messages) >= self.max_items:
+                full = self._buckets.pop(key)[1]
+        if full:
+            self._emit(full)
+
+    def flush(self) -> None:
+        """Emito de inmediato todos los resúmenes retenidos"""
+        with self._condition:
+            buckets = [messages for _, messages in self._buckets.values()]
+            self._buckets.clear()
+        for messages in buckets:
+            self._emit(messages)
+
+    def _digest_params(self, messages: List[OutboundMessage]) -> Dict[str, str]:
+        separator = "\n- " if messages[0].channel == "email" else " | "
+        summary = separator.join(message.body for message in messages)
+        if messages[0].channel == "email":
+            summary = "- " + summary
+        return {"count": str(len(messages)), "summary": summary}
+
+    def split(self, messages: List[OutboundMessage]) -> List[List[OutboundMessage]]:
+        """Parto el lote en resúmenes que entren completos en el canal (un SMS no admite más de 160 caracteres)"""
+        template_id = self.registry.resolve("digest", messages[0].channel)
+        groups = [[messages[0]]]
+        for message in messages[1:]:
+            candidate = groups[-1] + [message]
+            if self.registry.fits(template_id, self._digest_params(candidate)):
+                groups[-1] = candidate
+            else:
+                groups.append([message])
+        return groups
+
+    def merge(self, messages: List[OutboundMessage]) -> OutboundMessage:
+        """Combino varios mensajes en uno; el primero da el id y los demás se confirman con él"""
+        first = messages[0]
+        if len(messages) == 1:
+            return first
+
+        template_id = self.registry.resolve("digest", first.channel)
+        params = self._digest_params(messages)
+        # Solo confirmo como enviadas las notificaciones cuyo texto va completo en el resumen
+        if not self.registry.fits(template_id, params):
+            raise TemplateError(f"El resumen de {len(messages)} mensajes no entra en un {first.channel}")
+        rendered = self.registry.render(template_id, params)
+        return OutboundMessage(
+            notification_id=first.notification_id,
+            user_id=first.user_id,
+            channel=first.channel,
+            recipient=first.recipient,
+            body=rendered.body,
+            subject=rendered.subject,
+            merged_ids=[notification_id for message in messages for notification_id in message.notification_ids][1:]
+        )
+
+    def _emit(self, messages: List[OutboundMessage]) -> None:
+        try:
+            groups = self.split(messages)
+            merged = [self.merge(group) for group in groups]
+        except Exception as e:
+            # Si el resumen no se puede armar, envío los mensajes por separado
+            logger.error(f"No se pudo armar el resumen de {messages[0].user_id}: {e}")
+            for message in messages:
+                self.emit(message)
+            return
+        for group, message in zip(groups, merged):
+            if len(group) > 1:
+                self.digests += 1
+                self.merged += len(group)
+            self.emit(message)
+
+    def _ensure_flusher(self) -> None:
+        """Inicio el hilo que emite los resúmenes vencidos (se llama con el lock tomado)"""
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._flusher_loop, name="notification-digest", daemon=True)
+            self._flusher.start()
+
+    def _flusher_loop(self) -> None:
+        while True:
+            with self._condition:
+                while not self._buckets:
+                    self._condition.wait()
+                key, (deadline, _) = next(iter(self._buckets.items()))
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                messages = self._buckets.pop(key)[1]
+            self._emit(messages)
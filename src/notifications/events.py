@@ -0,0 +1,130 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from src.config import settings
+from src.utils import json_default
+
+@dataclass(frozen=True)
+class NotificationEvent:
+    """Evento de una notificación que se envía por SSE"""
+    event_id: int
+    user_id: str
+    event: str
+    data: Dict[str, Any]
+
+    def format(self) -> str:
+        """Formateo el evento según el protocolo de server-sent events"""
+        payload = json.dumps(self.data, default=json_default, ensure_ascii=False)
+        return f"id: {self.event_id}\nevent: {self.event}\ndata: {payload}\n\n"
+
+Subscriber = Tuple[asyncio.AbstractEventLoop, "asyncio.Queue[NotificationEvent]"]
+
+class NotificationEventBroker:
+    """Pub/sub en proceso: reparto los eventos de cada usuario a sus conexiones SSE"""
+
+    def __init__(self, buffer_size: Optional[int] = None, queue_size: Optional[int] = None,
+                 first_id: Optional[int] = None):
+        self.queue_size = queue_size or settings.notification_events_queue_size
+        # Buffer circular con los últimos eventos para reanudar con Last-Event-ID
+        self._history: "deque[NotificationEvent]" = deque(maxlen=buffer_size or settings.notification_events_buffer_size)
+        self._subscribers: Dict[str, Set[Subscriber]] = {}
+        # Los ids arrancan en el instante de inicio (µs): tras un reinicio siguen creciendo,
+        # y un Last-Event-ID del proceso anterior queda por debajo del buffer y fuerza el resync
+        first_id = int(time.time() * 1_000_000) if first_id is None else first_id
+        self._ids = itertools.count(first_id)
+        self._last_id = first_id - 1
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def publish(self, user_id: str, event: str, data: Dict[str, Any]) -> NotificationEvent:
+        """Publico un evento; se puede llamar desde cualquier hilo"""
+        with self._lock:
+            notification_event = NotificationEvent(next(self._ids), user_id, event, data)
+            self._last_id = notification_event.event_id
+            self._history.append(notification_event)
+            subscribers = list(self._subscribers.get(user_id, ()))
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, notification_event)
+            except RuntimeError:
+                # El loop de esa conexión ya se cerró
+                pass
+        return notification_event
+
+    def _offer(self, queue: "asyncio.Queue[NotificationEvent]", notification_event: NotificationEvent) -> None:
+        """Entrego el evento a una conexión; si está atrasada lo descarto (lo recupera con Last-Event-ID)"""
+        try:
+            queue.put_nowait(notification_event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def subscribe(self, user_id: str) -> "asyncio.Queue[NotificationEvent]":
+        """Registro una conexión del usuario en el loop actual"""
+        queue: "asyncio.Queue[NotificationEvent]" = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: "asyncio.Queue[NotificationEvent]") -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(user_id, set())
+            for subscriber in [s for s in subscribers if s[1] is queue]:
+                subscribers.discard(subscriber)
+            if not subscribers:
+                self._subscribers.pop(user_id, None)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def replay(self, user_id: str, last_event_id: int) -> Tuple[List[NotificationEvent], bool]:
+        """Obtengo los eventos posteriores a last_event_id e indico si el buffer ya no los cubre todos"""
+        with self._lock:
+            history = list(self._history)
+            last_id = self._last_id
+        # Incompleto si el buffer ya no llega hasta last_event_id o si el id no salió de este proceso
+        # (otra instancia o un proceso anterior): en ambos casos no sé qué se perdió
+        oldest_id = history[0].event_id if history else last_id + 1
+        complete = oldest_id <= last_event_id + 1 <= last_id + 1
+        return [event for event in history if event.user_id == user_id and event.event_id > last_event_id], complete
+
+    async def stream(self, user_id: str, last_event_id: Optional[int] = None,
+                     is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+                     keepalive_seconds: Optional[float] = None) -> AsyncIterator[str]:
+        """Genero el flujo SSE de un usuario: primero lo perdido y luego los eventos en vivo"""
+        keepalive = keepalive_seconds or settings.notification_events_keepalive_seconds
+        queue = self.subscribe(user_id)
+        sent_id = 0
+        try:
+            yield f"retry: {settings.notification_events_retry_ms}\n\n"
+            if last_event_id is not None:
+                missed, complete = self.replay(user_id, last_event_id)
+                if not complete:
+                    # Se perdieron eventos: el cliente debe volver a consultar la lista
+                    yield "event: resync\ndata: {}\n\n"
+                for notification_event in missed:
+                    sent_id = notification_event.event_id
+                    yield notification_event.format()
+
+            while not (is_disconnected and await is_disconnected()):
+                try:
+                    notification_event = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                # Un evento puede llegar por el buffer y por la cola; lo envío una sola vez
+                if notification_event.event_id <= sent_id:
+                    continue
+                sent_id = notification_event.event_id
+                yield notification_event.format()
+        finally:
+            self.unsubscribe(user_id, queue)
+
+# Instancia global del broker de eventos
+notification_events = NotificationEventBroker()
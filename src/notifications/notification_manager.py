@@ -0,0 +1,301 @@
+import logging
+import queue
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from src.notifications.base import OutboundMessage
+from src.notifications.templates import RenderedMessage, template_registry
+from src.notifications.digest import DigestCoalescer
+from src.notifications.email_service import email_service
+from src.notifications.sms_service import sms_service
+from src.services.notification_service import notification_service
+from src.services.user_service import user_service
+from src.models.notification import NotificationResponse
+from src.exceptions import BTGException
+from src.config import settings
+from src.metrics import MetricFamily, metrics_registry
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class NotificationJob:
+    """Trabajo de envío de una notificación ya persistida y reclamada (processing)"""
+    notification_id: str
+    user_id: str
+    type: str
+    channel: str
+    content: Optional[str] = None
+    recipient: Optional[str] = None
+    template_id: Optional[str] = None
+    params: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_notification(cls, notification: NotificationResponse, recipient: Optional[str] = None) -> "NotificationJob":
+        return cls(
+            notification_id=notification.notification_id,
+            user_id=notification.user_id,
+            type=notification.type,
+            channel=notification.channel,
+            content=notification.content,
+            recipient=recipient,
+            template_id=notification.template_id,
+            params=notification.params
+        )
+
+# Marca para detener a los workers
+_STOP = object()
+
+class NotificationManager:
+    """Despachador asíncrono: cola en proceso + pool acotado de workers"""
+
+    def __init__(self, max_workers: int = None, queue_size: int = None):
+        self.max_workers = max_workers or settings.notification_workers
+        self.render_batch_size = max(1, settings.notification_render_batch_size)
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size or settings.notification_queue_size)
+        self._channels = {}
+        self.digest = DigestCoalescer(self._submit)
+        self.register_channel("email", email_service)
+        self.register_channel("sms", sms_service)
+        self._workers: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"enqueued": 0, "rejected": 0, "sent": 0, "failed": 0}
+
+    def _count(self, stat: str, amount: int = 1) -> None:
+        """Incremento una métrica de forma segura entre hilos"""
+        with self._stats_lock:
+            self._stats[stat] += amount
+
+    def register_channel(self, channel: str, service: Any) -> None:
+        """Registro (o reemplazo) el servicio que entrega un canal"""
+        self._channels[channel] = service
+        # El resultado de cada lote llega por el oyente, no por el worker
+        service.add_flush_listener(self._on_flush)
+
+    @property
+    def running(self) -> bool:
+        return any(worker.is_alive() for worker in self._workers)
+
+    def start(self) -> None:
+        """Inicio los workers si aún no están corriendo"""
+        with self._lock:
+            if self.running:
+                return
+            self._workers = [
+                threading.Thread(target=self._worker_loop, name=f"notification-worker-{i}", daemon=True)
+                for i in range(self.max_workers)
+            ]
+            for worker in self._workers:
+                worker.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Detengo los workers después de vaciar lo que ya está en cola"""
+        with self._lock:
+            workers = self._workers
+            for _ in workers:
+                try:
+                    self._queue.put(_STOP, timeout=timeout)
+                except queue.Full:
+                    logger.warning("Cola de notificaciones llena al detener los workers")
+                    break
+            for worker in workers:
+                worker.join(timeout)
+            self._workers = []
+        self.digest.flush()
+        for service in self._channels.values():
+            service.flush()
+
+    def enqueue(self, job: NotificationJob) -> bool:
+        """Encolo un envío sin bloquear; si la cola está llena queda pendiente en la tabla"""
+        self.start()
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self._count("rejected")
+            logger.warning(f"Cola de notificaciones llena, {job.notification_id} queda pendiente")
+            return False
+        self._count("enqueued")
+        return True
+
+    def enqueue_notification(self, notification: NotificationResponse, recipient: Optional[str] = None) -> bool:
+        """Encolo el envío de una notificación recién creada"""
+        return self.enqueue(NotificationJob.from_notification(notification, recipient))
+
+    def enqueue_claimed(self, notification: NotificationResponse, recipient: Optional[str] = None) -> bool:
+        """Encolo una notificación ya reclamada (processing); si la cola está llena la suelto a pending"""
+        if self.enqueue_notification(notification, recipient):
+            return True
+        notification_service.requeue_notification(notification.notification_id, "processing")
+        return False
+
+    def release_stale_claims(self, page_size: int = 100) -> int:
+        """Devuelvo a pending las reclamadas hace más de NOTIFICATION_CLAIM_TIMEOUT_SECONDS (el proceso murió)"""
+        cutoff = (datetime.utcnow() - timedelta(seconds=settings.notification_claim_timeout_seconds)).isoformat()
+        released = 0
+        for page in notification_service.iter_queue("processing", page_size):
+            for notification in page:
+                if (notification.claimed_at or "") >= cutoff:
+                    continue
+                if notification_service.requeue_notification(notification.notification_id, "processing"):
+                    released += 1
+        return released
+
+    def drain_pending(self, page_size: int = 100) -> int:
+        """Reclamo y encolo por páginas las notificaciones que quedaron pendientes en la tabla"""
+        self.release_stale_claims(page_size)
+        enqueued = 0
+        for page in notification_service.iter_queue("pending", page_size):
+            for notification in page:
+                # Solo envío lo que logro pasar a processing: otro despachador pudo tomarla antes
+                try:
+                    claimed = notification_service.claim_notification(notification.notification_id)
+                except BTGException as e:
+                    logger.info(f"Omito {notification.notification_id}: {e.message}")
+                    continue
+                if not self.enqueue_claimed(claimed):
+                    # Cola llena: queda pendiente para el próximo drenado
+                    return enqueued
+                enqueued += 1
+        return enqueued
+
+    def wait_idle(self) -> None:
+        """Espero a que se procesen todos los trabajos encolados y se envíen sus lotes"""
+        self._queue.join()
+        self.digest.flush()
+        for service in self._channels.values():
+            service.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """Métricas del despachador y de cada canal"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        return {
+            **stats,
+            "queue_depth": self._queue.qsize(),
+            "workers": len(self._workers),
+            "digest": {
+                "held": self.digest.pending(),
+                "digests_sent": self.digest.digests,
+                "notifications_merged": self.digest.merged
+            },
+            "channels": {
+                channel: {**service.metrics.snapshot(), "buffered": service.pending()}
+                for channel, service in self._channels.items()
+            }
+        }
+
+    def collect_metrics(self) -> List[MetricFamily]:
+        """Cola en proceso y resultado de los envíos para /metrics"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        return [
+            MetricFamily("notification_dispatch_queue_depth", "gauge", "Trabajos en la cola en proceso del despachador",
+                         (), {(): self._queue.qsize()}),
+            MetricFamily("notification_jobs_total", "counter", "Trabajos de notificación por resultado", ("result",),
+                         {(result,): count for result, count in stats.items()})
+        ]
+
+    def _resolve_recipient(self, job: NotificationJob) -> str:
+        """Obtengo el destinatario según el canal cuando el trabajo no lo trae"""
+        if job.recipient:
+            return job.recipient
+        user = user_service.get_user(job.user_id)
+        return user.email if job.channel == "email" else user.phone
+
+    def _render(self, jobs: List[NotificationJob]) -> List[Optional[RenderedMessage]]:
+        """Renderizo en lote los trabajos con plantilla; los que traen contenido no se renderizan"""
+        templated = [job for job in jobs if job.template_id and not job.content]
+        try:
+            rendered = template_registry.render_many((job.template_id, job.params or {}) for job in templated)
+        except Exception:
+            # Un parámetro inválido no debe tumbar el lote: renderizo uno a uno en _build_message
+            return [None] * len(jobs)
+        by_job = {id(job): message for job, message in zip(templated, rendered)}
+        return [by_job.get(id(job)) for job in jobs]
+
+    def _build_message(self, job: NotificationJob, rendered: Optional[RenderedMessage] = None) -> OutboundMessage:
+        """Convierto el trabajo en el mensaje que entrega el canal"""
+        if job.template_id and not job.content:
+            rendered = rendered or template_registry.render(job.template_id, job.params or {})
+            body, subject = rendered.body, rendered.subject
+        else:
+            body = job.content
+            subject = template_registry.subject_for(job.type) if job.channel == "email" else None
+        return OutboundMessage(
+            notification_id=job.notification_id,
+            user_id=job.user_id,
+            channel=job.channel,
+            recipient=self._resolve_recipient(job),
+            body=body,
+            subject=subject
+        )
+
+    def _deliver_many(self, jobs: List[NotificationJob]) -> None:
+        """Paso los mensajes al buffer de cada canal; el envío real ocurre por lotes"""
+        for job, rendered in zip(jobs, self._render(jobs)):
+            try:
+                message = self._build_message(job, rendered)
+            except Exception as e:
+                self._count("failed")
+                logger.warning(f"No se pudo preparar {job.notification_id}: {e}")
+                notification_service.mark_notification_failed(job.notification_id, str(e))
+                continue
+
+            # Los tipos configurados esperan la ventana del resumen antes de ir al canal
+            if self.digest.accepts(job.type, job.channel):
+                self.digest.add(message)
+            else:
+                self._submit(message)
+
+    def _submit(self, message: OutboundMessage) -> None:
+        """Paso el mensaje al buffer de su canal"""
+        self._channels[message.channel].submit(message)
+
+    def _on_flush(self, channel: str, messages: List[OutboundMessage], errors: List[Optional[str]]) -> None:
+        """Registro en la tabla el resultado de un lote entregado por un canal"""
+        sent_ids = []
+        failed_errors = {}
+        for message, error in zip(messages, errors):
+            # Un resumen confirma (o falla) todas las notificaciones que agrupa
+            if error:
+                logger.warning(f"Falló el envío de {message.notification_id} por {channel}: {error}")
+                failed_errors.update({notification_id: error for notification_id in message.notification_ids})
+            else:
+                sent_ids.extend(message.notification_ids)
+
+        # Una transición condicional por notificación, en paralelo para todo el lote
+        self._count("sent", len(sent_ids))
+        self._count("failed", len(failed_errors))
+        try:
+            notification_service.mark_many(sent_ids, "sent")
+            notification_service.mark_many(list(failed_errors), "failed", failed_errors)
+        except Exception as e:
+            logger.error(f"No se pudo actualizar el lote de {channel}: {e}")
+
+    def _worker_loop(self) -> None:
+        """Ciclo de cada worker: tomo trabajos en lote hasta recibir la marca de parada"""
+        while True:
+            jobs = [self._queue.get()]
+            # Tomo lo que ya esté en cola (sin esperar) para renderizarlo junto
+            while jobs[-1] is not _STOP and len(jobs) < self.render_batch_size:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = jobs[-1] is _STOP
+            try:
+                work = [job for job in jobs if job is not _STOP]
+                if work:
+                    self._deliver_many(work)
+            except Exception as e:
+                logger.error(f"Error procesando notificaciones: {e}")
+            finally:
+                for _ in jobs:
+                    self._queue.task_done()
+            if stopping:
+                return
+
+# Instancia global del despachador
+notification_manager = NotificationManager()
+metrics_registry.register_collector(notification_manager.collect_metrics)
@@ -0,0 +1,88 @@
+import logging
+import threading
+from typing import List, Optional
+from src.notifications.notification_manager import NotificationManager, notification_manager
+from src.services.database import db_service
+from src.services.notification_service import notification_service
+from src.models.notification import NotificationResponse
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+class RetryScheduler:
+    """Reencola por lotes las notificaciones fallidas cuyo reintento ya venció"""
+
+    def __init__(self, manager: Optional[NotificationManager] = None, batch_size: Optional[int] = None,
+                 interval_seconds: Optional[float] = None):
+        self.manager = manager or notification_manager
+        self.batch_size = batch_size or settings.notification_retry_batch_size
+        self.interval_seconds = interval_seconds or settings.notification_retry_interval_seconds
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self, now: Optional[str] = None) -> int:
+        """Tomo un lote de reintentos vencidos y los paso al despachador"""
+        requeued = 0
+        for notification in notification_service.get_due_retries(now, self.batch_size):
+            # La reclamo antes de encolarla: ni otro proceso ni drain_pending pueden enviarla a la vez
+            if not notification_service.requeue_notification(notification.notification_id, "failed", claim=True):
+                continue
+            # Si la cola está llena queda pendiente y la recoge drain_pending
+            if self.manager.enqueue_claimed(notification):
+                requeued += 1
+        return requeued
+
+    def run_until_empty(self, now: Optional[str] = None, max_batches: int = 100) -> int:
+        """Proceso lotes hasta que no queden reintentos vencidos (útil en jobs)"""
+        total = 0
+        for _ in range(max_batches):
+            requeued = self.run_once(now)
+            total += requeued
+            if requeued < self.batch_size:
+                break
+        return total
+
+    def requeue_dead_letters(self, notification_ids: Optional[List[str]] = None, limit: int = 100) -> List[str]:
+        """Devuelvo a la cola notificaciones en dead_letter con los intentos reiniciados"""
+        if notification_ids:
+            notifications = []
+            for notification_id in notification_ids[:limit]:
+                item = db_service.get_item(notification_service.table_name, {'notification_id': notification_id})
+                if item and item.get('status') == "dead_letter":
+                    notifications.append(NotificationResponse(**item))
+        else:
+            notifications = notification_service.get_dead_letter_notifications(limit)
+
+        requeued = []
+        for notification in notifications:
+            if notification_service.requeue_notification(notification.notification_id, "dead_letter",
+                                                         reset_attempts=True, claim=True):
+                self.manager.enqueue_claimed(notification)
+                requeued.append(notification.notification_id)
+        return requeued
+
+    def start(self) -> None:
+        """Inicio el ciclo periódico en un hilo de fondo"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name="notification-retry-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Detengo el ciclo periódico"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.run_until_empty()
+            except Exception as e:
+                logger.error(f"Error reintentando notificaciones: {e}")
+            self._stop_event.wait(self.interval_seconds)
+
+# Instancia global del programador de reintentos
+retry_scheduler = RetryScheduler()
@@ -0,0 +1,26 @@
+from typing import List, Optional
+from src.notifications.base import ChannelBackend, build_backend
+from src.notifications.batching import BatchingChannel, build_rate_buckets
+from src.rate_limit import TokenBucket
+from src.config import settings
+
+class SMSService(BatchingChannel):
+    channel = "sms"
+
+    def __init__(self, backend: Optional[ChannelBackend] = None, batch_size: Optional[int] = None,
+                 window_seconds: Optional[float] = None, rate_buckets: Optional[List[TokenBucket]] = None):
+        backend = backend or build_backend(
+            settings.notification_sms_backend,
+            settings.notification_outbox_dir,
+            self.channel,
+            settings.notification_sms_provider_url
+        )
+        super().__init__(
+            backend,
+            batch_size or settings.notification_sms_batch_size,
+            settings.notification_batch_window_ms / 1000 if window_seconds is None else window_seconds,
+            build_rate_buckets(backend, settings.notification_sms_rate_limit) if rate_buckets is None else rate_buckets
+        )
+
+# Instancia global del servicio
+sms_service = SMSService()
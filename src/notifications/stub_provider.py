@@ -0,0 +1,74 @@
+"""
+Servidor stub local que simula las APIs de envío masivo de email y SMS
+Uso: python -m src.notifications.stub_provider --port 8025
+"""
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Set
+
+class StubProviderState:
+    """Conteo de lo recibido por el stub (útil para pruebas y benchmarks)"""
+
+    def __init__(self, fail_recipients: Optional[Set[str]] = None):
+        self.fail_recipients = fail_recipients or set()
+        self.calls: Dict[str, int] = {}
+        self.messages: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, channel: str, count: int) -> None:
+        with self._lock:
+            self.calls[channel] = self.calls.get(channel, 0) + 1
+            self.messages[channel] = self.messages.get(channel, 0) + count
+
+def _build_handler(state: StubProviderState):
+    class StubProviderHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            # Acepto /email/bulk y /sms/bulk
+            parts = self.path.strip("/").split("/")
+            if len(parts) != 2 or parts[1] != "bulk" or parts[0] not in ("email", "sms"):
+                self.send_error(404)
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            messages = json.loads(self.rfile.read(length) or b"{}").get("messages", [])
+            state.record(parts[0], len(messages))
+
+            results = [
+                {"ok": False, "error": "destinatario rechazado"}
+                if message.get("recipient") in state.fail_recipients
+                else {"ok": True}
+                for message in messages
+            ]
+            body = json.dumps({"results": results}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Silencio el log por petición
+            pass
+
+    return StubProviderHandler
+
+def start_stub_provider(host: str = "127.0.0.1", port: int = 0,
+                        state: Optional[StubProviderState] = None) -> ThreadingHTTPServer:
+    """Inicio el stub en un hilo de fondo; port=0 elige un puerto libre"""
+    state = state or StubProviderState()
+    server = ThreadingHTTPServer((host, port), _build_handler(state))
+    server.state = state
+    threading.Thread(target=server.serve_forever, name="stub-provider", daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub local de proveedores de email/SMS")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), _build_handler(StubProviderState()))
+    print(f"📨 Stub de proveedores escuchando en http://{args.host}:{args.port}")
+    server.serve_forever()
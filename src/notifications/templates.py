@@ -0,0 +1,197 @@
+import logging
+from dataclasses import dataclass
+from decimal import Decimal
+from string import Template
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Límite de un SMS de un solo segmento
+SMS_MAX_LENGTH = 160
+
+class TemplateError(ValueError):
+    """La plantilla no existe o le faltan parámetros"""
+
+# Plantillas por tipo × canal × idioma: (asunto, cuerpo). $$ es un signo $ literal
+DEFAULT_TEMPLATES = {
+    ("subscription_confirmation", "email", "es"): (
+        "BTG Pactual - Confirmación de suscripción",
+        "Su suscripción al fondo ${fund_name} por COP $$${amount} ha sido exitosa."
+    ),
+    ("subscription_confirmation", "sms", "es"): (
+        None,
+        "BTG Pactual: su suscripción al fondo ${fund_name} por COP $$${amount} fue exitosa."
+    ),
+    ("cancellation_confirmation", "email", "es"): (
+        "BTG Pactual - Confirmación de cancelación",
+        "Su suscripción al fondo ${fund_name} ha sido cancelada. Se devolvieron COP $$${amount} a su saldo."
+    ),
+    ("cancellation_confirmation", "sms", "es"): (
+        None,
+        "BTG Pactual: cancelamos su suscripción al fondo ${fund_name}. Devolvimos COP $$${amount} a su saldo."
+    ),
+    ("subscription_confirmation", "email", "en"): (
+        "BTG Pactual - Subscription confirmation",
+        "Your subscription to the ${fund_name} fund for COP $$${amount} was successful."
+    ),
+    ("subscription_confirmation", "sms", "en"): (
+        None,
+        "BTG Pactual: your subscription to ${fund_name} for COP $$${amount} was successful."
+    ),
+    ("cancellation_confirmation", "email", "en"): (
+        "BTG Pactual - Cancellation confirmation",
+        "Your subscription to the ${fund_name} fund was cancelled. COP $$${amount} was returned to your balance."
+    ),
+    ("cancellation_confirmation", "sms", "en"): (
+        None,
+        "BTG Pactual: your ${fund_name} subscription was cancelled. COP $$${amount} returned to your balance."
+    ),
+    # Resúmenes de varias notificaciones del mismo usuario
+    ("digest", "email", "es"): (
+        "BTG Pactual - Resumen de movimientos",
+        "Estos son sus movimientos recientes (${count}):\n${summary}"
+    ),
+    ("digest", "sms", "es"): (
+        None,
+        "BTG Pactual: ${count} movimientos. ${summary}"
+    ),
+    ("digest", "email", "en"): (
+        "BTG Pactual - Activity summary",
+        "Here is your recent activity (${count}):\n${summary}"
+    ),
+    ("digest", "sms", "en"): (
+        None,
+        "BTG Pactual: ${count} updates. ${summary}"
+    ),
+}
+
+@dataclass(frozen=True)
+class RenderedMessage:
+    """Resultado de renderizar una plantilla"""
+    body: str
+    subject: Optional[str] = None
+
+@dataclass(frozen=True)
+class NotificationTemplate:
+    """Plantilla compilada de un tipo de notificación para un canal e idioma"""
+    template_id: str
+    body: Template
+    subject: Optional[Template] = None
+    max_length: Optional[int] = None
+
+    def fits(self, params: Dict[str, Any]) -> bool:
+        """Indico si el mensaje sale completo, sin recortarlo al largo máximo del canal"""
+        if not self.max_length:
+            return True
+        return len(self.render(params, truncate=False).body) <= self.max_length
+
+    def render(self, params: Dict[str, Any], truncate: bool = True) -> RenderedMessage:
+        values = {key: _format_param(value) for key, value in params.items()}
+        try:
+            body = self.body.substitute(values)
+            subject = self.subject.substitute(values) if self.subject else None
+        except KeyError as e:
+            raise TemplateError(f"Falta el parámetro {e} en la plantilla {self.template_id}")
+
+        # Un SMS nunca supera el límite: recorto y marco el corte
+        if truncate and self.max_length and len(body) > self.max_length:
+            logger.warning(f"Mensaje recortado a {self.max_length} caracteres ({self.template_id})")
+            body = body[:self.max_length - 1] + "…"
+        return RenderedMessage(body=body, subject=subject)
+
+def _format_param(value: Any) -> str:
+    """Formateo los montos con separador de miles; el resto va como texto"""
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return f"{value:,.0f}"
+    return str(value)
+
+def _params_key(params: Dict[str, Any]) -> Tuple:
+    return tuple(sorted((key, str(value)) for key, value in params.items()))
+
+class TemplateRegistry:
+    """Registro de plantillas compiladas una sola vez al iniciar"""
+
+    def __init__(self, default_locale: Optional[str] = None):
+        self.default_locale = default_locale or settings.default_locale
+        self._templates: Dict[str, NotificationTemplate] = {}
+
+    @staticmethod
+    def template_id(notification_type: str, channel: str, locale: str) -> str:
+        return f"{notification_type}.{channel}.{locale}"
+
+    def register(self, notification_type: str, channel: str, locale: str, body: str,
+                 subject: Optional[str] = None) -> NotificationTemplate:
+        """Compilo y valido una plantilla; el texto fijo de un SMS debe caber en el límite"""
+        template_id = self.template_id(notification_type, channel, locale)
+        compiled = Template(body)
+        if not compiled.is_valid():
+            raise TemplateError(f"Plantilla inválida: {template_id}")
+
+        max_length = SMS_MAX_LENGTH if channel == "sms" else None
+        if max_length:
+            placeholders = {name: "" for name in compiled.get_identifiers()}
+            if len(compiled.substitute(placeholders)) > max_length:
+                raise TemplateError(f"La plantilla {template_id} supera {max_length} caracteres")
+
+        template = NotificationTemplate(
+            template_id=template_id,
+            body=compiled,
+            subject=Template(subject) if subject else None,
+            max_length=max_length
+        )
+        self._templates[template_id] = template
+        return template
+
+    def resolve(self, notification_type: str, channel: str, locale: Optional[str] = None) -> str:
+        """Obtengo el id de la plantilla, con el idioma por defecto como respaldo"""
+        for candidate in (locale, self.default_locale):
+            if candidate:
+                template_id = self.template_id(notification_type, channel, candidate)
+                if template_id in self._templates:
+                    return template_id
+        raise TemplateError(f"No hay plantilla para {notification_type} por {channel}")
+
+    def render(self, template_id: str, params: Dict[str, Any]) -> RenderedMessage:
+        """Renderizo una plantilla por su id"""
+        template = self._templates.get(template_id)
+        if not template:
+            raise TemplateError(f"Plantilla {template_id} no encontrada")
+        return template.render(params)
+
+    def fits(self, template_id: str, params: Dict[str, Any]) -> bool:
+        """Indico si la plantilla renderizada entra completa en su canal"""
+        template = self._templates.get(template_id)
+        if not template:
+            raise TemplateError(f"Plantilla {template_id} no encontrada")
+        return template.fits(params)
+
+    def subject_for(self, notification_type: str, locale: Optional[str] = None) -> str:
+        """Obtengo el asunto de correo para notificaciones guardadas con contenido ya renderizado"""
+        try:
+            template = self._templates[self.resolve(notification_type, "email", locale)]
+        except TemplateError:
+            return "BTG Pactual - Notificación"
+        return template.subject.safe_substitute() if template.subject else "BTG Pactual - Notificación"
+
+    def render_many(self, requests: Iterable[Tuple[str, Dict[str, Any]]]) -> List[RenderedMessage]:
+        """Renderizo un lote; los pares (plantilla, parámetros) repetidos se renderizan una vez"""
+        rendered: Dict[Tuple, RenderedMessage] = {}
+        results = []
+        for template_id, params in requests:
+            key = (template_id, _params_key(params))
+            if key not in rendered:
+                rendered[key] = self.render(template_id, params)
+            results.append(rendered[key])
+        return results
+
+    @classmethod
+    def default(cls) -> "TemplateRegistry":
+        """Creo el registro con las plantillas incluidas en el sistema"""
+        registry = cls()
+        for (notification_type, channel, locale), (subject, body) in DEFAULT_TEMPLATES.items():
+            registry.register(notification_type, channel, locale, body, subject)
+        return registry
+
+# Instancia global del registro (compilado al importar el módulo)
+template_registry = TemplateRegistry.default()
@@ -0,0 +1,121 @@
+import functools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from src.config import settings
+
+class RequestTimings:
+    """Tiempo acumulado por fase de una petición (las fases pueden anidarse)"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        # Las consultas en paralelo (ThreadPoolExecutor) suman desde otros hilos
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+            self.counts[phase] = self.counts.get(phase, 0) + 1
+
+    def server_timing(self, total_seconds: float) -> str:
+        """Armo la cabecera Server-Timing en milisegundos"""
+        with self._lock:
+            phases = dict(self.phases)
+            counts = dict(self.counts)
+        # Lo que FastAPI hace fuera del endpoint: dependencias, validación y response_model
+        if "route" in phases:
+            phases["framework"] = max(phases.pop("route") - phases.get("handler", 0.0), 0.0)
+            counts.pop("route", None)
+        entries = []
+        for phase, seconds in phases.items():
+            entry = f"{phase};dur={seconds * 1000:.2f}"
+            if counts.get(phase, 1) > 1:
+                entry += f';desc="{counts[phase]} llamadas"'
+            entries.append(entry)
+        entries.append(f"total;dur={total_seconds * 1000:.2f}")
+        return ", ".join(entries)
+
+# Tiempos de la petición en curso; None cuando la instrumentación está apagada
+current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("current_timings", default=None)
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """Mido un bloque dentro de la fase indicada (no hace nada si no se está midiendo)"""
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - started)
+
+def profiled(phase: str):
+    """Mido cada llamada a la función dentro de la fase indicada"""
+    def decorator(function: Callable):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            timings = current_timings.get()
+            if timings is None:
+                return function(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                timings.add(phase, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+class StackSampler:
+    """Profiler por muestreo: tomo la pila de un hilo cada `interval` segundos"""
+
+    def __init__(self, thread_id: int, interval_seconds: Optional[float] = None):
+        self.thread_id = thread_id
+        self.interval_seconds = interval_seconds or settings.profile_interval_ms / 1000
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[_collapse(frame)] += 1
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, name: str, directory: Optional[str] = None) -> str:
+        """Guardo las pilas en formato colapsado (compatible con flamegraph.pl y speedscope)"""
+        directory = directory or settings.profile_dir
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{time.strftime('%Y%m%dT%H%M%S')}_{_safe_name(name)}.collapsed")
+        with open(path, "w", encoding="utf-8") as profile:
+            for stack, count in self.samples.most_common():
+                profile.write(f"{stack} {count}\n")
+        return path
+
+def _collapse(frame) -> str:
+    """Convierto una pila en "raíz;...;hoja" con módulo, función y línea"""
+    stack: List[str] = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9.-]+", "_", name).strip("_")[:120]
@@ -0,0 +1,163 @@
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+from botocore.exceptions import ClientError
+from src.config import settings
+from src.services.database import db_service, is_conditional_check_failed
+
+class TokenBucket:
+    """Token bucket: `rate` tokens por segundo con ráfagas de hasta `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        if rate <= 0:
+            raise ValueError("La tasa del token bucket debe ser mayor que cero")
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        """Sumo los tokens generados desde la última lectura (se llama con el lock tomado)"""
+        now = self.clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Tomo los tokens si hay; si no, devuelvo cuántos segundos faltan para tenerlos"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Tomo los tokens solo si están disponibles"""
+        return self.acquire(tokens) == 0.0
+
+    def refund(self, tokens: float = 1.0) -> None:
+        """Devuelvo tokens tomados para una operación que no se hizo"""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+def acquire_all(buckets: Iterable[TokenBucket], tokens: float = 1.0) -> float:
+    """Tomo tokens de todos los buckets o de ninguno; devuelvo la espera necesaria (0 si se tomaron)"""
+    acquired = []
+    for bucket in buckets:
+        wait = bucket.acquire(tokens)
+        if wait:
+            for taken in acquired:
+                taken.refund(tokens)
+            return wait
+        acquired.append(bucket)
+    return 0.0
+
+# Intentos de escritura condicional del bucket compartido cuando otra instancia lo cambió en medio
+BUCKET_WRITE_ATTEMPTS = 3
+
+class RateLimitStore(ABC):
+    """Almacén de límites: decide si la clave puede hacer una petición más"""
+    # True si acquire hace I/O y debe correr fuera del event loop
+    blocking = False
+
+    @abstractmethod
+    def acquire(self, key: str, rate: float, capacity: Optional[float] = None) -> float:
+        """Tomo un token para la clave; devuelvo la espera necesaria (0 si se admitió)"""
+
+    def clear(self) -> None:
+        pass
+
+class InMemoryRateLimitStore(RateLimitStore):
+    """Un token bucket por clave en memoria del proceso; descarto las claves menos usadas"""
+
+    def __init__(self, max_keys: Optional[int] = None, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys or settings.rate_limit_max_keys
+        self.clock = clock
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, rate: float, capacity: Optional[float] = None) -> float:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(rate, capacity, self.clock)
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+        return bucket.acquire()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+class DynamoDBRateLimitStore(RateLimitStore):
+    """Token bucket compartido entre instancias en DynamoDB: mismas ráfagas que en memoria, sin bordes de ventana"""
+    blocking = True
+
+    def __init__(self, table_name: str = 'rate_limits', clock: Callable[[], float] = time.time):
+        self.table_name = table_name
+        self.clock = clock
+
+    def acquire(self, key: str, rate: float, capacity: Optional[float] = None) -> float:
+        capacity = capacity or rate
+        for _ in range(BUCKET_WRITE_ATTEMPTS):
+            now = self.clock()
+            item = db_service.get_item(self.table_name, {"limit_key": key})
+            if item is None:
+                tokens = capacity
+                condition = "attribute_not_exists(limit_key)"
+                values = {}
+            else:
+                elapsed = max(now - float(item['updated_at']), 0.0)
+                tokens = min(capacity, float(item['tokens']) + elapsed * rate)
+                # Escribo solo si nadie tomó tokens desde mi lectura
+                condition = "updated_at = :previous"
+                values = {":previous": item['updated_at']}
+            if tokens < 1:
+                return (1 - tokens) / rate
+
+            try:
+                db_service.update_item(
+                    self.table_name,
+                    {"limit_key": key},
+                    "SET tokens = :tokens, updated_at = :updated_at, expires_at = :expires_at",
+                    {
+                        **values,
+                        ":tokens": tokens - 1,
+                        ":updated_at": now,
+                        # Pasado este tiempo el bucket estaría lleno: da igual que el TTL lo borre
+                        ":expires_at": math.ceil(now + capacity / rate) + 60
+                    },
+                    condition_expression=condition
+                )
+                return 0.0
+            except ClientError as e:
+                if not is_conditional_check_failed(e):
+                    raise
+        # Demasiada contención sobre la misma clave: pido esperar lo que tarda en reponerse un token
+        return 1 / rate
+
+def build_rate_limit_store(kind: Optional[str] = None) -> RateLimitStore:
+    """Creo el almacén configurado en RATE_LIMIT_STORE"""
+    kind = kind or settings.rate_limit_store
+    if kind == "dynamodb":
+        return DynamoDBRateLimitStore()
+    if kind == "memory":
+        return InMemoryRateLimitStore()
+    raise ValueError(f"Almacén de rate limit desconocido: {kind}")
+
+# Instancia global del almacén de límites por usuario
+rate_limit_store = build_rate_limit_store()
@@ -0,0 +1,234 @@
+import gzip
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from src.services.database import db_service
+from src.config import settings
+from src.utils import json_default
+
+# Tablas archivables y el atributo que actúa como clave primaria
+ARCHIVABLE_TABLES = {
+    'transactions': 'transaction_id',
+    'notifications': 'notification_id'
+}
+
+INDEX_FILE = "index.json"
+
+# Estados finales de las notificaciones: pending, failed y dead_letter siguen vivos para los jobs de
+# envío y reintento, así que nunca salen de la tabla
+ARCHIVABLE_NOTIFICATION_STATUSES = ('sent',)
+
+# Marca en el cursor de paginación de que la lectura siguió al histórico archivado: fila dentro de la partición
+ARCHIVE_CURSOR_KEY = "archive_offset"
+# Partición (día) en la que sigue el cursor; sin ella empiezo por la más reciente
+ARCHIVE_DAY_KEY = "archive_day"
+
+class ArchiveService:
+    def __init__(self, archive_dir: str = None):
+        self.archive_dir = archive_dir or settings.archive_dir
+        self.horizon_days = settings.archive_horizon_days
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def _table_dir(self, table_name: str) -> str:
+        """Directorio donde guardo las particiones de una tabla"""
+        return os.path.join(self.archive_dir, table_name)
+
+    def _partition_path(self, table_name: str, day: str) -> str:
+        """Archivo comprimido de la partición diaria"""
+        return os.path.join(self._table_dir(table_name), f"{day}.jsonl.gz")
+
+    def load_index(self, table_name: str) -> Dict[str, Dict[str, Any]]:
+        """Cargo el índice de particiones de una tabla (queda en memoria)"""
+        with self._lock:
+            if table_name not in self._indexes:
+                index_path = os.path.join(self._table_dir(table_name), INDEX_FILE)
+                if os.path.exists(index_path):
+                    with open(index_path, "r", encoding="utf-8") as index_file:
+                        self._indexes[table_name] = json.load(index_file)
+                else:
+                    self._indexes[table_name] = {}
+            return self._indexes[table_name]
+
+    def _save_index(self, table_name: str, index: Dict[str, Dict[str, Any]]) -> None:
+        """Guardo el índice de forma atómica (archivo temporal + rename)"""
+        index_path = os.path.join(self._table_dir(table_name), INDEX_FILE)
+        temp_path = f"{index_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as index_file:
+            json.dump(index, index_file, sort_keys=True)
+        os.replace(temp_path, index_path)
+
+    def _append_partition(self, table_name: str, day: str, rows: List[Dict[str, Any]],
+                          index: Dict[str, Dict[str, Any]]) -> None:
+        """Agrego filas a la partición del día y actualizo su entrada en el índice"""
+        with gzip.open(self._partition_path(table_name, day), "at", encoding="utf-8") as partition:
+            for row in rows:
+                partition.write(json.dumps(row, default=json_default, ensure_ascii=False) + "\n")
+
+        created = [row['created_at'] for row in rows]
+        entry = index.get(day)
+        if entry is None:
+            entry = index[day] = {
+                'count': 0,
+                'min_created_at': min(created),
+                'max_created_at': max(created),
+                'user_ids': []
+            }
+        entry['count'] += len(rows)
+        entry['min_created_at'] = min(entry['min_created_at'], min(created))
+        entry['max_created_at'] = max(entry['max_created_at'], max(created))
+        entry['user_ids'] = sorted(set(entry['user_ids']) | {row['user_id'] for row in rows})
+
+    def _scan_filter(self, table_name: str, cutoff: str) -> Tuple[str, Dict[str, Any], Optional[Dict[str, str]]]:
+        """Armo el filtro del scan: antigüedad y, en notificaciones, solo estados finales"""
+        filter_expression = "created_at < :cutoff"
+        values: Dict[str, Any] = {":cutoff": cutoff}
+        if table_name != 'notifications':
+            return filter_expression, values, None
+        placeholders = []
+        for position, status in enumerate(ARCHIVABLE_NOTIFICATION_STATUSES):
+            placeholders.append(f":status_{position}")
+            values[f":status_{position}"] = status
+        return f"{filter_expression} AND #status IN ({', '.join(placeholders)})", values, {"#status": "status"}
+
+    def _latest_checkpoint(self, user_id: str) -> Optional[Tuple[str, str]]:
+        """Obtengo (checkpoint_at, transaction_id) del último checkpoint del ledger del usuario"""
+        # Consulto la tabla directamente: el ledger depende de transaction_service, que depende de este servicio
+        checkpoints = db_service.query_items(
+            'ledger',
+            "user_id = :user_id",
+            {":user_id": user_id},
+            scan_index_forward=False,
+            limit=1
+        )
+        if not checkpoints:
+            return None
+        return checkpoints[0]['checkpoint_at'], checkpoints[0]['transaction_id']
+
+    def _covered_by_ledger(self, row: Dict[str, Any], checkpoints: Dict[str, Optional[Tuple[str, str]]]) -> bool:
+        """Una transacción solo sale de la tabla si ya está incluida en el último checkpoint de su usuario"""
+        user_id = row['user_id']
+        if user_id not in checkpoints:
+            checkpoints[user_id] = self._latest_checkpoint(user_id)
+        checkpoint = checkpoints[user_id]
+        return checkpoint is not None and (row['created_at'], row['transaction_id']) <= checkpoint
+
+    def archive_table(self, table_name: str, horizon_days: Optional[int] = None,
+                      page_size: int = 500) -> Dict[str, int]:
+        """Job: muevo a la capa fría los registros más antiguos que el horizonte"""
+        # Solo por CLI (run_jobs.py): ARCHIVE_DIR es un directorio local y en Lambda el disco es efímero
+        key_attribute = ARCHIVABLE_TABLES[table_name]
+        horizon_days = self.horizon_days if horizon_days is None else horizon_days
+        cutoff = (datetime.utcnow() - timedelta(days=horizon_days)).isoformat()
+
+        os.makedirs(self._table_dir(table_name), exist_ok=True)
+        index = self.load_index(table_name)
+        archived = 0
+        skipped = 0
+        partitions = set()
+        checkpoints: Dict[str, Optional[Tuple[str, str]]] = {}
+
+        filter_expression, values, names = self._scan_filter(table_name, cutoff)
+        pages = db_service.scan_pages(table_name, filter_expression, values, names, page_size=page_size)
+        for page in pages:
+            if table_name == 'transactions':
+                # El saldo actual sale del último checkpoint más la cola, que debe seguir en la tabla
+                eligible = [row for row in page if self._covered_by_ledger(row, checkpoints)]
+                skipped += len(page) - len(eligible)
+                page = eligible
+            if not page:
+                continue
+
+            by_day: Dict[str, List[Dict[str, Any]]] = {}
+            for row in page:
+                by_day.setdefault(row['created_at'][:10], []).append(row)
+
+            with self._lock:
+                for day, rows in by_day.items():
+                    self._append_partition(table_name, day, rows, index)
+                    partitions.add(day)
+                self._save_index(table_name, index)
+
+            # Solo borro de DynamoDB después de persistir archivo e índice
+            db_service.batch_delete_items(table_name, [{key_attribute: row[key_attribute]} for row in page])
+            archived += len(page)
+
+        return {"archived": archived, "skipped": skipped, "partitions": len(partitions)}
+
+    def _candidate_partitions(self, table_name: str, date_from: Optional[str],
+                              date_to: Optional[str], user_id: Optional[str]) -> List[str]:
+        """Descarto con el índice las particiones que no pueden tener resultados"""
+        index = self.load_index(table_name)
+        candidates = []
+        for day, entry in sorted(index.items()):
+            if date_from and entry['max_created_at'] < date_from:
+                continue
+            if date_to and entry['min_created_at'] > date_to:
+                continue
+            if user_id and user_id not in entry['user_ids']:
+                continue
+            candidates.append(day)
+        return candidates
+
+    def _partition_rows(self, table_name: str, day: str) -> Iterator[Dict[str, Any]]:
+        """Leo las filas de una partición; un job interrumpido puede repetirlas y las descarto por clave"""
+        key_attribute = ARCHIVABLE_TABLES[table_name]
+        seen = set()
+        with gzip.open(self._partition_path(table_name, day), "rt", encoding="utf-8") as partition:
+            for line in partition:
+                row = json.loads(line)
+                if row[key_attribute] in seen:
+                    continue
+                seen.add(row[key_attribute])
+                yield row
+
+    def read_archived(self, table_name: str, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                      user_id: Optional[str] = None, filters: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """Leo registros archivados aplicando poda por rango y usuario"""
+        filters = dict(filters or {})
+        if user_id:
+            filters['user_id'] = user_id
+
+        for day in self._candidate_partitions(table_name, date_from, date_to, user_id):
+            for row in self._partition_rows(table_name, day):
+                if date_from and row['created_at'] < date_from:
+                    continue
+                if date_to and row['created_at'] > date_to:
+                    continue
+                if any(row.get(field) != value for field, value in filters.items()):
+                    continue
+                yield row
+
+    def read_archived_page(self, table_name: str, cursor: Dict[str, Any], limit: int,
+                           user_id: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Leo una página del archivo, más recientes primero, y devuelvo el cursor para continuar (None si no hay más)"""
+        key_attribute = ARCHIVABLE_TABLES[table_name]
+        day = cursor.get(ARCHIVE_DAY_KEY)
+        offset = int(cursor.get(ARCHIVE_CURSOR_KEY, 0))
+        # Mismo orden que la tabla: de la partición más reciente a la más antigua
+        days = [candidate for candidate in reversed(self._candidate_partitions(table_name, None, None, user_id))
+                if day is None or candidate <= str(day)]
+        if days and days[0] != day:
+            offset = 0
+
+        page: List[Dict[str, Any]] = []
+        for position, current_day in enumerate(days):
+            # Solo descomprimo las particiones que toca esta página, no todo el histórico anterior
+            rows = [row for row in self._partition_rows(table_name, current_day)
+                    if not user_id or row.get('user_id') == user_id]
+            rows.sort(key=lambda row: (row['created_at'], row[key_attribute]), reverse=True)
+            taken = rows[offset:offset + limit - len(page)]
+            page.extend(taken)
+            if len(page) == limit:
+                if offset + len(taken) < len(rows):
+                    return page, {ARCHIVE_DAY_KEY: current_day, ARCHIVE_CURSOR_KEY: offset + len(taken)}
+                if position + 1 < len(days):
+                    return page, {ARCHIVE_DAY_KEY: days[position + 1], ARCHIVE_CURSOR_KEY: 0}
+                return page, None
+            offset = 0
+        return page, None
+
+# Instancia global del servicio
+archive_service = ArchiveService()
@@ -1,10 +1,27 @@
 import boto3
 from boto3.dynamodb.conditions import Key
-from typing import Dict, Any, List, Optional
+from botocore.exceptions import ClientError
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from datetime import datetime
 from decimal import Decimal
 from src.config import settings
 from src.utils import get_current_timestamp
+from src.profiling import profiled
+from src.metrics import observe_db
+
+def is_conditional_check_failed(error: Exception) -> bool:
+    """Verifico si el error corresponde a una condición de escritura no cumplida"""
+    return (
+        isinstance(error, ClientError)
+        and error.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException'
+    )
+
+def transaction_conditions_failed(error: Exception) -> List[int]:
+    """Obtengo los índices de las operaciones de una transacción cuya condición no se cumplió"""
+    if not isinstance(error, ClientError) or error.response.get('Error', {}).get('Code') != 'TransactionCanceledException':
+        return []
+    reasons = error.response.get('CancellationReasons', [])
+    return [index for index, reason in enumerate(reasons) if reason.get('Code') == 'ConditionalCheckFailed']
 
 class DynamoDBService:
     def __init__(self):
@@ -15,7 +32,12 @@ class DynamoDBService:
             'funds': self.dynamodb.Table(settings.dynamodb_table_funds),
             'subscriptions': self.dynamodb.Table(settings.dynamodb_table_subscriptions),
             'transactions': self.dynamodb.Table(settings.dynamodb_table_transactions),
-            'notifications': self.dynamodb.Table(settings.dynamodb_table_notifications)
+            'notifications': self.dynamodb.Table(settings.dynamodb_table_notifications),
+            'ledger': self.dynamodb.Table(settings.dynamodb_table_ledger),
+            'rollups': self.dynamodb.Table(settings.dynamodb_table_rollups),
+            'rate_limits': self.dynamodb.Table(settings.dynamodb_table_rate_limits),
+            'portfolios': self.dynamodb.Table(settings.dynamodb_table_portfolios),
+            'revocations': self.dynamodb.Table(settings.dynamodb_table_revocations)
         }
     
     def _convert_floats_to_decimal(self, obj):
@@ -29,6 +51,8 @@ class DynamoDBService:
         else:
             return obj
     
+    @observe_db("put_item")
+    @profiled("db")
     def create_item(self, table_name: str, item: Dict[str, Any]) -> Dict[str, Any]:
         """Creo un nuevo elemento en la tabla"""
         table = self.tables[table_name]
@@ -40,15 +64,41 @@ class DynamoDBService:
         table.put_item(Item=converted_item)
         return item
     
+    @observe_db("batch_write", count_items=int)
+    @profiled("db")
+    def batch_create_items(self, table_name: str, items: List[Dict[str, Any]]) -> int:
+        """Guardo varios elementos agrupando las escrituras en lotes"""
+        table = self.tables[table_name]
+        with table.batch_writer() as batch:
+            for item in items:
+                batch.put_item(Item=self._convert_floats_to_decimal(item))
+        return len(items)
+    
+    @observe_db("batch_delete", count_items=int)
+    @profiled("db")
+    def batch_delete_items(self, table_name: str, keys: List[Dict[str, Any]]) -> int:
+        """Elimino varios elementos agrupando las escrituras en lotes"""
+        table = self.tables[table_name]
+        with table.batch_writer() as batch:
+            for key in keys:
+                batch.delete_item(Key=key)
+        return len(keys)
+    
+    @observe_db("get_item", count_items=lambda item: 1 if item else 0)
+    @profiled("db")
     def get_item(self, table_name: str, key: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Obtengo un elemento por su clave"""
         table = self.tables[table_name]
         response = table.get_item(Key=key)
         return response.get('Item')
     
+    @observe_db("update_item")
+    @profiled("db")
     def update_item(self, table_name: str, key: Dict[str, Any], 
                    update_expression: str, expression_values: Dict[str, Any],
-                   expression_attribute_names: Dict[str, str] = None) -> Dict[str, Any]:
+                   expression_attribute_names: Dict[str, str] = None,
+                   condition_expression: str = None,
+                   return_values: str = "UPDATED_NEW") -> Dict[str, Any]:
         """Actualizo un elemento"""
         table = self.tables[table_name]
         # Solo agrego updated_at si no está en la expresión (para no sobrescribir el del servicio)
@@ -63,19 +113,41 @@ class DynamoDBService:
             'Key': key,
             'UpdateExpression': update_expression,
             'ExpressionAttributeValues': converted_values,
-            'ReturnValues': "UPDATED_NEW"
+            'ReturnValues': return_values
         }
         
         if expression_attribute_names:
             update_kwargs['ExpressionAttributeNames'] = expression_attribute_names
         
+        # La condición hace que DynamoDB rechace la escritura si no se cumple
+        if condition_expression:
+            update_kwargs['ConditionExpression'] = condition_expression
+        
         response = table.update_item(**update_kwargs)
         return response
     
-    def query_items(self, table_name: str, key_condition_expression: str, 
-                   expression_values: Dict[str, Any], index_name: str = None) -> List[Dict[str, Any]]:
-        """Consulto elementos con condición de clave"""
-        table = self.tables[table_name]
+    @observe_db("transact_write", count_items=int,
+                table_label=lambda operations: "+".join(sorted({table for _, table, _ in operations})))
+    @profiled("db")
+    def transact_write(self, operations: List[Tuple[str, str, Dict[str, Any]]]) -> int:
+        """Escribo varias operaciones (acción, tabla, parámetros) de forma atómica: se aplican todas o ninguna"""
+        transact_items = []
+        for action, table_name, params in operations:
+            request = {'TableName': self.tables[table_name].name, **params}
+            # Convierto floats a Decimal en los valores que se escriben
+            for field in ('Item', 'ExpressionAttributeValues'):
+                if field in request:
+                    request[field] = self._convert_floats_to_decimal(request[field])
+            transact_items.append({action: request})
+        # El cliente del recurso serializa los tipos de Python igual que las tablas
+        self.dynamodb.meta.client.transact_write_items(TransactItems=transact_items)
+        return len(transact_items)
+    
+    def _build_query_kwargs(self, key_condition_expression: str, expression_values: Dict[str, Any],
+                            index_name: str = None, scan_index_forward: bool = True,
+                            limit: int = None,
+                            expression_attribute_names: Dict[str, str] = None) -> Dict[str, Any]:
+        """Armo los parámetros comunes de una consulta"""
         # Convierto floats a Decimal en los valores de expresión
         converted_values = self._convert_floats_to_decimal(expression_values)
         
@@ -87,10 +159,118 @@ class DynamoDBService:
         # Si se especifica un índice, lo uso
         if index_name:
             query_kwargs['IndexName'] = index_name
-            
+        
+        # Solo envío orden y límite cuando difieren del comportamiento por defecto
+        if not scan_index_forward:
+            query_kwargs['ScanIndexForward'] = False
+        if limit:
+            query_kwargs['Limit'] = limit
+        
+        if expression_attribute_names:
+            query_kwargs['ExpressionAttributeNames'] = dict(expression_attribute_names)
+        
+        return query_kwargs
+    
+    @observe_db("query", count_items=len)
+    @profiled("db")
+    def query_items(self, table_name: str, key_condition_expression: str, 
+                   expression_values: Dict[str, Any], index_name: str = None,
+                   scan_index_forward: bool = True, limit: int = None,
+                   expression_attribute_names: Dict[str, str] = None,
+                   filter_expression: str = None) -> List[Dict[str, Any]]:
+        """Consulto elementos con condición de clave"""
+        table = self.tables[table_name]
+        query_kwargs = self._build_query_kwargs(
+            key_condition_expression, expression_values, index_name, scan_index_forward, limit,
+            expression_attribute_names
+        )
+        if filter_expression:
+            query_kwargs['FilterExpression'] = filter_expression
         response = table.query(**query_kwargs)
         return response.get('Items', [])
     
+    def _apply_projection(self, request_kwargs: Dict[str, Any], projection: List[str] = None) -> None:
+        """Pido solo los atributos indicados; uso alias porque varios son palabras reservadas"""
+        if not projection:
+            return
+        names = request_kwargs.setdefault('ExpressionAttributeNames', {})
+        aliases = []
+        for position, attribute in enumerate(projection):
+            names[f"#p{position}"] = attribute
+            aliases.append(f"#p{position}")
+        request_kwargs['ProjectionExpression'] = ", ".join(aliases)
+    
+    @observe_db("query", count_items=lambda page: len(page[0]))
+    @profiled("db")
+    def query_page(self, table_name: str, key_condition_expression: str,
+                   expression_values: Dict[str, Any], index_name: str = None,
+                   scan_index_forward: bool = True, limit: int = None,
+                   exclusive_start_key: Dict[str, Any] = None,
+                   expression_attribute_names: Dict[str, str] = None,
+                   filter_expression: str = None,
+                   projection: List[str] = None) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Consulto una sola página y devuelvo la clave para continuar (None si no hay más)"""
+        table = self.tables[table_name]
+        query_kwargs = self._build_query_kwargs(
+            key_condition_expression, expression_values, index_name, scan_index_forward, limit,
+            expression_attribute_names
+        )
+        if exclusive_start_key:
+            query_kwargs['ExclusiveStartKey'] = exclusive_start_key
+        # El filtro se aplica después del Limit: una página puede venir corta aunque haya más
+        if filter_expression:
+            query_kwargs['FilterExpression'] = filter_expression
+        self._apply_projection(query_kwargs, projection)
+        
+        response = table.query(**query_kwargs)
+        return response.get('Items', []), response.get('LastEvaluatedKey')
+    
+    @observe_db("count", count_items=lambda count: count)
+    @profiled("db")
+    def count_items(self, table_name: str, key_condition_expression: str,
+                    expression_values: Dict[str, Any], index_name: str = None,
+                    expression_attribute_names: Dict[str, str] = None) -> int:
+        """Cuento los elementos de una consulta sin traerlos (Select=COUNT)"""
+        table = self.tables[table_name]
+        query_kwargs = self._build_query_kwargs(
+            key_condition_expression, expression_values, index_name,
+            expression_attribute_names=expression_attribute_names
+        )
+        query_kwargs['Select'] = 'COUNT'
+        
+        total = 0
+        while True:
+            response = table.query(**query_kwargs)
+            total += response.get('Count', 0)
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                return total
+            query_kwargs['ExclusiveStartKey'] = last_key
+    
+    def query_pages(self, table_name: str, key_condition_expression: str,
+                    expression_values: Dict[str, Any], index_name: str = None,
+                    scan_index_forward: bool = True, page_size: int = 500,
+                    expression_attribute_names: Dict[str, str] = None) -> Iterator[List[Dict[str, Any]]]:
+        """Recorro todos los resultados de una consulta página por página"""
+        table = self.tables[table_name]
+        query_kwargs = self._build_query_kwargs(
+            key_condition_expression, expression_values, index_name, scan_index_forward, page_size,
+            expression_attribute_names
+        )
+        
+        while True:
+            response = table.query(**query_kwargs)
+            items = response.get('Items', [])
+            if items:
+                yield items
+            
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                break
+            query_kwargs['ExclusiveStartKey'] = last_key
+    
+    @observe_db("scan", count_items=len)
+    @profiled("db")
     def scan_items(self, table_name: str, filter_expression: str = None, 
                   expression_values: Dict[str, Any] = None, 
                   expression_attribute_names: Dict[str, str] = None) -> List[Dict[str, Any]]:
@@ -108,5 +288,56 @@ class DynamoDBService:
         response = table.scan(**scan_kwargs)
         return response.get('Items', [])
 
+    @observe_db("scan", count_items=lambda page: len(page[0]))
+    @profiled("db")
+    def scan_page(self, table_name: str, filter_expression: str = None,
+                  expression_values: Dict[str, Any] = None,
+                  expression_attribute_names: Dict[str, str] = None,
+                  limit: int = None, exclusive_start_key: Dict[str, Any] = None,
+                  projection: List[str] = None) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Escaneo una sola página y devuelvo la clave para continuar (None si no hay más)"""
+        table = self.tables[table_name]
+        scan_kwargs = {}
+        if limit:
+            scan_kwargs['Limit'] = limit
+        if filter_expression and expression_values:
+            scan_kwargs['FilterExpression'] = filter_expression
+            scan_kwargs['ExpressionAttributeValues'] = self._convert_floats_to_decimal(expression_values)
+
+        if expression_attribute_names:
+            scan_kwargs['ExpressionAttributeNames'] = dict(expression_attribute_names)
+        if exclusive_start_key:
+            scan_kwargs['ExclusiveStartKey'] = exclusive_start_key
+        self._apply_projection(scan_kwargs, projection)
+
+        response = table.scan(**scan_kwargs)
+        return response.get('Items', []), response.get('LastEvaluatedKey')
+
+    def scan_pages(self, table_name: str, filter_expression: str = None,
+                   expression_values: Dict[str, Any] = None,
+                   expression_attribute_names: Dict[str, str] = None,
+                   page_size: int = 500) -> Iterator[List[Dict[str, Any]]]:
+        """Recorro la tabla página por página sin cargarla completa en memoria"""
+        table = self.tables[table_name]
+        scan_kwargs = {'Limit': page_size}
+        if filter_expression and expression_values:
+            scan_kwargs['FilterExpression'] = filter_expression
+            scan_kwargs['ExpressionAttributeValues'] = self._convert_floats_to_decimal(expression_values)
+
+        if expression_attribute_names:
+            scan_kwargs['ExpressionAttributeNames'] = expression_attribute_names
+
+        while True:
+            response = table.scan(**scan_kwargs)
+            items = response.get('Items', [])
+            if items:
+                yield items
+
+            # Sigo con la siguiente página mientras DynamoDB la reporte
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                break
+            scan_kwargs['ExclusiveStartKey'] = last_key
+
 # Instancia global del servicio
 db_service = DynamoDBService()
\ No newline at end of file
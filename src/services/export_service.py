@@ -0,0 +1,80 @@
+import csv
+import io
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from src.services.transaction_service import transaction_service
+from src.utils import json_default
+
+TRANSACTION_EXPORT_FIELDS = [
+    "transaction_id",
+    "user_id",
+    "type",
+    "fund_id",
+    "amount",
+    "balance_before",
+    "balance_after",
+    "status",
+    "created_at"
+]
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+class ExportService:
+    def __init__(self, chunk_size: int = 500):
+        # Cantidad de filas que agrupo en cada fragmento de la respuesta
+        self.chunk_size = chunk_size
+
+    def _chunks(self, rows: Iterable[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+        """Agrupo las filas en bloques de tamaño fijo"""
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def to_ndjson(self, rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+        """Serializo las filas como NDJSON, un objeto por línea"""
+        for chunk in self._chunks(rows):
+            yield "".join(
+                json.dumps({field: row.get(field) for field in TRANSACTION_EXPORT_FIELDS},
+                           default=json_default, ensure_ascii=False) + "\n"
+                for row in chunk
+            )
+
+    def to_csv(self, rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+        """Serializo las filas como CSV con encabezado"""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=TRANSACTION_EXPORT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for chunk in self._chunks(rows):
+            writer.writerows(chunk)
+            yield buffer.getvalue()
+            # Reutilizo el buffer para que la memoria no crezca con la tabla
+            buffer.seek(0)
+            buffer.truncate(0)
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    def export_transactions(self, export_format: str = "ndjson", fund_id: Optional[str] = None,
+                            transaction_type: Optional[str] = None, date_from: Optional[str] = None,
+                            date_to: Optional[str] = None) -> Iterator[str]:
+        """Genero la exportación de transacciones en streaming"""
+        rows = transaction_service.iter_transactions(
+            fund_id=fund_id,
+            transaction_type=transaction_type,
+            date_from=date_from,
+            date_to=date_to,
+            page_size=self.chunk_size
+        )
+        if export_format == "csv":
+            return self.to_csv(rows)
+        return self.to_ndjson(rows)
+
+# Instancia global del servicio
+export_service = ExportService()
@@ -1,7 +1,9 @@
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 from src.services.database import db_service
 from src.models.fund import Fund, FundResponse
 from src.exceptions import FundNotFoundException
+from src.utils import construct_many
+from src.services.singleflight import single_flight
 
 class FundService:
     def __init__(self):
@@ -53,6 +55,7 @@ class FundService:
             if not existing:
                 db_service.create_item(self.table_name, fund_data)
     
+    @single_flight("funds.get_fund")
     def get_fund(self, fund_id: str) -> FundResponse:
         """Obtengo fondo por ID"""
         fund_item = db_service.get_item(self.table_name, {"fund_id": fund_id})
@@ -60,11 +63,13 @@ class FundService:
             raise FundNotFoundException(fund_id)
         return FundResponse(**fund_item)
     
+    @single_flight("funds.get_all_funds")
     def get_all_funds(self) -> List[FundResponse]:
         """Obtengo todos los fondos"""
         funds = db_service.scan_items(self.table_name)
-        return [FundResponse(**fund) for fund in funds]
+        return construct_many(FundResponse, funds)
     
+    @single_flight("funds.get_active_funds")
     def get_active_funds(self) -> List[FundResponse]:
         """Obtengo solo fondos activos"""
         funds = db_service.scan_items(
@@ -72,7 +77,22 @@ class FundService:
             "is_active = :is_active",
             {":is_active": True}
         )
-        return [FundResponse(**fund) for fund in funds]
+        return construct_many(FundResponse, funds)
+    
+    @single_flight("funds.get_funds_page")
+    def get_funds_page(self, limit: int, exclusive_start_key: Optional[Dict[str, Any]] = None,
+                       fields: Optional[List[str]] = None,
+                       active_only: bool = False) -> Tuple[List[FundResponse], Optional[Dict[str, Any]]]:
+        """Obtengo una página de fondos (o solo de los activos) y la clave para continuar"""
+        funds, last_key = db_service.scan_page(
+            self.table_name,
+            "is_active = :is_active" if active_only else None,
+            {":is_active": True} if active_only else None,
+            limit=limit,
+            exclusive_start_key=exclusive_start_key,
+            projection=fields
+        )
+        return construct_many(FundResponse, funds), last_key
 
 # Instancia global del servicio
 fund_service = FundService()
\ No newline at end of file
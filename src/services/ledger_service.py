@@ -0,0 +1,209 @@
+import itertools
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from src.services.database import db_service
+from src.services.transaction_service import transaction_service
+from src.services.user_service import user_service
+from src.models.ledger import LedgerCheckpoint, LedgerBalanceResponse, LedgerStatementResponse
+from src.models.transaction import TransactionResponse, TransactionType, TransactionStatus
+from src.config import settings
+from src.utils import get_current_timestamp
+
+# Diferencia máxima tolerada al comparar saldos almacenados con los recalculados
+BALANCE_TOLERANCE = 0.005
+
+def _transaction_order(transaction: Dict[str, Any]) -> Tuple[str, str]:
+    """Clave de orden del ledger: fecha y, en empate, id de la transacción"""
+    return transaction['created_at'], transaction['transaction_id']
+
+class LedgerService:
+    def __init__(self):
+        self.table_name = 'ledger'
+        self.checkpoint_interval = settings.ledger_checkpoint_interval
+
+    def _apply_transaction(self, balance: float, transaction: Dict[str, Any]) -> float:
+        """Aplico el efecto de una transacción sobre el saldo"""
+        if transaction.get('status') != TransactionStatus.COMPLETED.value:
+            return balance
+        amount = float(transaction['amount'])
+        if transaction['type'] == TransactionType.SUBSCRIPTION.value:
+            return balance - amount
+        return balance + amount
+
+    def _replay(self, balance: float, transactions: Iterable[Dict[str, Any]]) -> Tuple[float, int, int]:
+        """Reproduzco las transacciones y verifico los saldos guardados en cada una"""
+        mismatches = 0
+        count = 0
+        for transaction in transactions:
+            if transaction.get('status') == TransactionStatus.COMPLETED.value:
+                if abs(float(transaction['balance_before']) - balance) > BALANCE_TOLERANCE:
+                    mismatches += 1
+                balance = self._apply_transaction(balance, transaction)
+                if abs(float(transaction['balance_after']) - balance) > BALANCE_TOLERANCE:
+                    mismatches += 1
+            count += 1
+        return balance, count, mismatches
+
+    def _after_checkpoint(self, transactions: Iterable[Dict[str, Any]],
+                          checkpoint: Optional[LedgerCheckpoint]) -> Iterable[Dict[str, Any]]:
+        """Descarto las transacciones que ya están incluidas en el checkpoint"""
+        # Orden total por (created_at, transaction_id): dos transacciones con la misma fecha
+        # quedan siempre del mismo lado del checkpoint, aunque el índice las devuelva en otro orden.
+        # El índice ya viene por fecha; solo ordeno cada grupo de empates, sin cargar todo el historial
+        transactions = (
+            transaction
+            for _, tied in itertools.groupby(transactions, key=lambda transaction: transaction['created_at'])
+            for transaction in sorted(tied, key=_transaction_order)
+        )
+        if not checkpoint:
+            yield from transactions
+            return
+        boundary = (checkpoint.checkpoint_at, checkpoint.transaction_id)
+        for transaction in transactions:
+            if _transaction_order(transaction) > boundary:
+                yield transaction
+
+    def get_latest_checkpoint(self, user_id: str, at: Optional[str] = None) -> Optional[LedgerCheckpoint]:
+        """Obtengo el último checkpoint del usuario anterior o igual a una fecha"""
+        key_condition = "user_id = :user_id"
+        expression_values = {":user_id": user_id}
+        if at:
+            key_condition += " AND checkpoint_at <= :at"
+            expression_values[":at"] = at
+
+        checkpoints = db_service.query_items(
+            self.table_name,
+            key_condition,
+            expression_values,
+            scan_index_forward=False,
+            limit=1
+        )
+        return LedgerCheckpoint(**checkpoints[0]) if checkpoints else None
+
+    def _opening_balance(self, user_id: str, at: str, checkpoint: Optional[LedgerCheckpoint],
+                         tail: List[Dict[str, Any]]) -> float:
+        """Determino el saldo desde el que empiezo a reproducir la cola"""
+        if checkpoint:
+            return checkpoint.balance
+        if tail:
+            return float(tail[0]['balance_before'])
+
+        # Sin movimientos hasta la fecha: el saldo es el previo a la siguiente transacción
+        next_transaction = transaction_service.get_first_user_transaction_after(user_id, at)
+        if next_transaction:
+            return float(next_transaction['balance_before'])
+        return user_service.get_user(user_id).balance
+
+    def get_balance_at(self, user_id: str, at: Optional[str] = None) -> LedgerBalanceResponse:
+        """Obtengo el saldo del usuario en una fecha: checkpoint + cola acotada"""
+        at = at or get_current_timestamp()
+        checkpoint = self.get_latest_checkpoint(user_id, at)
+        tail = list(self._after_checkpoint(
+            transaction_service.iter_user_transactions_between(
+                user_id,
+                date_from=checkpoint.checkpoint_at if checkpoint else None,
+                date_to=at
+            ),
+            checkpoint
+        ))
+
+        opening = self._opening_balance(user_id, at, checkpoint, tail)
+        balance, count, mismatches = self._replay(opening, tail)
+
+        return LedgerBalanceResponse(
+            user_id=user_id,
+            at=at,
+            balance=balance,
+            checkpoint_at=checkpoint.checkpoint_at if checkpoint else None,
+            tail_transactions=count,
+            verified=mismatches == 0
+        )
+
+    def get_statement(self, user_id: str, date_from: str, date_to: str) -> LedgerStatementResponse:
+        """Genero el extracto del usuario: saldo inicial, movimientos y saldo final"""
+        opening = self.get_balance_at(user_id, date_from)
+        transactions = [
+            transaction
+            for transaction in transaction_service.iter_user_transactions_between(user_id, date_from, date_to)
+            if transaction['created_at'] > date_from
+        ]
+        closing, _, mismatches = self._replay(opening.balance, transactions)
+
+        return LedgerStatementResponse(
+            user_id=user_id,
+            date_from=date_from,
+            date_to=date_to,
+            opening_balance=opening.balance,
+            closing_balance=closing,
+            transactions=[TransactionResponse(**transaction) for transaction in transactions],
+            verified=opening.verified and mismatches == 0
+        )
+
+    def _save_checkpoint(self, user_id: str, transaction: Dict[str, Any], balance: float,
+                         transaction_count: int, mismatches: int) -> LedgerCheckpoint:
+        """Guardo un checkpoint después de la transacción indicada"""
+        checkpoint = LedgerCheckpoint(
+            user_id=user_id,
+            checkpoint_at=transaction['created_at'],
+            balance=balance,
+            transaction_id=transaction['transaction_id'],
+            transaction_count=transaction_count,
+            mismatches=mismatches,
+            created_at=get_current_timestamp()
+        )
+        db_service.create_item(self.table_name, checkpoint.model_dump())
+        return checkpoint
+
+    def build_user_checkpoints(self, user_id: str) -> Dict[str, int]:
+        """Construyo los checkpoints pendientes de un usuario desde el último existente"""
+        checkpoint = self.get_latest_checkpoint(user_id)
+        balance = checkpoint.balance if checkpoint else None
+        total = checkpoint.transaction_count if checkpoint else 0
+        pending = 0
+        mismatches = 0
+        written = 0
+
+        transactions = self._after_checkpoint(
+            transaction_service.iter_user_transactions_between(
+                user_id,
+                date_from=checkpoint.checkpoint_at if checkpoint else None
+            ),
+            checkpoint
+        )
+        for transaction in transactions:
+            if balance is None:
+                balance = float(transaction['balance_before'])
+            balance, _, transaction_mismatches = self._replay(balance, [transaction])
+            mismatches += transaction_mismatches
+            total += 1
+            pending += 1
+
+            # Cada intervalo de transacciones guardo un nuevo checkpoint
+            if pending >= self.checkpoint_interval:
+                self._save_checkpoint(user_id, transaction, balance, total, mismatches)
+                written += 1
+                pending = 0
+
+        return {"checkpoints_written": written, "mismatches": mismatches}
+
+    def build_checkpoints(self, user_id: Optional[str] = None) -> Dict[str, int]:
+        """Job por lotes: construyo incrementalmente los checkpoints de uno o todos los usuarios"""
+        summary = {"users": 0, "checkpoints_written": 0, "mismatches": 0}
+        if user_id:
+            user_ids = [user_id]
+        else:
+            user_ids = (
+                user['user_id']
+                for page in db_service.scan_pages('users')
+                for user in page
+            )
+
+        for current_user_id in user_ids:
+            result = self.build_user_checkpoints(current_user_id)
+            summary["users"] += 1
+            summary["checkpoints_written"] += result["checkpoints_written"]
+            summary["mismatches"] += result["mismatches"]
+
+        return summary
+
+# Instancia global del servicio
+ledger_service = LedgerService()
@@ -1,13 +1,38 @@
-from typing import List, Optional, Dict, Any
-from src.services.database import db_service
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any, Iterator, Tuple, Union
+from botocore.exceptions import ClientError
+from src.services.database import db_service, is_conditional_check_failed
+from src.services.archive_service import archive_service, ARCHIVE_CURSOR_KEY
 from src.models.notification import Notification, NotificationCreate, NotificationResponse
-from src.exceptions import NotificationNotFoundException
-from src.utils import generate_id
+from src.exceptions import BTGException, NotificationNotFoundException, InvalidNotificationTransitionException
+from src.notifications.templates import template_registry
+from src.notifications.events import notification_events
+from src.config import settings
+from src.metrics import MetricFamily, metrics_registry
+from src.utils import generate_id, get_current_timestamp, compute_backoff, construct_many
 from boto3.dynamodb.conditions import Key
 
+logger = logging.getLogger(__name__)
+
+# Estados que forman la cola de trabajo y viven en el índice disperso
+QUEUE_STATUSES = ("pending", "processing", "failed", "dead_letter")
+# Solo se envía lo reclamado (processing): quien la encola en proceso la reclamó antes
+SENDABLE_STATUS = "processing"
+QUEUE_INDEX = "queue_status-created_at-index"
+USER_INDEX = "user_id-created_at-index"
+# Atributos que necesito para renderizar el contenido de las notificaciones con plantilla
+RENDER_ATTRIBUTES = ("notification_id", "content", "template_id", "params")
+# Solo las fallidas con reintento programado tienen next_attempt_at
+RETRY_INDEX = "queue_status-next_attempt_at-index"
+
 class NotificationService:
     def __init__(self):
         self.table_name = 'notifications'
+        # (vence_en, profundidad por estado) para no consultar DynamoDB en cada scrape de /metrics
+        self._queue_depth: Optional[Tuple[float, Dict[Tuple[str, ...], int]]] = None
     
     def create_notification(self, notification_data: NotificationCreate) -> NotificationResponse:
         """Crear nueva notificación"""
@@ -18,32 +43,67 @@ class NotificationService:
             'type': notification_data.type.value,
             'channel': notification_data.channel.value,
             'status': notification_data.status.value,
-            'content': notification_data.content,
-            'created_at': generate_id(),
-            'sent_at': None
+            'created_at': get_current_timestamp(),
+            'attempts': 0
         }
         
+        # Con plantilla guardo solo id + parámetros; el texto se renderiza al enviar o al consultar
+        if notification_data.template_id:
+            notification_item['template_id'] = notification_data.template_id
+            notification_item['params'] = notification_data.params or {}
+        else:
+            notification_item['content'] = notification_data.content
+        
+        # Solo las notificaciones por procesar entran al índice disperso de la cola
+        if notification_item['status'] in QUEUE_STATUSES:
+            notification_item['queue_status'] = notification_item['status']
+        # Creada ya reclamada: quien la crea la encola en proceso y drain_pending no la toma
+        if notification_item['status'] == SENDABLE_STATUS:
+            notification_item['claimed_at'] = notification_item['created_at']
+        
         # Guardar en DynamoDB
         db_service.create_item(self.table_name, notification_item)
         
+        self._publish("notification.created", notification_item)
         return NotificationResponse(**notification_item)
     
+    def _to_responses(self, notifications: List[Dict[str, Any]], trusted: bool = False) -> List[NotificationResponse]:
+        """Convierto filas en respuestas, renderizando en lote las que guardan plantilla"""
+        templated = [notif for notif in notifications if not notif.get('content') and notif.get('template_id')]
+        if templated:
+            rendered = template_registry.render_many(
+                (notif['template_id'], notif.get('params') or {}) for notif in templated
+            )
+            contents = {notif['notification_id']: message.body for notif, message in zip(templated, rendered)}
+            notifications = [
+                {**notif, 'content': contents[notif['notification_id']]} if notif['notification_id'] in contents else notif
+                for notif in notifications
+            ]
+        if trusted:
+            # Listas que van directo a la respuesta HTTP: no vuelvo a validar filas propias
+            return construct_many(NotificationResponse, notifications)
+        return [NotificationResponse(**notif) for notif in notifications]
+    
+    def _publish(self, event: str, notification: Dict[str, Any]) -> NotificationResponse:
+        """Aviso el cambio a las conexiones SSE del usuario"""
+        response = self._to_responses([notification])[0]
+        notification_events.publish(response.user_id, event, response.model_dump())
+        return response
+    
     def get_notification(self, notification_id: str) -> NotificationResponse:
         """Obtener notificación por ID"""
-        notifications = db_service.scan_items(
-            self.table_name,
-            "notification_id = :notification_id",
-            {":notification_id": notification_id}
-        )
+        notification = db_service.get_item(self.table_name, {'notification_id': notification_id})
         
-        if not notifications:
+        if not notification:
             raise NotificationNotFoundException(notification_id)
         
-        return NotificationResponse(**notifications[0])
+        return self._to_responses([notification])[0]
     
-    def get_user_notifications(self, user_id: str, current_user: dict = None) -> List[NotificationResponse]:
+    def get_user_notifications(self, user_id: str, current_user: dict = None,
+                               include_archived: bool = False) -> List[NotificationResponse]:
         """Obtengo notificaciones - admin ve todas, cliente solo las suyas"""
-        if current_user and current_user.get("role") == "admin":
+        is_admin = bool(current_user and current_user.get("role") == "admin")
+        if is_admin:
             # Admin ve todas las notificaciones
             notifications = db_service.scan_items(self.table_name)
         else:
@@ -55,10 +115,63 @@ class NotificationService:
                 index_name="user_id-index"
             )
         
+        # El histórico archivado solo se lee cuando se pide explícitamente
+        if include_archived:
+            notifications.extend(archive_service.read_archived(
+                self.table_name,
+                user_id=None if is_admin else user_id
+            ))
+        
         # Ordenar por fecha de creación (más recientes primero)
         notifications.sort(key=lambda x: x['created_at'], reverse=True)
         
-        return [NotificationResponse(**notif) for notif in notifications]
+        return self._to_responses(notifications, trusted=True)
+    
+    def get_user_notifications_page(self, user_id: str, current_user: dict = None, limit: int = 50,
+                                    exclusive_start_key: Optional[Dict[str, Any]] = None,
+                                    fields: Optional[List[str]] = None,
+                                    include_archived: bool = False) -> Tuple[List[NotificationResponse], Optional[Dict[str, Any]]]:
+        """Obtengo una página de notificaciones (más recientes primero) y la clave para continuar"""
+        is_admin = bool(current_user and current_user.get("role") == "admin")
+        
+        # Agotada la tabla, el cursor sigue por el histórico archivado
+        if exclusive_start_key and ARCHIVE_CURSOR_KEY in exclusive_start_key:
+            notifications, next_key = archive_service.read_archived_page(
+                self.table_name,
+                exclusive_start_key,
+                limit,
+                user_id=None if is_admin else user_id
+            )
+            return self._to_responses(notifications, trusted=True), next_key
+        
+        # Si se pide el contenido, traigo también la plantilla para renderizarlo
+        projection = fields
+        if fields and "content" in fields:
+            projection = list(dict.fromkeys([*fields, *RENDER_ATTRIBUTES]))
+        
+        if is_admin:
+            # Admin recorre la tabla completa; el orden es el del scan
+            notifications, last_key = db_service.scan_page(
+                self.table_name,
+                limit=limit,
+                exclusive_start_key=exclusive_start_key,
+                projection=projection
+            )
+        else:
+            notifications, last_key = db_service.query_page(
+                self.table_name,
+                "user_id = :user_id",
+                {":user_id": user_id},
+                index_name=USER_INDEX,
+                scan_index_forward=False,
+                limit=limit,
+                exclusive_start_key=exclusive_start_key,
+                projection=projection
+            )
+        
+        if not last_key and include_archived:
+            last_key = {ARCHIVE_CURSOR_KEY: 0}
+        return self._to_responses(notifications, trusted=True), last_key
     
     def get_user_notifications_by_type(self, user_id: str, notification_type: str) -> List[NotificationResponse]:
         """Obtener notificaciones de un usuario por tipo"""
@@ -77,65 +190,274 @@ class NotificationService:
         # Ordenar por fecha de creación (más recientes primero)
         notifications.sort(key=lambda x: x['created_at'], reverse=True)
         
-        return [NotificationResponse(**notif) for notif in notifications]
+        return self._to_responses(notifications)
+    
+    def get_notifications_page(self, status: str, limit: int = 100,
+                               exclusive_start_key: Optional[Dict[str, Any]] = None) -> Tuple[List[NotificationResponse], Optional[Dict[str, Any]]]:
+        """Obtengo una página de la cola (pendientes o fallidas), de la más antigua a la más reciente"""
+        notifications, last_key = db_service.query_page(
+            self.table_name,
+            "queue_status = :status",
+            {":status": status},
+            index_name=QUEUE_INDEX,
+            limit=limit,
+            exclusive_start_key=exclusive_start_key
+        )
+        return [NotificationResponse(**notif) for notif in notifications], last_key
+    
+    def count_queue(self, status: str) -> int:
+        """Cuento las notificaciones de la cola en un estado sin traerlas"""
+        return db_service.count_items(
+            self.table_name,
+            "queue_status = :status",
+            {":status": status},
+            index_name=QUEUE_INDEX
+        )
+    
+    def collect_queue_metrics(self) -> List[MetricFamily]:
+        """Profundidad de la cola persistente por estado (es global: se calcula al exponer, no por worker)"""
+        now = time.monotonic()
+        if self._queue_depth is None or self._queue_depth[0] <= now:
+            depths = {(status,): self.count_queue(status) for status in QUEUE_STATUSES}
+            self._queue_depth = (now + settings.metrics_queue_depth_ttl_seconds, depths)
+        return [MetricFamily(
+            "notification_queue_depth", "gauge", "Notificaciones en la cola persistente por estado",
+            ("status",), dict(self._queue_depth[1])
+        )]
+    
+    def iter_queue(self, status: str, page_size: int = 100) -> Iterator[List[NotificationResponse]]:
+        """Recorro la cola por páginas sin leer las notificaciones ya enviadas"""
+        last_key = None
+        while True:
+            page, last_key = self.get_notifications_page(status, page_size, last_key)
+            if page:
+                yield page
+            if not last_key:
+                break
     
-    def get_notifications_by_status(self, status: str) -> List[NotificationResponse]:
+    def get_notifications_by_status(self, status: str, limit: Optional[int] = None) -> List[NotificationResponse]:
         """Obtener notificaciones por estado"""
+        if status in QUEUE_STATUSES:
+            # La cola se consulta por el índice disperso, más antiguas primero
+            notifications = []
+            for page in self.iter_queue(status, page_size=min(limit or 100, 100)):
+                notifications.extend(page)
+                if limit and len(notifications) >= limit:
+                    return notifications[:limit]
+            return notifications
+        
         notifications = db_service.scan_items(
             self.table_name,
             "#status = :status",
-            {":status": status}
+            {":status": status},
+            {"#status": "status"}
         )
         
         # Ordenar por fecha de creación (más recientes primero)
         notifications.sort(key=lambda x: x['created_at'], reverse=True)
         
-        return [NotificationResponse(**notif) for notif in notifications]
+        return self._to_responses(notifications)
     
-    def mark_notification_sent(self, notification_id: str) -> NotificationResponse:
-        """Marcar notificación como enviada"""
-        notification = self.get_notification(notification_id)
+    def _transition(self, notification_id: str, expected_status: Union[str, Tuple[str, ...]], update_expression: str,
+                    expression_values: Dict[str, Any], extra_condition: Optional[str] = None) -> NotificationResponse:
+        """Aplico una transición por clave solo si la notificación sigue en el estado (o estados) esperado"""
+        if isinstance(expected_status, str):
+            expression_values[":expected"] = expected_status
+            condition = "#status = :expected"
+        else:
+            placeholders = []
+            for position, status in enumerate(expected_status):
+                placeholders.append(f":expected_{position}")
+                expression_values[f":expected_{position}"] = status
+            condition = f"#status IN ({', '.join(placeholders)})"
+            expected_status = " o ".join(expected_status)
+        if extra_condition:
+            condition = f"{condition} AND {extra_condition}"
+        try:
+            response = db_service.update_item(
+                self.table_name,
+                {'notification_id': notification_id},
+                update_expression,
+                expression_values,
+                {"#status": "status"},
+                condition_expression=condition,
+                return_values="ALL_NEW"
+            )
+        except ClientError as e:
+            if not is_conditional_check_failed(e):
+                raise
+            # Solo en el camino de error distingo si la notificación no existe
+            if not db_service.get_item(self.table_name, {'notification_id': notification_id}):
+                raise NotificationNotFoundException(notification_id)
+            raise InvalidNotificationTransitionException(notification_id, expected_status)
         
-        # Actualizar estado
-        db_service.update_item(
-            self.table_name,
-            {'user_id': notification.user_id, 'notification_id': notification_id},
-            "SET #status = :status, sent_at = :sent_at",
+        return self._publish("notification.updated", response['Attributes'])
+    
+    def claim_notification(self, notification_id: str) -> NotificationResponse:
+        """Reclamo una pendiente para enviarla (pending → processing); solo un proceso lo logra"""
+        return self._transition(
+            notification_id,
+            "pending",
+            "SET #status = :status, queue_status = :status, claimed_at = :claimed_at",
+            {
+                ":status": SENDABLE_STATUS,
+                ":claimed_at": get_current_timestamp()
+            }
+        )
+    
+    def mark_notification_sent(self, notification_id: str) -> NotificationResponse:
+        """Marco la notificación como enviada (processing → sent)"""
+        return self._transition(
+            notification_id,
+            SENDABLE_STATUS,
+            "REMOVE queue_status, claimed_at SET #status = :status, sent_at = :sent_at",
             {
                 ":status": "sent",
-                ":sent_at": generate_id()
+                ":sent_at": get_current_timestamp()
             }
         )
-        
-        # Retornar notificación actualizada
-        return self.get_notification(notification_id)
     
-    def mark_notification_failed(self, notification_id: str) -> NotificationResponse:
-        """Marcar notificación como fallida"""
+    def mark_notification_failed(self, notification_id: str, error: Optional[str] = None) -> NotificationResponse:
+        """Marco la notificación como fallida y programo su reintento (o la paso a dead_letter)"""
         notification = self.get_notification(notification_id)
+        attempts = notification.attempts + 1
+        # El destino (failed o dead_letter) sale de los intentos leídos: si otro fallo los cambió, no escribo
+        if notification.attempts:
+            attempts_condition = "attempts = :previous_attempts"
+        else:
+            attempts_condition = "(attribute_not_exists(attempts) OR attempts = :previous_attempts)"
+        
+        if attempts >= settings.notification_max_attempts:
+            # Agotó los intentos: sale del índice de reintentos y queda para requeue manual
+            return self._transition(
+                notification_id,
+                SENDABLE_STATUS,
+                "REMOVE next_attempt_at, claimed_at SET #status = :status, queue_status = :status, "
+                "attempts = :attempts, last_error = :error",
+                {
+                    ":status": "dead_letter",
+                    ":attempts": attempts,
+                    ":previous_attempts": notification.attempts,
+                    ":error": error
+                },
+                attempts_condition
+            )
         
-        # Actualizar estado
-        db_service.update_item(
+        delay = compute_backoff(
+            attempts,
+            settings.notification_retry_base_seconds,
+            settings.notification_retry_max_seconds
+        )
+        return self._transition(
+            notification_id,
+            SENDABLE_STATUS,
+            "REMOVE claimed_at SET #status = :status, queue_status = :status, attempts = :attempts, "
+            "next_attempt_at = :next_attempt_at, last_error = :error",
+            {
+                ":status": "failed",
+                ":attempts": attempts,
+                ":previous_attempts": notification.attempts,
+                ":next_attempt_at": (datetime.utcnow() + timedelta(seconds=delay)).isoformat(),
+                ":error": error
+            },
+            attempts_condition
+        )
+    
+    def mark_many(self, notification_ids: List[str], status: str,
+                  errors: Optional[Dict[str, str]] = None) -> Dict[str, Optional[NotificationResponse]]:
+        """Transiciono muchas notificaciones en paralelo; None indica que la transición no se aplicó"""
+        if status == "sent":
+            transition = self.mark_notification_sent
+        elif status == "failed":
+            errors = errors or {}
+            transition = lambda notification_id: self.mark_notification_failed(notification_id, errors.get(notification_id))
+        else:
+            raise ValueError(f"Transición no soportada: {status}")
+        
+        def apply(notification_id: str) -> Optional[NotificationResponse]:
+            try:
+                return transition(notification_id)
+            except BTGException as e:
+                logger.warning(e.message)
+            except Exception as e:
+                logger.error(f"No se pudo marcar {notification_id} como {status}: {e}")
+            return None
+        
+        if not notification_ids:
+            return {}
+        workers = min(settings.notification_ack_workers, len(notification_ids))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return dict(zip(notification_ids, executor.map(apply, notification_ids)))
+    
+    def get_due_retries(self, now: Optional[str] = None, limit: Optional[int] = None) -> List[NotificationResponse]:
+        """Obtengo las fallidas cuyo reintento ya venció, las más atrasadas primero"""
+        notifications = db_service.query_items(
             self.table_name,
-            {'user_id': notification.user_id, 'notification_id': notification_id},
-            "SET #status = :status",
-            {":status": "failed"}
+            "queue_status = :status AND next_attempt_at <= :now",
+            {
+                ":status": "failed",
+                ":now": now or get_current_timestamp()
+            },
+            index_name=RETRY_INDEX,
+            limit=limit or settings.notification_retry_batch_size
         )
+        return [NotificationResponse(**notif) for notif in notifications]
+    
+    def requeue_notification(self, notification_id: str, expected_status: str,
+                             reset_attempts: bool = False, claim: bool = False) -> bool:
+        """Devuelvo la notificación a pendiente (o la reclamo, si la encolo yo) solo si sigue en el estado esperado"""
+        if claim:
+            update_expression = ("REMOVE next_attempt_at "
+                                 "SET #status = :status, queue_status = :status, claimed_at = :claimed_at")
+            expression_values = {
+                ":status": SENDABLE_STATUS,
+                ":expected": expected_status,
+                ":claimed_at": get_current_timestamp()
+            }
+        else:
+            update_expression = "REMOVE next_attempt_at, claimed_at SET #status = :status, queue_status = :status"
+            expression_values = {
+                ":status": "pending",
+                ":expected": expected_status
+            }
+        if reset_attempts:
+            update_expression += ", attempts = :attempts"
+            expression_values[":attempts"] = 0
         
-        # Retornar notificación actualizada
-        return self.get_notification(notification_id)
+        try:
+            response = db_service.update_item(
+                self.table_name,
+                {'notification_id': notification_id},
+                update_expression,
+                expression_values,
+                {"#status": "status"},
+                condition_expression="#status = :expected",
+                return_values="ALL_NEW"
+            )
+        except ClientError as e:
+            # Otro proceso ya la tomó o cambió de estado
+            if is_conditional_check_failed(e):
+                return False
+            raise
+        self._publish("notification.updated", response['Attributes'])
+        return True
     
-    def get_pending_notifications(self) -> List[NotificationResponse]:
+    def get_pending_notifications(self, limit: Optional[int] = None) -> List[NotificationResponse]:
         """Obtener notificaciones pendientes"""
-        return self.get_notifications_by_status("pending")
+        return self.get_notifications_by_status("pending", limit)
     
     def get_sent_notifications(self) -> List[NotificationResponse]:
         """Obtener notificaciones enviadas"""
         return self.get_notifications_by_status("sent")
     
-    def get_failed_notifications(self) -> List[NotificationResponse]:
+    def get_failed_notifications(self, limit: Optional[int] = None) -> List[NotificationResponse]:
         """Obtener notificaciones fallidas"""
-        return self.get_notifications_by_status("failed")
+        return self.get_notifications_by_status("failed", limit)
+    
+    def get_dead_letter_notifications(self, limit: Optional[int] = None) -> List[NotificationResponse]:
+        """Obtengo las notificaciones que agotaron sus reintentos"""
+        return self.get_notifications_by_status("dead_letter", limit)
 
 # Instancia global del servicio
-notification_service = NotificationService()
\ No newline at end of file
+notification_service = NotificationService()
+metrics_registry.register_collector(notification_service.collect_queue_metrics, per_process=False)
\ No newline at end of file
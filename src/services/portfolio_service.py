@@ -0,0 +1,246 @@
+import contextvars
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from src.services.database import db_service, is_conditional_check_failed
+from src.services.user_service import user_service
+from src.services.fund_service import fund_service
+from src.services.transaction_service import transaction_service
+from src.services.notification_service import notification_service
+from src.models.fund import FundResponse
+from src.models.subscription import SubscriptionResponse
+from src.models.portfolio import PortfolioPosition, PortfolioResponse, PortfolioSummaryResponse
+from src.exceptions import PortfolioTimeoutException
+from src.utils import get_current_timestamp
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Sin estas secciones no hay portafolio; las demás se omiten si fallan o no llegan a tiempo
+REQUIRED_SECTIONS = ("summary",)
+
+# Reintentos de la reconstrucción cuando otra escritura cambia la versión entre la lectura y el guardado
+REBUILD_ATTEMPTS = 3
+
+# Operación de db_service.transact_write: (acción, tabla, parámetros)
+TransactOperation = Tuple[str, str, Dict[str, Any]]
+
+class PortfolioService:
+    def __init__(self):
+        # Documento materializado por usuario: saldo, posiciones activas y totales
+        self.table_name = 'portfolios'
+        # Pool compartido: no creo hilos en cada petición y acoto las consultas simultáneas a DynamoDB
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.portfolio_fanout_workers,
+            thread_name_prefix="portfolio"
+        )
+    
+    def _submit(self, function: Callable, *args, **kwargs) -> Future:
+        """Lanzo la consulta en el pool con una copia del contexto (Server-Timing suma sus tiempos)"""
+        context = contextvars.copy_context()
+        return self._executor.submit(context.run, function, *args, **kwargs)
+    
+    def _collect(self, futures: Dict[str, Future]) -> Dict[str, Any]:
+        """Espero todas las consultas con un plazo común; la espera total es la de la más lenta"""
+        deadline = time.monotonic() + settings.portfolio_timeout_seconds
+        results: Dict[str, Any] = {}
+        for section, future in futures.items():
+            try:
+                results[section] = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except Exception as e:
+                if section in REQUIRED_SECTIONS:
+                    for pending in futures.values():
+                        pending.cancel()
+                    if future.done():
+                        raise
+                    raise PortfolioTimeoutException(section) from e
+                logger.warning(f"Portafolio sin {section}: {e!r}")
+        return results
+    
+    def position_added(self, subscription_item: Dict[str, Any], fund: Optional[FundResponse] = None,
+                       balance: Optional[float] = None) -> TransactOperation:
+        """Armo la actualización del documento para una suscripción nueva (va en la misma transacción)"""
+        position = {
+            'subscription_id': subscription_item['subscription_id'],
+            'fund_id': subscription_item['fund_id'],
+            'fund_name': fund.name if fund else None,
+            'category': fund.category if fund else None,
+            'amount': subscription_item['amount'],
+            'subscribed_at': subscription_item['created_at']
+        }
+        set_clauses = ["positions.#subscription = :position"]
+        values = {":position": position, ":amount": subscription_item['amount']}
+        return self._position_change(
+            subscription_item['user_id'],
+            subscription_item['subscription_id'],
+            "ADD version :one, total_invested :amount",
+            set_clauses,
+            values,
+            # Si el documento no existe la transacción se cancela y lo reconstruyo
+            "attribute_exists(positions)",
+            balance
+        )
+    
+    def position_removed(self, subscription: SubscriptionResponse,
+                         balance: Optional[float] = None) -> TransactOperation:
+        """Armo la actualización del documento para una suscripción cancelada (va en la misma transacción)"""
+        return self._position_change(
+            subscription.user_id,
+            subscription.subscription_id,
+            "ADD version :one, total_invested :amount REMOVE positions.#subscription",
+            [],
+            {":amount": -subscription.amount},
+            # Si la posición no está el documento está desfasado y lo reconstruyo
+            "attribute_exists(positions.#subscription)",
+            balance
+        )
+    
+    def _position_change(self, user_id: str, subscription_id: str, update_prefix: str,
+                         set_clauses: List[str], values: Dict[str, Any], condition: str,
+                         balance: Optional[float]) -> TransactOperation:
+        """Completo la actualización: la versión sube con ADD, sin leer el documento antes"""
+        set_clauses = set_clauses + ["updated_at = :updated_at"]
+        values = {**values, ":one": 1, ":updated_at": get_current_timestamp()}
+        if balance is not None:
+            set_clauses.append("balance = :balance")
+            values[":balance"] = balance
+        return ('Update', self.table_name, {
+            'Key': {'user_id': user_id},
+            'UpdateExpression': f"{update_prefix} SET {', '.join(set_clauses)}",
+            'ConditionExpression': condition,
+            'ExpressionAttributeNames': {"#subscription": subscription_id},
+            'ExpressionAttributeValues': values
+        })
+    
+    def _build_document(self, user_id: str, funds: Optional[Dict[str, FundResponse]] = None) -> Dict[str, Any]:
+        """Calculo el documento desde las tablas de origen"""
+        user = user_service.get_user(user_id)
+        if funds is None:
+            funds = {fund.fund_id: fund for fund in fund_service.get_all_funds()}
+        # Consulto la tabla directamente: subscription_service depende de este servicio
+        subscriptions = db_service.query_items(
+            'subscriptions',
+            "user_id = :user_id",
+            {":user_id": user_id, ":status": "active"},
+            index_name="user_id-index",
+            expression_attribute_names={"#status": "status"},
+            filter_expression="#status = :status"
+        )
+        positions = {}
+        for subscription in subscriptions:
+            fund = funds.get(subscription['fund_id'])
+            positions[subscription['subscription_id']] = {
+                'subscription_id': subscription['subscription_id'],
+                'fund_id': subscription['fund_id'],
+                'fund_name': fund.name if fund else None,
+                'category': fund.category if fund else None,
+                'amount': float(subscription['amount']),
+                'subscribed_at': subscription['created_at']
+            }
+        return {
+            'balance': user.balance,
+            'positions': positions,
+            'total_invested': sum(position['amount'] for position in positions.values())
+        }
+    
+    def rebuild_user(self, user_id: str, funds: Optional[Dict[str, FundResponse]] = None) -> Dict[str, Any]:
+        """Reconstruyo el documento de un usuario sin pisar escrituras concurrentes"""
+        for _ in range(REBUILD_ATTEMPTS):
+            # Leo la versión antes que las fuentes: si una suscripción entra en medio, la versión cambia
+            current = db_service.get_item(self.table_name, {'user_id': user_id})
+            document = self._build_document(user_id, funds)
+            values = {
+                ":one": 1,
+                ":balance": document['balance'],
+                ":positions": document['positions'],
+                ":total_invested": document['total_invested']
+            }
+            if current:
+                condition = "version = :version"
+                values[":version"] = current['version']
+            else:
+                condition = "attribute_not_exists(user_id)"
+            try:
+                response = db_service.update_item(
+                    self.table_name,
+                    {'user_id': user_id},
+                    "ADD version :one SET balance = :balance, positions = :positions, total_invested = :total_invested",
+                    values,
+                    condition_expression=condition,
+                    return_values="ALL_NEW"
+                )
+                return response['Attributes']
+            except Exception as e:
+                if not is_conditional_check_failed(e):
+                    raise
+                logger.info(f"Portafolio de {user_id} cambió durante la reconstrucción, reintento")
+        raise RuntimeError(f"No pude reconstruir el portafolio de {user_id}: escrituras concurrentes")
+    
+    def rebuild_all(self, user_id: Optional[str] = None, page_size: int = 500) -> Dict[str, int]:
+        """Job por lotes: reconstruyo los documentos desde las tablas de usuarios y suscripciones"""
+        funds = {fund.fund_id: fund for fund in fund_service.get_all_funds()}
+        if user_id:
+            user_ids = [user_id]
+        else:
+            user_ids = (
+                user['user_id']
+                for page in db_service.scan_pages('users', page_size=page_size)
+                for user in page
+            )
+        
+        users = 0
+        positions = 0
+        for current_user_id in user_ids:
+            document = self.rebuild_user(current_user_id, funds)
+            users += 1
+            positions += len(document.get('positions', {}))
+        return {"users": users, "positions": positions}
+    
+    def get_summary(self, user_id: str) -> PortfolioSummaryResponse:
+        """Obtengo el portafolio con una sola lectura del documento materializado"""
+        document = db_service.get_item(self.table_name, {'user_id': user_id})
+        if document is None:
+            # Usuario sin documento todavía (anterior a la tabla o sin escrituras): lo creo al vuelo
+            document = self.rebuild_user(user_id)
+        
+        positions = sorted(
+            (PortfolioPosition(**position) for position in document.get('positions', {}).values()),
+            key=lambda position: position.subscribed_at
+        )
+        return PortfolioSummaryResponse(
+            user_id=user_id,
+            balance=float(document['balance']),
+            total_invested=float(document['total_invested']),
+            positions=positions,
+            version=int(document['version']),
+            updated_at=document.get('updated_at')
+        )
+    
+    def get_portfolio(self, user_id: str, transactions_limit: Optional[int] = None,
+                      notifications_limit: Optional[int] = None) -> PortfolioResponse:
+        """Armo la vista consolidada: documento materializado más la actividad reciente, en paralelo"""
+        futures = {
+            "summary": self._submit(self.get_summary, user_id),
+            "transactions": self._submit(
+                transaction_service.get_user_transactions_page, user_id,
+                limit=transactions_limit or settings.portfolio_recent_items
+            ),
+            "notifications": self._submit(
+                notification_service.get_user_notifications_page, user_id,
+                limit=notifications_limit or settings.portfolio_recent_items
+            )
+        }
+        results = self._collect(futures)
+        
+        transactions, _ = results.get("transactions", ([], None))
+        notifications, _ = results.get("notifications", ([], None))
+        return PortfolioResponse(
+            **results["summary"].model_dump(),
+            recent_transactions=transactions,
+            recent_notifications=notifications,
+            unavailable=[section for section in futures if section not in results]
+        )
+
+# Instancia global del servicio
+portfolio_service = PortfolioService()
@@ -0,0 +1,256 @@
+import hashlib
+import logging
+import math
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Iterator, Optional, Set, Tuple
+from src.services.database import db_service, is_conditional_check_failed
+from src.services.archive_service import archive_service
+from src.models.rollup import TransactionRollup, TransactionReportResponse
+from src.exceptions import BTGException
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+RollupKey = Tuple[str, str, str]
+
+# Partición única del índice del reporte: todos los agregados ordenados por día en una sola consulta
+REPORT_SCOPE = "all"
+
+# Usuarios distintos con un sketch HyperLogLog de 2^8 registros (error típico ~6,5 %);
+# el ítem queda acotado sin importar cuántos usuarios transaccionen en el día
+DISTINCT_PRECISION = 8
+DISTINCT_REGISTERS = 1 << DISTINCT_PRECISION
+
+def _rollup_key(fund_id: str, transaction_type: str) -> str:
+    """Armo la clave de ordenamiento fondo#tipo"""
+    return f"{fund_id}#{transaction_type}"
+
+def _day_key(day: str, fund_id: str, transaction_type: str) -> str:
+    """Armo la clave del índice del reporte: día#fondo#tipo, ordenada por fecha"""
+    return f"{day}#{fund_id}#{transaction_type}"
+
+def _register(user_id: str) -> Tuple[str, int]:
+    """Ubico al usuario en el sketch: registro (primeros bits del hash) y rango (ceros iniciales + 1)"""
+    hashed = int.from_bytes(hashlib.sha1(user_id.encode()).digest()[:8], "big")
+    index = hashed >> (64 - DISTINCT_PRECISION)
+    remainder_bits = 64 - DISTINCT_PRECISION
+    remainder = hashed & ((1 << remainder_bits) - 1)
+    return str(index), remainder_bits - remainder.bit_length() + 1
+
+def _merge_registers(target: Dict[str, int], registers: Dict[str, Any]) -> Dict[str, int]:
+    """Uno dos sketches quedándome con el máximo de cada registro"""
+    for index, rank in registers.items():
+        target[index] = max(target.get(index, 0), int(rank))
+    return target
+
+def _item_registers(item: Dict[str, Any]) -> Dict[str, int]:
+    """Obtengo el sketch del agregado; los anteriores al sketch guardaban el set de usuarios"""
+    registers = _merge_registers({}, item.get('registers', {}))
+    for user_id in item.get('user_ids', ()):
+        index, rank = _register(user_id)
+        registers[index] = max(registers.get(index, 0), rank)
+    return registers
+
+def _estimate_distinct(registers: Dict[str, int]) -> int:
+    """Estimo los usuarios distintos; con pocos usuarios uso conteo lineal, que es casi exacto"""
+    if not registers:
+        return 0
+    alpha = 0.7213 / (1 + 1.079 / DISTINCT_REGISTERS)
+    empty = DISTINCT_REGISTERS - len(registers)
+    harmonic = empty + sum(2.0 ** -rank for rank in registers.values())
+    estimate = alpha * DISTINCT_REGISTERS ** 2 / harmonic
+    if estimate <= 2.5 * DISTINCT_REGISTERS and empty:
+        estimate = DISTINCT_REGISTERS * math.log(DISTINCT_REGISTERS / empty)
+    return round(estimate)
+
+class RollupService:
+    def __init__(self):
+        self.table_name = 'rollups'
+        self.max_report_days = settings.rollup_max_report_days
+
+    def record_transaction(self, transaction: Dict[str, Any]) -> None:
+        """Actualizo incrementalmente el agregado diario de la transacción"""
+        day = transaction['created_at'][:10]
+        key = {
+            'day': day,
+            'rollup_key': _rollup_key(transaction['fund_id'], transaction['type'])
+        }
+        amount = transaction['amount']
+
+        # Conteo y suma se acumulan de forma atómica; el mapa del sketch se crea la primera vez
+        db_service.update_item(
+            self.table_name,
+            key,
+            "ADD #count :one, amount_sum :amount "
+            "SET fund_id = :fund_id, #type = :type, report_scope = :scope, day_key = :day_key, "
+            "registers = if_not_exists(registers, :empty)",
+            {
+                ":one": 1,
+                ":amount": amount,
+                ":fund_id": transaction['fund_id'],
+                ":type": transaction['type'],
+                ":scope": REPORT_SCOPE,
+                ":day_key": _day_key(day, transaction['fund_id'], transaction['type']),
+                ":empty": {}
+            },
+            {"#count": "count", "#type": "type"}
+        )
+
+        # Mínimo, máximo y el registro del sketch solo se escriben si mejoran el valor guardado
+        register, rank = _register(transaction['user_id'])
+        conditional_updates = (
+            ("min_amount", {}, amount, ">"),
+            ("max_amount", {}, amount, "<"),
+            ("registers.#register", {"#register": register}, rank, "<")
+        )
+        for attribute, names, value, operator in conditional_updates:
+            try:
+                db_service.update_item(
+                    self.table_name,
+                    key,
+                    f"SET {attribute} = :value",
+                    {":value": value},
+                    names or None,
+                    condition_expression=f"attribute_not_exists({attribute}) OR {attribute} {operator} :value"
+                )
+            except Exception as e:
+                if not is_conditional_check_failed(e):
+                    raise
+
+    def aggregate(self, transactions: Iterable[Dict[str, Any]],
+                  accumulators: Optional[Dict[RollupKey, Dict[str, Any]]] = None) -> Dict[RollupKey, Dict[str, Any]]:
+        """Agrego un lote de transacciones por (día, fondo, tipo)"""
+        accumulators = accumulators if accumulators is not None else {}
+        for transaction in transactions:
+            key = (transaction['created_at'][:10], transaction['fund_id'], transaction['type'])
+            amount = float(transaction['amount'])
+            register, rank = _register(transaction['user_id'])
+            accumulator = accumulators.get(key)
+            if accumulator is None:
+                accumulators[key] = {
+                    'count': 1,
+                    'amount_sum': amount,
+                    'min_amount': amount,
+                    'max_amount': amount,
+                    'registers': {register: rank}
+                }
+                continue
+            accumulator['count'] += 1
+            accumulator['amount_sum'] += amount
+            accumulator['min_amount'] = min(accumulator['min_amount'], amount)
+            accumulator['max_amount'] = max(accumulator['max_amount'], amount)
+            accumulator['registers'][register] = max(accumulator['registers'].get(register, 0), rank)
+        return accumulators
+
+    def backfill(self, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                 page_size: int = 1000) -> Dict[str, int]:
+        """Job por lotes: recalculo los agregados a partir de la tabla de transacciones y del histórico archivado"""
+        conditions = []
+        expression_values = {}
+        end = None
+        if date_from:
+            conditions.append("created_at >= :date_from")
+            expression_values[":date_from"] = date_from
+        if date_to:
+            # Incluyo el día completo de la fecha final
+            end = (date.fromisoformat(date_to[:10]) + timedelta(days=1)).isoformat()
+            conditions.append("created_at < :date_to")
+            expression_values[":date_to"] = end
+
+        # Cada día se reescribe completo: lo archivado ya no está en la tabla y debe sumarse también
+        accumulators: Dict[RollupKey, Dict[str, Any]] = {}
+        archived_ids: Set[str] = set()
+        self.aggregate(self._archived_transactions(date_from, end, archived_ids), accumulators)
+        transactions = len(archived_ids)
+        pages = db_service.scan_pages(
+            'transactions',
+            " AND ".join(conditions) or None,
+            expression_values or None,
+            page_size=page_size
+        )
+        for page in pages:
+            # Un archivado interrumpido puede dejar la fila en la tabla y en el archivo: la cuento una vez
+            page = [transaction for transaction in page if transaction['transaction_id'] not in archived_ids]
+            self.aggregate(page, accumulators)
+            transactions += len(page)
+
+        items = [
+            {
+                'day': day,
+                'rollup_key': _rollup_key(fund_id, transaction_type),
+                'fund_id': fund_id,
+                'type': transaction_type,
+                'report_scope': REPORT_SCOPE,
+                'day_key': _day_key(day, fund_id, transaction_type),
+                **accumulator
+            }
+            for (day, fund_id, transaction_type), accumulator in accumulators.items()
+        ]
+        db_service.batch_create_items(self.table_name, items)
+
+        return {"transactions": transactions, "archived": len(archived_ids), "rollups_written": len(items)}
+
+    def _archived_transactions(self, date_from: Optional[str], end: Optional[str],
+                               seen: Set[str]) -> Iterator[Dict[str, Any]]:
+        """Recorro las transacciones archivadas del rango [date_from, end) y anoto sus ids"""
+        for transaction in archive_service.read_archived('transactions', date_from, end):
+            if end and transaction['created_at'] >= end:
+                continue
+            if transaction['transaction_id'] in seen:
+                continue
+            seen.add(transaction['transaction_id'])
+            yield transaction
+
+    def _validate_range(self, date_from: str, date_to: str) -> None:
+        """Valido el rango solicitado"""
+        start = date.fromisoformat(date_from[:10])
+        end = date.fromisoformat(date_to[:10])
+        if end < start:
+            raise BTGException("La fecha final debe ser posterior a la inicial", 400)
+        if (end - start).days + 1 > self.max_report_days:
+            raise BTGException(f"El rango del reporte no puede superar {self.max_report_days} días", 400)
+
+    def get_report(self, date_from: str, date_to: str, fund_id: Optional[str] = None,
+                   transaction_type: Optional[str] = None) -> TransactionReportResponse:
+        """Genero el reporte de un rango de fechas leyendo solo los agregados diarios"""
+        self._validate_range(date_from, date_to)
+        rollups = []
+        registers: Dict[str, int] = {}
+
+        # Una sola consulta por rango sobre el índice ordenado por día ("~" ordena después de cualquier fondo)
+        pages = db_service.query_pages(
+            self.table_name,
+            "report_scope = :scope AND day_key BETWEEN :date_from AND :date_to",
+            {":scope": REPORT_SCOPE, ":date_from": date_from[:10], ":date_to": f"{date_to[:10]}~"},
+            index_name="report-index"
+        )
+        for page in pages:
+            for item in page:
+                if fund_id and item['fund_id'] != fund_id:
+                    continue
+                if transaction_type and item['type'] != transaction_type:
+                    continue
+                item_registers = _item_registers(item)
+                _merge_registers(registers, item_registers)
+                rollups.append(TransactionRollup(
+                    day=item['day'],
+                    fund_id=item['fund_id'],
+                    type=item['type'],
+                    count=item['count'],
+                    amount_sum=item['amount_sum'],
+                    min_amount=item.get('min_amount'),
+                    max_amount=item.get('max_amount'),
+                    distinct_users=_estimate_distinct(item_registers)
+                ))
+
+        return TransactionReportResponse(
+            date_from=date_from,
+            date_to=date_to,
+            rollups=rollups,
+            total_count=sum(rollup.count for rollup in rollups),
+            total_amount=sum(rollup.amount_sum for rollup in rollups),
+            distinct_users=_estimate_distinct(registers)
+        )
+
+# Instancia global del servicio
+rollup_service = RollupService()
@@ -0,0 +1,90 @@
+import functools
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional
+from src.config import settings
+from src.metrics import MetricFamily, metrics_registry
+
+class _Call:
+    """Llamada en curso: los que llegan después esperan su resultado"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight:
+    """Agrupo lecturas idénticas concurrentes en una sola llamada al backend"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, function: Callable[..., Any], *args, **kwargs) -> Any:
+        """Ejecuto la función, o espero la llamada en curso con la misma clave y comparto su resultado"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # Saco la llamada antes de avisar: quien llegue después hace una lectura nueva
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"calls": self.executed, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+# Grupos registrados por nombre, para exponer sus métricas
+single_flight_groups: Dict[str, SingleFlight] = {}
+
+def single_flight(name: str):
+    """Comparto el resultado entre llamadas concurrentes al método con los mismos argumentos"""
+    group = single_flight_groups.setdefault(name, SingleFlight(name))
+
+    def decorator(method: Callable):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not settings.single_flight_enabled:
+                return method(self, *args, **kwargs)
+            # Los argumentos pueden traer dicts (current_user): uso su repr como clave
+            key = repr((args, sorted(kwargs.items())))
+            return group.do(key, method, self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+def single_flight_stats() -> Dict[str, Dict[str, int]]:
+    """Obtengo llamadas ejecutadas y agrupadas por cada grupo"""
+    return {name: group.stats() for name, group in single_flight_groups.items()}
+
+def collect_single_flight_metrics() -> List[MetricFamily]:
+    """Lecturas ejecutadas y agrupadas por grupo para /metrics"""
+    stats = single_flight_stats()
+    return [
+        MetricFamily("single_flight_calls_total", "counter", "Lecturas ejecutadas contra el backend", ("group",),
+                     {(name,): group["calls"] for name, group in stats.items()}),
+        MetricFamily("single_flight_coalesced_total", "counter", "Lecturas que esperaron una llamada en curso",
+                     ("group",), {(name,): group["coalesced"] for name, group in stats.items()})
+    ]
+
+metrics_registry.register_collector(collect_single_flight_metrics)
@@ -1,15 +1,62 @@
-from typing import List, Optional, Dict, Any
-from src.services.database import db_service
+from typing import Callable, List, Optional, Dict, Any, Tuple
+from src.services.database import db_service, transaction_conditions_failed
+from src.services.portfolio_service import portfolio_service, TransactOperation
+from src.services.user_service import user_service
+from src.models.fund import FundResponse
 from src.models.subscription import Subscription, SubscriptionCreate, SubscriptionUpdate, SubscriptionResponse
-from src.exceptions import SubscriptionNotFoundException, DuplicateSubscriptionException, InsufficientBalanceException
-from src.utils import generate_id, get_current_timestamp
+from src.exceptions import SubscriptionNotFoundException, DuplicateSubscriptionException, InsufficientBalanceException, BalanceChangedException
+from src.utils import generate_id, get_current_timestamp, construct_many
+from src.cache import response_cache
 from boto3.dynamodb.conditions import Key
 
 class SubscriptionService:
     def __init__(self):
         self.table_name = 'subscriptions'
     
-    def create_subscription(self, subscription_data: SubscriptionCreate) -> SubscriptionResponse:
+    def _invalidate_cache(self, user_id: str) -> None:
+        """Descarto las respuestas cacheadas que incluyen las suscripciones del usuario"""
+        response_cache.invalidate(f"subscriptions:user:{user_id}", "subscriptions:all")
+    
+    def _write_with_portfolio(self, user_id: str, operation: TransactOperation,
+                              portfolio_change: Callable[[], TransactOperation],
+                              balance_change: Optional[TransactOperation] = None) -> None:
+        """Escribo la suscripción, el documento de portafolio y el saldo del usuario en la misma transacción"""
+        extra = [balance_change] if balance_change else []
+        try:
+            self._transact(user_id, [operation, portfolio_change()] + extra)
+        except Exception as e:
+            # Solo reintento si la condición que falló es la del portafolio (documento ausente o desfasado)
+            if transaction_conditions_failed(e) != [1]:
+                raise
+            portfolio_service.rebuild_user(user_id)
+            try:
+                self._transact(user_id, [operation, portfolio_change()] + extra)
+            except Exception as retry_error:
+                # Otra escritura del mismo usuario cambió el documento recién reconstruido: es un conflicto
+                if transaction_conditions_failed(retry_error) == [1]:
+                    raise BalanceChangedException(user_id) from retry_error
+                raise
+    
+    def _transact(self, user_id: str, operations: List[TransactOperation]) -> None:
+        """Ejecuto la transacción traduciendo un conflicto de saldo (operación 2) a BalanceChangedException"""
+        try:
+            db_service.transact_write(operations)
+        except Exception as e:
+            # El saldo cambió desde que lo leí: no reintento con un saldo viejo
+            if 2 in transaction_conditions_failed(e):
+                raise BalanceChangedException(user_id) from e
+            raise
+    
+    def _balance_change(self, user_id: str, balance_before: Optional[float],
+                        balance_after: Optional[float]) -> Optional[TransactOperation]:
+        """Armo la actualización del saldo solo si conozco el saldo leído y el nuevo"""
+        if balance_before is None or balance_after is None:
+            return None
+        return user_service.balance_change(user_id, balance_before, balance_after)
+    
+    def create_subscription(self, subscription_data: SubscriptionCreate, fund: Optional[FundResponse] = None,
+                            balance_after: Optional[float] = None,
+                            balance_before: Optional[float] = None) -> SubscriptionResponse:
         """Creo nueva suscripción"""
         # Creo suscripción
         subscription_id = generate_id("sub")
@@ -24,8 +71,14 @@ class SubscriptionService:
             'cancelled_at': None
         }
         
-        # Guardo en DynamoDB
-        db_service.create_item(self.table_name, subscription_item)
+        # Guardo en DynamoDB junto con la posición en el portafolio y el nuevo saldo del usuario
+        self._write_with_portfolio(
+            subscription_data.user_id,
+            ('Put', self.table_name, {'Item': subscription_item}),
+            lambda: portfolio_service.position_added(subscription_item, fund, balance_after),
+            self._balance_change(subscription_data.user_id, balance_before, balance_after)
+        )
+        self._invalidate_cache(subscription_data.user_id)
         
         return SubscriptionResponse(**subscription_item)
     
@@ -76,7 +129,7 @@ class SubscriptionService:
                 index_name="user_id-index"
             )
         
-        return [SubscriptionResponse(**sub) for sub in subscriptions]
+        return construct_many(SubscriptionResponse, subscriptions)
     
     def get_active_user_subscriptions(self, user_id: str, current_user: dict = None) -> List[SubscriptionResponse]:
         """Obtengo suscripciones activas - admin ve todas, cliente solo las suyas"""
@@ -89,37 +142,85 @@ class SubscriptionService:
                 {"#status": "status"}
             )
         else:
-            # Cliente ve solo las suyas activas
-            subscriptions = db_service.scan_items(
+            # Cliente ve solo las suyas activas: consulta por el índice en vez de escanear la tabla
+            subscriptions = db_service.query_items(
                 self.table_name,
-                "user_id = :user_id AND #status = :status",
+                "user_id = :user_id",
                 {
                     ":user_id": user_id,
                     ":status": "active"
                 },
-                {"#status": "status"}
+                index_name="user_id-index",
+                expression_attribute_names={"#status": "status"},
+                filter_expression="#status = :status"
             )
         
-        return [SubscriptionResponse(**sub) for sub in subscriptions]
+        return construct_many(SubscriptionResponse, subscriptions)
     
-    def cancel_subscription(self, subscription_id: str) -> SubscriptionResponse:
+    def get_user_subscriptions_page(self, user_id: str, current_user: dict = None, limit: int = 50,
+                                    exclusive_start_key: Optional[Dict[str, Any]] = None,
+                                    fields: Optional[List[str]] = None,
+                                    active_only: bool = True) -> Tuple[List[SubscriptionResponse], Optional[Dict[str, Any]]]:
+        """Obtengo una página de suscripciones - admin ve todas, cliente solo las suyas"""
+        status_filter = "#status = :status" if active_only else None
+        status_values = {":status": "active"} if active_only else {}
+        status_names = {"#status": "status"} if active_only else None
+        
+        if current_user and current_user.get("role") == "admin":
+            subscriptions, last_key = db_service.scan_page(
+                self.table_name,
+                status_filter,
+                status_values or None,
+                status_names,
+                limit=limit,
+                exclusive_start_key=exclusive_start_key,
+                projection=fields
+            )
+        else:
+            # Cliente: consulta por el índice user_id-index en vez de escanear la tabla
+            subscriptions, last_key = db_service.query_page(
+                self.table_name,
+                "user_id = :user_id",
+                {":user_id": user_id, **status_values},
+                index_name="user_id-index",
+                limit=limit,
+                exclusive_start_key=exclusive_start_key,
+                expression_attribute_names=status_names,
+                filter_expression=status_filter,
+                projection=fields
+            )
+        
+        return construct_many(SubscriptionResponse, subscriptions), last_key
+    
+    def cancel_subscription(self, subscription_id: str, balance_after: Optional[float] = None,
+                            balance_before: Optional[float] = None) -> SubscriptionResponse:
         """Cancelo suscripción"""
         subscription = self.get_subscription(subscription_id)
         
         if subscription.status == "cancelled":
             raise SubscriptionNotFoundException(f"Suscripción {subscription_id} ya está cancelada")
         
-        # Actualizo estado
-        db_service.update_item(
-            self.table_name,
-            {'subscription_id': subscription_id},
-            "SET #status = :status, cancelled_at = :cancelled_at",
-            {
-                ":status": "cancelled",
-                ":cancelled_at": get_current_timestamp()
-            },
-            {"#status": "status"}
+        # Actualizo estado, retiro la posición del portafolio y devuelvo el saldo en la misma transacción
+        current_time = get_current_timestamp()
+        self._write_with_portfolio(
+            subscription.user_id,
+            ('Update', self.table_name, {
+                'Key': {'subscription_id': subscription_id},
+                'UpdateExpression': "SET #status = :status, cancelled_at = :cancelled_at, updated_at = :updated_at",
+                # Una cancelación concurrente no debe devolver el monto dos veces
+                'ConditionExpression': "#status = :active",
+                'ExpressionAttributeNames': {"#status": "status"},
+                'ExpressionAttributeValues': {
+                    ":status": "cancelled",
+                    ":active": "active",
+                    ":cancelled_at": current_time,
+                    ":updated_at": current_time
+                }
+            }),
+            lambda: portfolio_service.position_removed(subscription, balance_after),
+            self._balance_change(subscription.user_id, balance_before, balance_after)
         )
+        self._invalidate_cache(subscription.user_id)
         
         # Retorno suscripción actualizada
         return self.get_subscription(subscription_id)
@@ -1,9 +1,26 @@
-from typing import List, Optional, Dict, Any
+import itertools
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Dict, Any, Iterator, Tuple
 from src.services.database import db_service
 from src.models.transaction import Transaction, TransactionCreate, TransactionResponse
-from src.exceptions import TransactionNotFoundException
-from src.utils import generate_id
+from src.exceptions import BTGException, TransactionNotFoundException
+from src.utils import generate_id, get_current_timestamp, construct_many
+from src.services.rollup_service import rollup_service
+from src.services.archive_service import archive_service, ARCHIVE_CURSOR_KEY
+from src.cache import response_cache
+from src.services.singleflight import single_flight
 from boto3.dynamodb.conditions import Key
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _validate_date(value: str, field: str) -> str:
+    """Valido un filtro de fecha (YYYY-MM-DD o ISO 8601); un formato inválido es un 400"""
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        raise BTGException(f"{field} debe tener formato YYYY-MM-DD o ISO 8601", 400)
+    return value
 
 class TransactionService:
     def __init__(self):
@@ -21,11 +38,18 @@ class TransactionService:
             'balance_before': transaction_data.balance_before,
             'balance_after': transaction_data.balance_after,
             'status': transaction_data.status.value,
-            'created_at': generate_id()
+            'created_at': get_current_timestamp()
         }
         
         # Guardar en DynamoDB
         db_service.create_item(self.table_name, transaction_item)
+        response_cache.invalidate(f"transactions:user:{transaction_data.user_id}", "transactions:all")
+        
+        # Actualizo los agregados diarios; un fallo aquí no invalida la transacción
+        try:
+            rollup_service.record_transaction(transaction_item)
+        except Exception as e:
+            logger.warning(f"No se pudo actualizar el agregado de {transaction_id}: {e}")
         
         return TransactionResponse(**transaction_item)
     
@@ -42,9 +66,12 @@ class TransactionService:
         
         return TransactionResponse(**transactions[0])
     
-    def get_user_transactions(self, user_id: str, current_user: dict = None) -> List[TransactionResponse]:
+    @single_flight("transactions.get_user_transactions")
+    def get_user_transactions(self, user_id: str, current_user: dict = None,
+                              include_archived: bool = False) -> List[TransactionResponse]:
         """Obtengo transacciones - admin ve todas, cliente solo las suyas"""
-        if current_user and current_user.get("role") == "admin":
+        is_admin = bool(current_user and current_user.get("role") == "admin")
+        if is_admin:
             # Admin ve todas las transacciones
             transactions = db_service.scan_items(self.table_name)
         else:
@@ -56,10 +83,60 @@ class TransactionService:
                 index_name="user_id-index"
             )
         
+        # El histórico archivado solo se lee cuando se pide explícitamente
+        if include_archived:
+            transactions.extend(archive_service.read_archived(
+                self.table_name,
+                user_id=None if is_admin else user_id
+            ))
+        
         # Ordenar por fecha de creación (más recientes primero)
         transactions.sort(key=lambda x: x['created_at'], reverse=True)
         
-        return [TransactionResponse(**txn) for txn in transactions]
+        return construct_many(TransactionResponse, transactions)
+    
+    @single_flight("transactions.get_user_transactions_page")
+    def get_user_transactions_page(self, user_id: str, current_user: dict = None, limit: int = 50,
+                                   exclusive_start_key: Optional[Dict[str, Any]] = None,
+                                   fields: Optional[List[str]] = None,
+                                   include_archived: bool = False) -> Tuple[List[TransactionResponse], Optional[Dict[str, Any]]]:
+        """Obtengo una página de transacciones (más recientes primero) y la clave para continuar"""
+        is_admin = bool(current_user and current_user.get("role") == "admin")
+        
+        # Agotada la tabla, el cursor sigue por el histórico archivado
+        if exclusive_start_key and ARCHIVE_CURSOR_KEY in exclusive_start_key:
+            transactions, next_key = archive_service.read_archived_page(
+                self.table_name,
+                exclusive_start_key,
+                limit,
+                user_id=None if is_admin else user_id
+            )
+            return construct_many(TransactionResponse, transactions), next_key
+        
+        if is_admin:
+            # Admin recorre la tabla completa; el orden es el del scan
+            transactions, last_key = db_service.scan_page(
+                self.table_name,
+                limit=limit,
+                exclusive_start_key=exclusive_start_key,
+                projection=fields
+            )
+        else:
+            # El índice por fecha entrega las más recientes primero sin ordenar en memoria
+            transactions, last_key = db_service.query_page(
+                self.table_name,
+                "user_id = :user_id",
+                {":user_id": user_id},
+                index_name="user_id-created_at-index",
+                scan_index_forward=False,
+                limit=limit,
+                exclusive_start_key=exclusive_start_key,
+                projection=fields
+            )
+        
+        if not last_key and include_archived:
+            last_key = {ARCHIVE_CURSOR_KEY: 0}
+        return construct_many(TransactionResponse, transactions), last_key
     
     def get_user_transactions_by_type(self, user_id: str, transaction_type: str) -> List[TransactionResponse]:
         """Obtener transacciones de un usuario por tipo"""
@@ -103,14 +180,111 @@ class TransactionService:
         
         return [TransactionResponse(**txn) for txn in transactions]
     
-    def get_all_transactions(self) -> List[TransactionResponse]:
+    def iter_transactions(self, fund_id: Optional[str] = None, transaction_type: Optional[str] = None,
+                          date_from: Optional[str] = None, date_to: Optional[str] = None,
+                          page_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """Recorro las transacciones página por página aplicando filtros opcionales"""
+        # No es un generador: las fechas se validan al llamar, antes de empezar un streaming
+        conditions = []
+        expression_values = {}
+        expression_names = {}
+        
+        if fund_id:
+            conditions.append("fund_id = :fund_id")
+            expression_values[":fund_id"] = fund_id
+        if transaction_type:
+            conditions.append("#type = :type")
+            expression_values[":type"] = transaction_type
+            expression_names["#type"] = "type"
+        if date_from:
+            conditions.append("created_at >= :date_from")
+            expression_values[":date_from"] = _validate_date(date_from, "date_from")
+        if date_to and len(_validate_date(date_to, "date_to")) == 10:
+            # Solo fecha: incluyo el día completo con un límite exclusivo al día siguiente (como el backfill)
+            conditions.append("created_at < :date_to")
+            expression_values[":date_to"] = (date.fromisoformat(date_to) + timedelta(days=1)).isoformat()
+        elif date_to:
+            conditions.append("created_at <= :date_to")
+            expression_values[":date_to"] = date_to
+        
+        pages = db_service.scan_pages(
+            self.table_name,
+            " AND ".join(conditions) or None,
+            expression_values or None,
+            expression_names or None,
+            page_size=page_size
+        )
+        return itertools.chain.from_iterable(pages)
+    
+    def iter_user_transactions_between(self, user_id: str, date_from: Optional[str] = None,
+                                       date_to: Optional[str] = None,
+                                       page_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """Recorro en orden cronológico las transacciones de un usuario dentro de un rango"""
+        key_condition = "user_id = :user_id"
+        expression_values = {":user_id": user_id}
+        
+        if date_from and date_to:
+            key_condition += " AND created_at BETWEEN :date_from AND :date_to"
+            expression_values[":date_from"] = date_from
+            expression_values[":date_to"] = date_to
+        elif date_from:
+            key_condition += " AND created_at >= :date_from"
+            expression_values[":date_from"] = date_from
+        elif date_to:
+            key_condition += " AND created_at <= :date_to"
+            expression_values[":date_to"] = date_to
+        
+        # Lo archivado es siempre anterior a lo que sigue en la tabla: va primero (el índice poda por rango y usuario)
+        archived = sorted(
+            archive_service.read_archived(self.table_name, date_from, date_to, user_id),
+            key=lambda transaction: (transaction['created_at'], transaction['transaction_id'])
+        )
+        yield from archived
+        archived_ids = {transaction['transaction_id'] for transaction in archived}
+        
+        # Uso el índice ordenado por fecha para no tener que ordenar en memoria
+        pages = db_service.query_pages(
+            self.table_name,
+            key_condition,
+            expression_values,
+            index_name="user_id-created_at-index",
+            page_size=page_size
+        )
+        for page in pages:
+            # Un archivado interrumpido puede dejar la fila en ambos lados
+            yield from (transaction for transaction in page if transaction['transaction_id'] not in archived_ids)
+    
+    def get_first_user_transaction_after(self, user_id: str, date_from: str) -> Optional[Dict[str, Any]]:
+        """Obtengo la primera transacción del usuario posterior a una fecha"""
+        transactions = db_service.query_items(
+            self.table_name,
+            "user_id = :user_id AND created_at > :date_from",
+            {":user_id": user_id, ":date_from": date_from},
+            index_name="user_id-created_at-index",
+            limit=1
+        )
+        # La siguiente puede estar ya archivada si la fecha es anterior al horizonte
+        archived = (
+            transaction
+            for transaction in archive_service.read_archived(self.table_name, date_from=date_from, user_id=user_id)
+            if transaction['created_at'] > date_from
+        )
+        return min(
+            itertools.chain(transactions, archived),
+            key=lambda transaction: (transaction['created_at'], transaction['transaction_id']),
+            default=None
+        )
+    
+    def get_all_transactions(self, include_archived: bool = False) -> List[TransactionResponse]:
         """Obtener todas las transacciones"""
         transactions = db_service.scan_items(self.table_name)
+        if include_archived:
+            transactions.extend(archive_service.read_archived(self.table_name))
         
         # Ordenar por fecha de creación (más recientes primero)
         transactions.sort(key=lambda x: x['created_at'], reverse=True)
         
-        return [TransactionResponse(**txn) for txn in transactions]
+        return construct_many(TransactionResponse, transactions)
 
 # Instancia global del servicio
 transaction_service = TransactionService()
\ No newline at end of file
@@ -1,9 +1,10 @@
-from typing import Optional, List
+from typing import Any, Dict, Optional, List, Tuple
 from src.services.database import db_service
 from src.models.user import UserCreate, UserUpdate, UserResponse, UserLogin, UserRole
 from src.exceptions import UserNotFoundException, InsufficientBalanceException, DuplicateUserException
-from src.utils import generate_id, get_current_timestamp, format_phone_number, validate_phone_number
+from src.utils import generate_id, get_current_timestamp, format_phone_number, validate_phone_number, construct_many
 from src.config import settings
+from src.services.singleflight import single_flight
 import hashlib
 
 class UserService:
@@ -77,8 +78,13 @@ class UserService:
         
         return UserResponse(**user_item)
     
+    @single_flight("users.get_user")
     def get_user(self, user_id: str) -> UserResponse:
         """Obtengo usuario por ID"""
+        return self._read_user(user_id)
+    
+    def _read_user(self, user_id: str) -> UserResponse:
+        """Leo el usuario sin compartir la lectura: después de escribir necesito ver mi propio cambio"""
         users = db_service.scan_items(
             self.table_name,
             "user_id = :user_id",
@@ -120,12 +126,40 @@ class UserService:
             print(f"❌ DEBUG: Error al actualizar balance: {e}")
             raise
         
-        return self.get_user(user_id)
+        return self._read_user(user_id)
+    
+    def balance_change(self, user_id: str, balance_before: float, balance_after: float) -> Tuple[str, str, Dict[str, Any]]:
+        """Armo la actualización del saldo para db_service.transact_write (va con la suscripción)"""
+        if balance_after < 0:
+            raise InsufficientBalanceException("El saldo no puede ser negativo")
+        
+        return ('Update', self.table_name, {
+            'Key': {'user_id': user_id},
+            'UpdateExpression': "SET balance = :balance, updated_at = :updated_at",
+            # Si otra operación movió el saldo después de leerlo, la transacción se cancela completa
+            'ConditionExpression': "balance = :balance_before",
+            'ExpressionAttributeValues': {
+                ":balance": balance_after,
+                ":balance_before": balance_before,
+                ":updated_at": get_current_timestamp()
+            }
+        })
     
     def get_all_users(self) -> List[UserResponse]:
         """Obtengo todos los usuarios"""
         users = db_service.scan_items(self.table_name)
-        return [UserResponse(**user) for user in users]
+        return construct_many(UserResponse, users)
+    
+    def get_users_page(self, limit: int, exclusive_start_key: Optional[Dict[str, Any]] = None,
+                       fields: Optional[List[str]] = None) -> Tuple[List[UserResponse], Optional[Dict[str, Any]]]:
+        """Obtengo una página de usuarios y la clave para continuar"""
+        users, last_key = db_service.scan_page(
+            self.table_name,
+            limit=limit,
+            exclusive_start_key=exclusive_start_key,
+            projection=fields
+        )
+        return construct_many(UserResponse, users), last_key
     
     def update_user(self, user_id: str, user_data: UserUpdate) -> UserResponse:
         """Actualizo usuario"""
@@ -151,7 +185,7 @@ class UserService:
             expression_values
         )
         
-        return self.get_user(user_id)
+        return self._read_user(user_id)
     
     def validate_balance(self, user_id: str, amount: float, fund_name: str) -> None:
         """Valido que el usuario tenga saldo suficiente"""
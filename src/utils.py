@@ -1,7 +1,12 @@
+import random
 import uuid
 from datetime import datetime
-from typing import Dict, Any
+from decimal import Decimal
+from typing import Dict, Any, Iterable, List, Type, TypeVar
 import json
+from pydantic import BaseModel
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
 
 def generate_id(prefix: str = "") -> str:
     """Genero un ID único con prefijo opcional"""
@@ -12,6 +17,25 @@ def get_current_timestamp() -> str:
     """Obtengo el timestamp actual en formato ISO"""
     return datetime.utcnow().isoformat()
 
+def json_default(value: Any) -> Any:
+    """Convierto los Decimal de DynamoDB a números al serializar JSON"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, set):
+        return sorted(value)
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+def construct_many(model: Type[ModelT], rows: Iterable[Dict[str, Any]]) -> List[ModelT]:
+    """Construyo modelos desde filas confiables (validadas al escribirlas) sin validarlas de nuevo"""
+    # Solo copio los campos del modelo: model_construct conserva los extras (p. ej. password_hash)
+    fields = tuple(model.model_fields)
+    return [model.model_construct(**{name: row[name] for name in fields if name in row}) for row in rows]
+
+def compute_backoff(attempt: int, base_seconds: float, max_seconds: float) -> float:
+    """Calculo la espera antes del reintento: backoff exponencial con jitter completo"""
+    ceiling = min(max_seconds, base_seconds * (2 ** max(attempt - 1, 0)))
+    return random.uniform(0, ceiling)
+
 def format_currency(amount: float) -> str:
     """Formateo el monto como moneda colombiana"""
     return f"COP ${amount:,.2f}"
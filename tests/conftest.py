@@ -68,3 +68,10 @@ def mock_jwt_auth():
             "role": "client"
         }
         yield mock_verify_token
+
+@pytest.fixture(autouse=True)
+def reset_rate_limits():
+    """Cada prueba empieza con los límites por usuario en cero"""
+    from src.rate_limit import rate_limit_store
+    rate_limit_store.clear()
+    yield
@@ -0,0 +1,198 @@
+"""
+Pruebas para la verificación de tokens, su caché y la revocación
+"""
+import threading
+import time
+import jwt
+import pytest
+from unittest.mock import patch
+from src.auth.jwt_handler import JWTHandler, jwt_handler
+from src.auth.revocation import RevocationList, InMemoryRevocationList, DynamoDBRevocationList, revocation_list
+from src.models.user import UserResponse, UserRole
+
+# conftest reemplaza verify_token en todas las pruebas; aquí necesito el real
+_verify_token = JWTHandler.verify_token
+
+def _user(user_id: str = "user_test_123", role: UserRole = UserRole.CLIENT) -> UserResponse:
+    return UserResponse(
+        user_id=user_id,
+        email=f"{user_id}@example.com",
+        phone="+573001234567",
+        balance=500000.0,
+        notification_preference="email",
+        role=role,
+        created_at="2025-01-01T00:00:00",
+        updated_at="2025-01-01T00:00:00"
+    )
+
+@pytest.fixture
+def real_verify():
+    with patch.object(JWTHandler, 'verify_token', _verify_token):
+        yield
+    revocation_list.clear()
+    jwt_handler.clear_cache()
+
+@pytest.fixture
+def handler(real_verify):
+    """Handler con caché pequeña y lista de revocación propia"""
+    return JWTHandler(revocations=InMemoryRevocationList(), cache_size=2)
+
+class TestVerifiedTokenCache:
+    """Pruebas para la caché de tokens verificados"""
+    
+    def test_repeated_token_skips_signature_check(self, handler):
+        """El mismo token solo se decodifica una vez"""
+        token = handler.create_access_token(_user())
+        
+        with patch('src.auth.jwt_handler.jwt.decode', wraps=jwt.decode) as decode:
+            first = handler.get_user_from_token(token)
+            second = handler.get_user_from_token(token)
+        
+        assert first == second == {"user_id": "user_test_123", "email": "user_test_123@example.com", "role": "client"}
+        assert decode.call_count == 1
+        assert handler.stats() == {"entries": 1, "hits": 1, "misses": 1}
+    
+    def test_cached_token_is_not_served_after_exp(self, handler):
+        """Pasado el exp la entrada se descarta y el token vuelve a verificarse (y falla)"""
+        token = handler.create_access_token(_user())
+        handler.verify_token(token)
+        
+        with patch('src.auth.jwt_handler.time.time', return_value=time.time() + 3600), \
+             patch('src.auth.jwt_handler.jwt.decode', side_effect=jwt.ExpiredSignatureError):
+            assert handler.verify_token(token) is None
+        
+        assert handler.stats()["entries"] == 0
+    
+    def test_cache_is_bounded(self, handler):
+        """Al superar el tamaño descarto el token menos usado"""
+        tokens = [handler.create_access_token(_user(f"user_{index}")) for index in range(3)]
+        for token in tokens:
+            handler.verify_token(token)
+        
+        with patch('src.auth.jwt_handler.jwt.decode', wraps=jwt.decode) as decode:
+            handler.verify_token(tokens[2])
+            handler.verify_token(tokens[0])
+        
+        assert handler.stats()["entries"] == 2
+        assert decode.call_count == 1
+    
+    def test_invalid_tokens_are_not_cached(self, handler):
+        """Un token con firma inválida no entra a la caché"""
+        forged = jwt.encode({"sub": "admin_1", "role": "admin", "exp": time.time() + 60}, "otra-clave")
+        
+        assert handler.verify_token(forged) is None
+        assert handler.stats()["entries"] == 0
+
+class TestRevocation:
+    """Pruebas para la lista de revocación"""
+    
+    def test_logout_revokes_cached_token(self, handler):
+        """Un token ya cacheado deja de servir apenas se revoca"""
+        token = handler.create_access_token(_user())
+        other = handler.create_access_token(_user())
+        handler.verify_token(token)
+        
+        assert handler.revoke_token(token) is True
+        
+        assert handler.verify_token(token) is None
+        assert handler.verify_token(other) is not None
+    
+    def test_revoke_user_only_affects_older_tokens(self, handler):
+        """Tras un cambio de rol los tokens viejos se rechazan y los nuevos no"""
+        old_token = handler.create_access_token(_user())
+        handler.verify_token(old_token)
+        
+        handler.revoke_user("user_test_123")
+        new_token = handler.create_access_token(_user(role=UserRole.ADMIN))
+        
+        assert handler.verify_token(old_token) is None
+        assert handler.verify_token(new_token)["role"] == "admin"
+    
+    def test_entries_are_dropped_once_they_cannot_match(self):
+        """La lista se mantiene compacta: solo guarda lo que puede afectar a un token vigente"""
+        now = [1000.0]
+        revocations = InMemoryRevocationList(token_lifetime_seconds=60, clock=lambda: now[0])
+        revocations.revoke_token("jti_1", expires_at=1030.0)
+        revocations.revoke_user("user_1", revoked_before=1000.0)
+        
+        assert revocations.is_revoked("jti_1", "user_2", 990.0)
+        assert revocations.is_revoked("jti_2", "user_1", 990.0)
+        
+        now[0] = 1100.0
+        revocations.revoke_token("jti_2", expires_at=1150.0)
+        
+        assert revocations._tokens == {"jti_2": 1150.0}
+        assert revocations._users == {}
+    
+    @patch('src.auth.revocation.db_service')
+    def test_shared_list_sees_revocations_from_other_instances(self, mock_db_service):
+        """Con DynamoDB cada instancia recarga lo que revocaron las demás"""
+        mock_db_service.scan_pages.return_value = iter([[
+            {"revocation_key": "token#jti_1", "expires_at": int(time.time()) + 60},
+            {"revocation_key": "user#user_1", "revoked_before": time.time(), "expires_at": int(time.time()) + 1800}
+        ]])
+        revocations = DynamoDBRevocationList(refresh_seconds=30)
+        revocations.refresh()
+        
+        assert revocations.is_revoked("jti_1", "user_2", time.time())
+        assert revocations.is_revoked("jti_2", "user_1", time.time() - 10)
+        assert not revocations.is_revoked("jti_2", "user_2", time.time())
+        # Dentro del intervalo de recarga uso la copia local
+        mock_db_service.scan_pages.assert_called_once_with("revocations")
+
+    @patch('src.auth.revocation.db_service')
+    def test_stale_list_refreshes_without_blocking(self, mock_db_service):
+        """La recarga corre en otro hilo; mientras tanto respondo con la última copia"""
+        release = threading.Event()
+        
+        def slow_scan(table_name):
+            release.wait(5)
+            yield [{"revocation_key": "token#jti_remote", "expires_at": int(time.time()) + 60}]
+        
+        mock_db_service.scan_pages.side_effect = slow_scan
+        revocations = DynamoDBRevocationList(refresh_seconds=0)
+        revocations.revoke_token("jti_local", time.time() + 60)
+        
+        started = time.monotonic()
+        assert revocations.is_revoked("jti_local", "user_1", time.time())
+        assert not revocations.is_revoked("jti_remote", "user_1", time.time())
+        assert time.monotonic() - started < 1
+        
+        # Una sola recarga en curso aunque lleguen más peticiones
+        assert revocations.refresh_in_background() is None
+        release.set()
+        revocations._refresh_lock.acquire(timeout=5)
+        revocations._refresh_lock.release()
+        
+        assert revocations.is_revoked("jti_remote", "user_1", time.time())
+        assert revocations.is_revoked("jti_local", "user_1", time.time())
+        assert mock_db_service.scan_pages.call_count >= 1
+    
+    def test_revocation_list_is_abstract(self):
+        """Cada almacén implementa las tres operaciones"""
+        with pytest.raises(TypeError):
+            RevocationList()
+
+class TestLogoutEndpoints:
+    """Pruebas para POST /auth/logout y la revocación por administrador"""
+    
+    @patch('src.api.routes.portfolio_service')
+    def test_logout_rejects_token_immediately(self, mock_portfolio_service, client, real_verify):
+        """Después del logout el mismo token responde 401"""
+        headers = {"Authorization": f"Bearer {jwt_handler.create_access_token(_user())}"}
+        
+        assert client.post("/api/v1/auth/logout", headers=headers).status_code == 204
+        
+        response = client.get("/api/v1/users/user_test_123/portfolio/summary", headers=headers)
+        assert response.status_code == 401
+        mock_portfolio_service.get_summary.assert_not_called()
+    
+    def test_admin_revokes_user_sessions(self, client, real_verify):
+        """El administrador invalida las sesiones de un usuario (p. ej. al cambiarle el rol)"""
+        admin_headers = {"Authorization": f"Bearer {jwt_handler.create_access_token(_user('admin_1', UserRole.ADMIN))}"}
+        user_headers = {"Authorization": f"Bearer {jwt_handler.create_access_token(_user())}"}
+        
+        response = client.post("/api/v1/admin/users/user_test_123/sessions/revoke", headers=admin_headers)
+        
+        assert response.status_code == 200
+        assert client.post("/api/v1/auth/logout", headers=user_headers).status_code == 401
@@ -0,0 +1,87 @@
+"""
+Pruebas para el endpoint de lotes
+"""
+import asyncio
+import threading
+from unittest.mock import patch
+from src.api.batch import call_asgi
+from src.exceptions import FundNotFoundException
+
+class TestBatchEndpoint:
+    """Pruebas para POST /api/v1/batch"""
+    
+    @patch('src.api.routes.transaction_service')
+    @patch('src.api.routes.fund_service')
+    def test_runs_sub_requests_with_one_authentication(self, mock_fund_service, mock_transaction_service,
+                                                        client, auth_headers, mock_fund, mock_jwt_auth):
+        """Cada sub-petición trae su estado y cuerpo; el JWT se verifica una sola vez"""
+        mock_fund_service.get_funds_page.return_value = ([mock_fund], None)
+        mock_fund_service.get_fund.side_effect = FundNotFoundException("NO_EXISTE")
+        mock_transaction_service.get_user_transactions_page.return_value = ([], None)
+        
+        response = client.post("/api/v1/batch", headers=auth_headers, json={"requests": [
+            {"id": "funds", "path": "/api/v1/funds?fields=fund_id"},
+            {"id": "missing", "path": "/api/v1/funds/NO_EXISTE"},
+            {"id": "history", "path": "/api/v1/transactions/user/user_test_123?limit=5"}
+        ]})
+        
+        assert response.status_code == 200
+        responses = response.json()["responses"]
+        assert [item["id"] for item in responses] == ["funds", "missing", "history"]
+        assert responses[0] == {"id": "funds", "status": 200, "body": {
+            "items": [{"fund_id": "FPV_BTG_PACTUAL_RECAUDADORA"}], "next_cursor": None
+        }}
+        assert responses[1]["status"] == 404
+        assert responses[2]["status"] == 200
+        assert mock_transaction_service.get_user_transactions_page.call_args.args[2] == 5
+        assert mock_jwt_auth.call_count == 1
+    
+    @patch('src.api.routes.fund_service')
+    def test_sub_requests_run_concurrently_on_the_request_loop(self, mock_fund_service, client, auth_headers, mock_fund):
+        """Las partes bloqueantes se solapan en el threadpool y las sub-peticiones comparten el loop del lote"""
+        barrier = threading.Barrier(3, timeout=5)
+        loops = []
+        
+        def get_fund(fund_id):
+            # La barrera solo se abre si las tres llamadas bloqueantes corren a la vez
+            barrier.wait()
+            return mock_fund
+        mock_fund_service.get_fund.side_effect = get_fund
+        
+        async def recording_call_asgi(*args, **kwargs):
+            loops.append(asyncio.get_running_loop())
+            return await call_asgi(*args, **kwargs)
+        
+        with patch('src.api.batch.call_asgi', side_effect=recording_call_asgi):
+            response = client.post("/api/v1/batch", headers=auth_headers, json={"requests": [
+                {"path": f"/api/v1/funds/FONDO_{i}"} for i in range(3)
+            ]})
+        
+        assert [item["status"] for item in response.json()["responses"]] == [200, 200, 200]
+        assert len(loops) == 3 and len(set(loops)) == 1
+    
+    def test_invalid_batches(self, client, auth_headers):
+        """No se aceptan lotes anidados, rutas fuera de la API o en streaming, ni lotes demasiado grandes"""
+        nested = client.post("/api/v1/batch", headers=auth_headers, json={"requests": [{"path": "/api/v1/batch"}]})
+        outside = client.post("/api/v1/batch", headers=auth_headers, json={"requests": [{"path": "/health"}]})
+        too_many = client.post("/api/v1/batch", headers=auth_headers, json={"requests": [
+            {"path": "/api/v1/funds"} for _ in range(11)
+        ]})
+        stream = client.post("/api/v1/batch", headers=auth_headers, json={"requests": [
+            {"path": "/api/v1/notifications/user/user_test_123/stream"}
+        ]})
+        export = client.post("/api/v1/batch", headers=auth_headers, json={"requests": [
+            {"path": "/api/v1/admin/transactions/export?format=csv"}
+        ]})
+        
+        assert nested.status_code == 422
+        assert stream.status_code == 422
+        assert export.status_code == 422
+        assert outside.status_code == 422
+        assert too_many.status_code == 422
+    
+    def test_requires_authentication(self, client):
+        """Sin token no se ejecuta ninguna sub-petición"""
+        response = client.post("/api/v1/batch", json={"requests": [{"path": "/api/v1/funds"}]})
+        
+        assert response.status_code == 403
@@ -0,0 +1,106 @@
+"""
+Pruebas para la compresión negociada de respuestas
+"""
+import gzip
+from unittest.mock import patch
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+from src.api.middleware import CompressionMiddleware, negotiate_encoding
+
+def build_app(**options) -> FastAPI:
+    """App mínima con una respuesta completa y un stream"""
+    app = FastAPI()
+
+    @app.get("/large")
+    async def large():
+        return PlainTextResponse("fondo " * 1000)
+
+    @app.get("/stream")
+    async def stream():
+        async def rows():
+            for i in range(50):
+                yield f'{{"row": {i}}}\n'
+        return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+    app.add_middleware(CompressionMiddleware, **options)
+    return app
+
+class TestCompression:
+    """Pruebas para CompressionMiddleware"""
+    
+    def test_negotiate_encoding(self):
+        """Respeto los pesos q y solo ofrezco br si brotli está instalado"""
+        assert negotiate_encoding(None) is None
+        assert negotiate_encoding("identity") is None
+        assert negotiate_encoding("gzip;q=0") is None
+        assert negotiate_encoding("deflate, gzip;q=0.5") == "gzip"
+        with patch('src.api.middleware.brotli', None):
+            assert negotiate_encoding("br, gzip;q=0.1") == "gzip"
+    
+    def test_large_response_is_gzipped(self):
+        """Las respuestas sobre el umbral salen comprimidas con su Content-Length real"""
+        client = TestClient(build_app(minimum_size=500))
+        
+        response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+        
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert int(response.headers["content-length"]) < 6000
+        assert response.text == "fondo " * 1000
+    
+    def test_below_threshold_is_not_compressed(self):
+        """Por debajo del umbral la compresión no compensa"""
+        client = TestClient(build_app(minimum_size=10000))
+        
+        response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+        
+        assert "content-encoding" not in response.headers
+        assert response.headers["content-length"] == "6000"
+        assert response.headers["vary"] == "Accept-Encoding"
+    
+    def test_uncompressed_response_without_accept_encoding_varies(self):
+        """Sin Accept-Encoding salgo sin comprimir pero aviso a las cachés que la respuesta depende de él"""
+        client = TestClient(build_app(minimum_size=500))
+        # httpx manda Accept-Encoding por defecto
+        del client.headers["accept-encoding"]
+        
+        response = client.get("/large")
+        
+        assert "accept-encoding" not in response.request.headers
+        assert "content-encoding" not in response.headers
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.text == "fondo " * 1000
+    
+    def test_stream_is_compressed_per_chunk(self):
+        """Los streams se comprimen fragmento a fragmento sin Content-Length"""
+        client = TestClient(build_app(minimum_size=500))
+        
+        with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+            raw = b"".join(response.iter_raw())
+        
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        assert gzip.decompress(raw).decode().splitlines()[-1] == '{"row": 49}'
+    
+    def test_route_rule_disables_compression(self):
+        """Una regla negativa por prefijo deja la ruta sin comprimir"""
+        client = TestClient(build_app(minimum_size=500, route_rules={"/large": -1}))
+        
+        response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+        
+        assert "content-encoding" not in response.headers
+        assert "vary" not in response.headers
+    
+    @patch('src.api.routes.fund_service')
+    def test_api_list_is_compressed_with_its_own_etag(self, mock_fund_service, client, mock_fund):
+        """En la API el ETag se calcula sobre el cuerpo comprimido: cada codificación tiene el suyo"""
+        mock_fund_service.get_funds_page.return_value = ([mock_fund] * 50, None)
+        
+        compressed = client.get("/api/v1/funds", headers={"Accept-Encoding": "gzip"})
+        plain = client.get("/api/v1/funds", headers={"Accept-Encoding": "identity"})
+        
+        assert compressed.headers["content-encoding"] == "gzip"
+        assert "content-encoding" not in plain.headers
+        assert compressed.json() == plain.json()
+        assert compressed.headers["etag"] != plain.headers["etag"]
@@ -46,11 +46,11 @@ class TestFundEndpoints:
         response = client.get("/api/v1/funds")
         
         assert response.status_code == 200
-        assert isinstance(response.json(), list)
+        assert isinstance(response.json()["items"], list)
     
     def test_get_active_funds(self, client):
         """Obtengo fondos activos"""
         response = client.get("/api/v1/funds/active")
         
         assert response.status_code == 200
-        assert isinstance(response.json(), list)
+        assert isinstance(response.json()["items"], list)
@@ -0,0 +1,93 @@
+"""
+Pruebas para ETag/304 y la caché de respuestas
+"""
+import pytest
+from unittest.mock import patch
+from src.cache import ResponseCache, response_cache
+
+class TestConditionalGet:
+    """Pruebas para ConditionalGetMiddleware"""
+    
+    def test_etag_and_not_modified(self, client):
+        """La segunda lectura con If-None-Match responde 304 sin cuerpo"""
+        response = client.get("/health")
+        etag = response.headers["etag"]
+        
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == "private, no-cache"
+        
+        cached = client.get("/health", headers={"If-None-Match": f'W/{etag}, "otro"'})
+        assert cached.status_code == 304
+        assert cached.content == b""
+        assert cached.headers["etag"] == etag
+    
+    def test_changed_body_gets_new_etag(self, client):
+        """Un ETag viejo no coincide cuando cambia la respuesta"""
+        response = client.get("/health", headers={"If-None-Match": '"desactualizado"'})
+        
+        assert response.status_code == 200
+        assert response.json()["status"] == "healthy"
+    
+    @patch('src.api.routes.fund_service')
+    def test_cache_control_per_route(self, mock_fund_service, client):
+        """El catálogo de fondos se puede reutilizar unos segundos"""
+        mock_fund_service.get_funds_page.return_value = ([], None)
+        
+        response = client.get("/api/v1/funds")
+        
+        assert response.headers["cache-control"] == "private, max-age=60"
+    
+    def test_writes_are_not_touched(self, client):
+        """Las escrituras no llevan ETag"""
+        response = client.post("/api/v1/auth/login", json={"email": "x@example.com", "password": "x"})
+        
+        assert "etag" not in response.headers
+
+class TestResponseCache:
+    """Pruebas para ResponseCache y cached_response"""
+    
+    def test_invalidate_by_tag(self):
+        """Invalidar una etiqueta solo borra sus entradas"""
+        cache = ResponseCache(max_entries=10, ttl_seconds=60)
+        cache.set("a", 1, ["subscriptions:user:1"])
+        cache.set("b", 2, ["subscriptions:user:2"])
+        
+        assert cache.invalidate("subscriptions:user:1") == 1
+        assert cache.get("a") == (False, None)
+        assert cache.get("b") == (True, 2)
+    
+    def test_ttl_and_max_entries(self):
+        """Las entradas vencen y las menos usadas salen al llenarse"""
+        cache = ResponseCache(max_entries=2, ttl_seconds=0)
+        cache.set("a", 1)
+        assert cache.get("a") == (False, None)
+        
+        cache = ResponseCache(max_entries=2, ttl_seconds=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") == (False, None)
+        assert cache.get("a") == (True, 1)
+    
+    @patch('src.services.subscription_service.db_service')
+    @patch('src.api.routes.subscription_service.get_user_subscriptions_page')
+    def test_cached_endpoint_is_invalidated_by_writes(self, mock_get_subscriptions, mock_db_service,
+                                                      client, auth_headers):
+        """La lectura se sirve de caché hasta que una escritura del usuario la invalida"""
+        from src.services.subscription_service import subscription_service
+        from src.models.subscription import SubscriptionCreate
+        mock_get_subscriptions.return_value = ([], None)
+        response_cache.clear()
+        
+        with patch('src.cache.settings.response_cache_enabled', True):
+            client.get("/api/v1/subscriptions/user/user_test_123", headers=auth_headers)
+            client.get("/api/v1/subscriptions/user/user_test_123", headers=auth_headers)
+            assert mock_get_subscriptions.call_count == 1
+            
+            subscription_service.create_subscription(
+                SubscriptionCreate(user_id="user_test_123", fund_id="DEUDAPRIVADA", amount=50000)
+            )
+            client.get("/api/v1/subscriptions/user/user_test_123", headers=auth_headers)
+            assert mock_get_subscriptions.call_count == 2
+        response_cache.clear()
@@ -0,0 +1,126 @@
+"""
+Pruebas para el ledger de saldos con checkpoints
+"""
+import pytest
+from unittest.mock import Mock, patch
+from src.services.ledger_service import ledger_service
+
+def _transaction(transaction_id, created_at, type_, amount, before, after):
+    return {
+        "transaction_id": transaction_id,
+        "user_id": "user_test_123",
+        "type": type_,
+        "fund_id": "FDO-ACCIONES",
+        "amount": amount,
+        "balance_before": before,
+        "balance_after": after,
+        "status": "completed",
+        "created_at": created_at
+    }
+
+class TestLedgerService:
+    """Pruebas para LedgerService"""
+    
+    @patch('src.services.ledger_service.transaction_service')
+    @patch('src.services.ledger_service.db_service')
+    def test_get_balance_at_from_checkpoint(self, mock_db_service, mock_transaction_service):
+        """Calculo el saldo con el checkpoint más la cola de transacciones"""
+        mock_db_service.query_items.return_value = [{
+            "user_id": "user_test_123",
+            "checkpoint_at": "2025-01-01T00:00:00",
+            "balance": 400000,
+            "transaction_id": "txn_1",
+            "transaction_count": 1,
+            "created_at": "2025-01-01T00:00:00"
+        }]
+        mock_transaction_service.iter_user_transactions_between.return_value = iter([
+            _transaction("txn_1", "2025-01-01T00:00:00", "subscription", 100000, 500000, 400000),
+            _transaction("txn_2", "2025-01-02T00:00:00", "cancellation", 100000, 400000, 500000)
+        ])
+        
+        result = ledger_service.get_balance_at("user_test_123", "2025-01-03T00:00:00")
+        
+        assert result.balance == 500000
+        assert result.checkpoint_at == "2025-01-01T00:00:00"
+        assert result.tail_transactions == 1
+        assert result.verified is True
+        mock_transaction_service.iter_user_transactions_between.assert_called_once_with(
+            "user_test_123", date_from="2025-01-01T00:00:00", date_to="2025-01-03T00:00:00"
+        )
+    
+    @patch('src.services.ledger_service.transaction_service')
+    @patch('src.services.ledger_service.db_service')
+    def test_get_balance_at_detects_mismatch(self, mock_db_service, mock_transaction_service):
+        """Marco el saldo como no verificado si los saldos guardados no cuadran"""
+        mock_db_service.query_items.return_value = []
+        mock_transaction_service.iter_user_transactions_between.return_value = iter([
+            _transaction("txn_1", "2025-01-01T00:00:00", "subscription", 100000, 500000, 400000),
+            _transaction("txn_2", "2025-01-02T00:00:00", "subscription", 50000, 300000, 250000)
+        ])
+        
+        result = ledger_service.get_balance_at("user_test_123", "2025-01-03T00:00:00")
+        
+        assert result.balance == 350000
+        assert result.verified is False
+    
+    @patch('src.services.ledger_service.transaction_service')
+    @patch('src.services.ledger_service.db_service')
+    def test_build_user_checkpoints(self, mock_db_service, mock_transaction_service):
+        """Guardo un checkpoint cada intervalo de transacciones"""
+        mock_db_service.query_items.return_value = []
+        balance = 500000
+        transactions = []
+        for i in range(5):
+            transactions.append(_transaction(f"txn_{i}", f"2025-01-0{i + 1}T00:00:00", "subscription", 10000, balance, balance - 10000))
+            balance -= 10000
+        mock_transaction_service.iter_user_transactions_between.return_value = iter(transactions)
+        
+        with patch.object(ledger_service, 'checkpoint_interval', 2):
+            result = ledger_service.build_user_checkpoints("user_test_123")
+        
+        assert result == {"checkpoints_written": 2, "mismatches": 0}
+        last_checkpoint = mock_db_service.create_item.call_args[0][1]
+        assert last_checkpoint["transaction_id"] == "txn_3"
+        assert last_checkpoint["balance"] == 460000
+        assert last_checkpoint["transaction_count"] == 4
+    
+    @patch('src.services.ledger_service.transaction_service')
+    @patch('src.services.ledger_service.db_service')
+    def test_checkpoint_boundary_with_same_timestamp(self, mock_db_service, mock_transaction_service):
+        """Con la misma fecha que el checkpoint solo cuento las de id mayor, llegue el índice en el orden que llegue"""
+        mock_db_service.query_items.return_value = [{
+            "user_id": "user_test_123",
+            "checkpoint_at": "2025-01-01T00:00:00",
+            "balance": 400000,
+            "transaction_id": "txn_b",
+            "transaction_count": 2,
+            "created_at": "2025-01-01T00:00:00"
+        }]
+        mock_transaction_service.iter_user_transactions_between.return_value = iter([
+            _transaction("txn_c", "2025-01-01T00:00:00", "subscription", 50000, 400000, 350000),
+            _transaction("txn_a", "2025-01-01T00:00:00", "subscription", 50000, 500000, 450000),
+            _transaction("txn_b", "2025-01-01T00:00:00", "subscription", 50000, 450000, 400000)
+        ])
+        
+        result = ledger_service.get_balance_at("user_test_123", "2025-01-02T00:00:00")
+        
+        assert result.tail_transactions == 1
+        assert result.balance == 350000
+        assert result.verified is True
+
+class TestLedgerEndpoints:
+    """Pruebas de acceso a los endpoints del ledger"""
+    
+    @patch('src.api.routes.ledger_service')
+    def test_client_cannot_read_another_users_ledger(self, mock_ledger_service, client, auth_headers):
+        """Un cliente solo ve su propio saldo y extracto"""
+        balance = client.get("/api/v1/ledger/user/otro_usuario/balance", headers=auth_headers)
+        statement = client.get(
+            "/api/v1/ledger/user/otro_usuario/statement?date_from=2025-01-01&date_to=2025-01-31",
+            headers=auth_headers
+        )
+        
+        assert balance.status_code == 403
+        assert statement.status_code == 403
+        mock_ledger_service.get_balance_at.assert_not_called()
+        mock_ledger_service.get_statement.assert_not_called()
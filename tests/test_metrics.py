@@ -0,0 +1,162 @@
+"""
+Pruebas para las métricas en formato Prometheus
+"""
+import json
+import os
+import pytest
+from unittest.mock import patch
+from src.metrics import MetricFamily, MetricsRegistry, metrics_registry, observe_db
+from src.services.notification_service import notification_service
+
+def _sample(text: str, line_prefix: str) -> float:
+    """Obtengo el valor de la primera línea de la exposición que empieza con el prefijo"""
+    for line in text.splitlines():
+        if line.startswith(line_prefix):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"No encontré {line_prefix}")
+
+class TestMetricsRegistry:
+    """Pruebas para el registro y el formato de exposición"""
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Los buckets son acumulados, el límite es inclusivo y _count suma todo"""
+        registry = MetricsRegistry(multiproc_dir="")
+        histogram = registry.histogram("latency_seconds", "Latencia", ("route",), buckets=(0.1, 1.0))
+        histogram.observe(0.1, "/a")
+        histogram.observe(0.5, "/a")
+        histogram.observe(3.0, "/a")
+    
+        text = registry.render()
+    
+        assert "# TYPE latency_seconds histogram" in text
+        assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+        assert 'latency_seconds_bucket{route="/a",le="1"} 2' in text
+        assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+        assert 'latency_seconds_count{route="/a"} 3' in text
+        assert _sample(text, 'latency_seconds_sum{route="/a"}') == pytest.approx(3.6)
+
+    def test_label_values_are_escaped(self):
+        """Comillas, barras y saltos de línea no rompen el formato"""
+        registry = MetricsRegistry(multiproc_dir="")
+        registry.counter("errors_total", "Errores", ("message",)).inc('dijo "hola"\\\n')
+    
+        assert 'errors_total{message="dijo \\"hola\\"\\\\\\n"} 1' in registry.render()
+
+    def test_broken_collector_does_not_break_scrape(self):
+        """Si un colector falla el resto de las métricas se expone igual"""
+        registry = MetricsRegistry(multiproc_dir="")
+        registry.counter("requests_total", "Peticiones").inc()
+    
+        def broken():
+            raise RuntimeError("DynamoDB caído")
+        registry.register_collector(broken, per_process=False)
+    
+        assert "requests_total 1" in registry.render()
+
+class TestMultiprocess:
+    """Pruebas para la suma de métricas entre workers"""
+
+    def _write_snapshot(self, directory, pid: int, families):
+        with open(os.path.join(directory, f"metrics-{pid}.json"), "w", encoding="utf-8") as handle:
+            json.dump({"pid": pid, "families": families}, handle)
+
+    def test_counters_and_histograms_are_summed(self, tmp_path):
+        """Los contadores e histogramas de otro worker se suman a los propios"""
+        registry = MetricsRegistry(multiproc_dir=str(tmp_path))
+        registry.counter("requests_total", "Peticiones", ("route",)).inc("/a")
+        registry.histogram("latency_seconds", "Latencia", (), buckets=(1.0,)).observe(0.5)
+        self._write_snapshot(tmp_path, 999999999, [
+            {"name": "requests_total", "type": "counter", "help": "Peticiones", "labelnames": ["route"],
+             "buckets": [], "samples": [[["/a"], 2], [["/b"], 5]]},
+            {"name": "latency_seconds", "type": "histogram", "help": "Latencia", "labelnames": [],
+             "buckets": [1.0], "samples": [[[], [0, 1, 2.0]]]}
+        ])
+    
+        text = registry.render()
+    
+        assert 'requests_total{route="/a"} 3' in text
+        assert 'requests_total{route="/b"} 5' in text
+        assert 'latency_seconds_bucket{le="1"} 1' in text
+        assert 'latency_seconds_bucket{le="+Inf"} 2' in text
+        assert _sample(text, "latency_seconds_sum") == pytest.approx(2.5)
+
+    def test_gauges_of_dead_workers_are_dropped(self, tmp_path):
+        """Un gauge solo cuenta mientras su worker siga vivo"""
+        registry = MetricsRegistry(multiproc_dir=str(tmp_path))
+        registry.register_collector(lambda: [MetricFamily("queue_depth", "gauge", "Cola", (), {(): 1})])
+        gauge = {"name": "queue_depth", "type": "gauge", "help": "Cola", "labelnames": [], "buckets": [],
+                 "samples": [[[], 4]]}
+        self._write_snapshot(tmp_path, os.getppid(), [gauge])
+        self._write_snapshot(tmp_path, 999999999, [gauge])
+    
+        assert "queue_depth 5" in registry.render()
+
+    def test_flush_writes_snapshot_readable_by_other_workers(self, tmp_path):
+        """El volcado de un worker lo lee el que atiende /metrics"""
+        registry = MetricsRegistry(multiproc_dir=str(tmp_path))
+        registry.counter("requests_total", "Peticiones").inc(amount=7)
+        registry.flush()
+        # Simulo que el volcado es de otro worker que sigue vivo
+        os.replace(tmp_path / f"metrics-{os.getpid()}.json", tmp_path / f"metrics-{os.getppid()}.json")
+    
+        other = MetricsRegistry(multiproc_dir=str(tmp_path))
+        other.counter("requests_total", "Peticiones").inc()
+    
+        assert "requests_total 8" in other.render()
+
+class TestDynamoDBMetrics:
+    """Pruebas para la instrumentación de db_service"""
+
+    def test_observe_db_records_items_and_errors(self):
+        """Registro elementos devueltos y errores por operación y tabla"""
+        class FakeDB:
+            @observe_db("query", count_items=len)
+            def query_items(self, table_name, fail=False):
+                if fail:
+                    raise RuntimeError("throttled")
+                return [{"id": 1}, {"id": 2}]
+    
+        FakeDB().query_items("metrics_test")
+        with pytest.raises(RuntimeError):
+            FakeDB().query_items("metrics_test", fail=True)
+    
+        text = metrics_registry.render()
+        assert _sample(text, 'dynamodb_items_total{operation="query",table="metrics_test"}') == 2
+        assert _sample(text, 'dynamodb_errors_total{operation="query",table="metrics_test"}') == 1
+        assert _sample(text, 'dynamodb_operation_duration_seconds_count{operation="query",table="metrics_test"}') == 2
+
+class TestMetricsEndpoint:
+    """Pruebas para GET /metrics y el registro por ruta"""
+
+    @patch('src.services.notification_service.db_service')
+    @patch('src.services.fund_service.db_service')
+    def test_requests_are_labelled_by_route_template(self, mock_db_service, mock_notification_db, client, mock_fund):
+        """La ruta se registra con su plantilla, no con el id concreto"""
+        mock_db_service.get_item.return_value = mock_fund.model_dump()
+        mock_notification_db.count_items.return_value = 0
+    
+        client.get("/api/v1/funds/FPV_BTG_PACTUAL_RECAUDADORA")
+        client.get("/ruta/que/no/existe")
+        text = client.get("/metrics").text
+    
+        assert 'route="/api/v1/funds/{fund_id}",status="200"' in text
+        assert 'route="unmatched",status="404"' in text
+        assert "FPV_BTG_PACTUAL_RECAUDADORA" not in text
+
+    @patch('src.services.notification_service.db_service')
+    def test_metrics_endpoint_exposes_queue_depth(self, mock_db_service, client):
+        """La profundidad de la cola se consulta con COUNT y se cachea entre scrapes"""
+        notification_service._queue_depth = None
+        mock_db_service.count_items.return_value = 3
+    
+        response = client.get("/metrics")
+        client.get("/metrics")
+    
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert 'notification_queue_depth{status="pending"} 3' in response.text
+        assert "cache_hits_total" in response.text
+        assert "single_flight_calls_total" in response.text
+        # Una consulta por estado en el primer scrape; el segundo usa la caché
+        assert mock_db_service.count_items.call_count == 4
+        notification_service._queue_depth = None
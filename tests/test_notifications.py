@@ -1,6 +1,7 @@
 """
 Pruebas para módulo de notificaciones
 """
+import time
 import pytest
 from unittest.mock import Mock, patch
 from fastapi.testclient import TestClient
@@ -49,6 +50,398 @@ class TestNotificationService:
         
         assert len(result) == 1
         assert result[0].user_id == "user_test_123"
+    
+    @patch('src.services.notification_service.db_service')
+    def test_create_pending_notification_enters_queue_index(self, mock_db_service):
+        """Las notificaciones pendientes llevan el atributo del índice disperso"""
+        from src.models.notification import NotificationCreate, NotificationType, NotificationChannel
+        notification_data = NotificationCreate(
+            user_id="user_test_123",
+            type=NotificationType.SUBSCRIPTION_CONFIRMATION,
+            channel=NotificationChannel.SMS,
+            content="Test notification"
+        )
+        
+        notification_service.create_notification(notification_data)
+        
+        item = mock_db_service.create_item.call_args[0][1]
+        assert item["queue_status"] == "pending"
+        assert "claimed_at" not in item
+    
+    @patch('src.services.notification_service.db_service')
+    def test_create_claimed_notification(self, mock_db_service):
+        """La que se encola en proceso nace reclamada y drain_pending no la toma"""
+        from src.models.notification import NotificationCreate, NotificationType, NotificationChannel, NotificationStatus
+        notification_data = NotificationCreate(
+            user_id="user_test_123",
+            type=NotificationType.SUBSCRIPTION_CONFIRMATION,
+            channel=NotificationChannel.SMS,
+            content="Test notification",
+            status=NotificationStatus.PROCESSING
+        )
+        
+        notification_service.create_notification(notification_data)
+        
+        item = mock_db_service.create_item.call_args[0][1]
+        assert item["queue_status"] == "processing"
+        assert item["claimed_at"] == item["created_at"]
+    
+    @patch('src.services.notification_service.db_service')
+    def test_get_pending_notifications_paginates_index(self, mock_db_service):
+        """Consulto pendientes por el índice, página por página y más antiguas primero"""
+        def notification(i):
+            return {
+                "notification_id": f"notif_{i}",
+                "user_id": "user_test_123",
+                "type": "subscription_confirmation",
+                "channel": "email",
+                "content": "Test notification",
+                "status": "pending",
+                "queue_status": "pending",
+                "created_at": f"2025-01-01T00:00:0{i}",
+                "sent_at": None
+            }
+        mock_db_service.query_page.side_effect = [
+            ([notification(1), notification(2)], {"notification_id": "notif_2"}),
+            ([notification(3)], None)
+        ]
+        
+        result = notification_service.get_pending_notifications()
+        
+        assert [notif.notification_id for notif in result] == ["notif_1", "notif_2", "notif_3"]
+        first_call = mock_db_service.query_page.call_args_list[0]
+        assert first_call[0][1] == "queue_status = :status"
+        assert first_call[1]["index_name"] == "queue_status-created_at-index"
+        assert mock_db_service.query_page.call_args_list[1][1]["exclusive_start_key"] == {"notification_id": "notif_2"}
+        mock_db_service.scan_items.assert_not_called()
+
+class TestNotificationTemplates:
+    """Pruebas para las plantillas precompiladas de notificaciones"""
+    
+    def test_render_formats_amount(self):
+        """Renderizo asunto y cuerpo con el monto formateado"""
+        from src.notifications.templates import template_registry
+        
+        template_id = template_registry.resolve("subscription_confirmation", "email")
+        rendered = template_registry.render(template_id, {"fund_name": "FPV_BTG_PACTUAL_RECAUDADORA", "amount": 75000.0})
+        
+        assert template_id == "subscription_confirmation.email.es"
+        assert rendered.subject == "BTG Pactual - Confirmación de suscripción"
+        assert "COP $75,000" in rendered.body
+    
+    def test_unknown_locale_falls_back_to_default(self):
+        """Un idioma sin plantillas usa el idioma por defecto"""
+        from src.notifications.templates import template_registry
+        
+        assert template_registry.resolve("cancellation_confirmation", "sms", "pt") == "cancellation_confirmation.sms.es"
+        assert template_registry.resolve("cancellation_confirmation", "sms", "en") == "cancellation_confirmation.sms.en"
+    
+    def test_sms_length_is_enforced(self):
+        """Rechazo plantillas SMS demasiado largas y recorto los mensajes que se pasan"""
+        from src.notifications.templates import TemplateRegistry, TemplateError, SMS_MAX_LENGTH
+        
+        registry = TemplateRegistry()
+        with pytest.raises(TemplateError):
+            registry.register("subscription_confirmation", "sms", "es", "x" * (SMS_MAX_LENGTH + 1))
+        
+        registry.register("subscription_confirmation", "sms", "es", "Fondo ${fund_name}")
+        rendered = registry.render("subscription_confirmation.sms.es", {"fund_name": "F" * 300})
+        assert len(rendered.body) == SMS_MAX_LENGTH
+    
+    def test_render_many_renders_repeated_pairs_once(self):
+        """En un lote, los pares plantilla-parámetros repetidos se renderizan una vez"""
+        from src.notifications.templates import TemplateRegistry
+        
+        registry = TemplateRegistry.default()
+        params = {"fund_name": "FDO-ACCIONES", "amount": 250000}
+        with patch.object(registry, 'render', wraps=registry.render) as render:
+            results = registry.render_many([("subscription_confirmation.sms.es", params)] * 50)
+        
+        assert len(results) == 50
+        assert render.call_count == 1
+    
+    @patch('src.services.notification_service.db_service')
+    def test_templated_row_stores_params_and_renders_on_read(self, mock_db_service):
+        """La fila guarda id + parámetros y la respuesta de la API trae el texto"""
+        from src.models.notification import NotificationCreate, NotificationType, NotificationChannel
+        notification_data = NotificationCreate(
+            user_id="user_test_123",
+            type=NotificationType.SUBSCRIPTION_CONFIRMATION,
+            channel=NotificationChannel.SMS,
+            template_id="subscription_confirmation.sms.es",
+            params={"fund_name": "DEUDAPRIVADA", "amount": 50000}
+        )
+        
+        notification_service.create_notification(notification_data)
+        item = mock_db_service.create_item.call_args[0][1]
+        assert "content" not in item
+        assert item["params"] == {"fund_name": "DEUDAPRIVADA", "amount": 50000}
+        
+        mock_db_service.get_item.return_value = item
+        result = notification_service.get_notification(item["notification_id"])
+        assert "DEUDAPRIVADA" in result.content
+
+class TestNotificationEvents:
+    """Pruebas para el stream SSE de notificaciones"""
+    
+    def _collect(self, broker, user_id, last_event_id=None, publish=None, count=1):
+        """Leo `count` eventos del stream publicando desde otro hilo"""
+        import asyncio
+        import threading
+        
+        async def run():
+            frames = []
+            stream = broker.stream(user_id, last_event_id, keepalive_seconds=5)
+            frames.append(await stream.__anext__())  # retry
+            if publish:
+                threading.Thread(target=publish).start()
+            while len([f for f in frames if f.startswith(("id:", "event:"))]) < count:
+                frames.append(await asyncio.wait_for(stream.__anext__(), timeout=5))
+            await stream.aclose()
+            return frames
+        
+        return asyncio.run(run())
+    
+    def test_live_events_from_another_thread(self):
+        """Los eventos publicados desde un worker llegan a la conexión del usuario"""
+        from src.notifications.events import NotificationEventBroker
+        broker = NotificationEventBroker(buffer_size=10, first_id=1)
+        
+        frames = self._collect(broker, "user_1", publish=lambda: (
+            broker.publish("user_2", "notification.created", {"notification_id": "otro"}),
+            broker.publish("user_1", "notification.updated", {"notification_id": "notif_1", "status": "sent"})
+        ))
+        
+        assert frames[-1].startswith("id: 2\nevent: notification.updated\n")
+        assert '"status": "sent"' in frames[-1]
+        assert broker.subscriber_count() == 0
+    
+    def test_resume_with_last_event_id(self):
+        """Con Last-Event-ID reenvío lo que el cliente no alcanzó a recibir"""
+        from src.notifications.events import NotificationEventBroker
+        broker = NotificationEventBroker(buffer_size=10, first_id=1)
+        for i in range(3):
+            broker.publish("user_1", "notification.created", {"notification_id": f"notif_{i}"})
+        
+        frames = self._collect(broker, "user_1", last_event_id=1, count=2)
+        
+        assert [frame.split("\n")[0] for frame in frames[1:]] == ["id: 2", "id: 3"]
+    
+    def test_resync_when_buffer_was_overrun(self):
+        """Si el buffer ya no cubre el Last-Event-ID pido al cliente que vuelva a consultar"""
+        from src.notifications.events import NotificationEventBroker
+        broker = NotificationEventBroker(buffer_size=2, first_id=1)
+        for i in range(5):
+            broker.publish("user_1", "notification.created", {"notification_id": f"notif_{i}"})
+        
+        frames = self._collect(broker, "user_1", last_event_id=1, count=3)
+        
+        assert frames[1].startswith("event: resync")
+    
+    def test_resync_when_last_event_id_is_from_another_process(self):
+        """Un Last-Event-ID que este proceso no emitió (reinicio u otra instancia) también pide resync"""
+        from src.notifications.events import NotificationEventBroker
+        previous = NotificationEventBroker(buffer_size=10)
+        stale_id = previous.publish("user_1", "notification.created", {"notification_id": "notif_0"}).event_id
+        time.sleep(0.001)
+        restarted = NotificationEventBroker(buffer_size=10)
+        restarted.publish("user_1", "notification.created", {"notification_id": "notif_1"})
+        
+        assert restarted.replay("user_1", stale_id)[1] is False
+        assert restarted.replay("user_1", stale_id + 10_000_000_000)[1] is False
+        
+        frames = self._collect(restarted, "user_1", last_event_id=stale_id, count=2)
+        assert frames[1].startswith("event: resync")
+    
+    @patch('src.services.notification_service.notification_events')
+    @patch('src.services.notification_service.db_service')
+    def test_service_publishes_creations(self, mock_db_service, mock_events):
+        """Crear una notificación la publica en el stream de su usuario"""
+        from src.models.notification import NotificationCreate, NotificationType, NotificationChannel
+        notification_service.create_notification(NotificationCreate(
+            user_id="user_test_123",
+            type=NotificationType.SUBSCRIPTION_CONFIRMATION,
+            channel=NotificationChannel.EMAIL,
+            content="Test notification"
+        ))
+        
+        user_id, event, data = mock_events.publish.call_args[0]
+        assert (user_id, event) == ("user_test_123", "notification.created")
+        assert data["content"] == "Test notification"
+    
+    def test_stream_of_another_user_is_forbidden(self, client, auth_headers):
+        """Un cliente no puede suscribirse a las notificaciones de otro"""
+        response = client.get("/api/v1/notifications/user/otro_usuario/stream", headers=auth_headers)
+        
+        assert response.status_code == 403
+
+class TestNotificationTransitions:
+    """Pruebas para las transiciones de estado por clave"""
+    
+    def _notification(self, notification_id="notif_1", status="sent"):
+        return {
+            "notification_id": notification_id,
+            "user_id": "user_test_123",
+            "type": "subscription_confirmation",
+            "channel": "email",
+            "content": "Test notification",
+            "status": status,
+            "created_at": "2025-01-01T00:00:00",
+            "sent_at": "2025-01-01T00:00:01"
+        }
+    
+    @patch('src.services.notification_service.db_service')
+    def test_mark_sent_is_conditional_and_returns_new_row(self, mock_db_service):
+        """Actualizo por la clave real, condicionado a processing, sin escanear la tabla"""
+        mock_db_service.update_item.return_value = {"Attributes": self._notification()}
+        
+        result = notification_service.mark_notification_sent("notif_1")
+        
+        assert result.status == "sent"
+        args, kwargs = mock_db_service.update_item.call_args
+        assert args[1] == {"notification_id": "notif_1"}
+        assert args[3][":expected"] == "processing"
+        assert kwargs["condition_expression"] == "#status = :expected"
+        assert kwargs["return_values"] == "ALL_NEW"
+        mock_db_service.scan_items.assert_not_called()
+    
+    @patch('src.services.notification_service.db_service')
+    def test_mark_sent_rejects_wrong_state(self, mock_db_service):
+        """Si ya no está pendiente la transición se rechaza"""
+        from botocore.exceptions import ClientError
+        from src.exceptions import InvalidNotificationTransitionException
+        mock_db_service.update_item.side_effect = ClientError(
+            {"Error": {"Code": "ConditionalCheckFailedException", "Message": "condición"}}, "UpdateItem"
+        )
+        mock_db_service.get_item.return_value = self._notification()
+        
+        with pytest.raises(InvalidNotificationTransitionException):
+            notification_service.mark_notification_sent("notif_1")
+    
+    @patch('src.services.notification_service.db_service')
+    def test_mark_many_transitions_concurrently(self, mock_db_service):
+        """Marco cientos de notificaciones y reporto las que no se pudieron transicionar"""
+        def update_item(table_name, key, *args, **kwargs):
+            if key["notification_id"] == "notif_7":
+                raise RuntimeError("throttled")
+            return {"Attributes": self._notification(key["notification_id"])}
+        mock_db_service.update_item.side_effect = update_item
+        notification_ids = [f"notif_{i}" for i in range(300)]
+        
+        results = notification_service.mark_many(notification_ids, "sent")
+        
+        assert list(results) == notification_ids
+        assert results["notif_7"] is None
+        assert results["notif_8"].notification_id == "notif_8"
+        assert mock_db_service.update_item.call_count == 300
+
+class TestNotificationRetries:
+    """Pruebas para los reintentos con backoff y el dead-letter"""
+    
+    def _notification(self, status="pending", attempts=0):
+        return {
+            "notification_id": "notif_1",
+            "user_id": "user_test_123",
+            "type": "subscription_confirmation",
+            "channel": "email",
+            "content": "Test notification",
+            "status": status,
+            "queue_status": status,
+            "created_at": "2025-01-01T00:00:00",
+            "sent_at": None,
+            "attempts": attempts
+        }
+    
+    def test_backoff_grows_and_is_capped(self):
+        """El techo del jitter crece exponencialmente hasta el máximo"""
+        from src.utils import compute_backoff
+        with patch('src.utils.random.uniform', side_effect=lambda low, high: high):
+            assert compute_backoff(1, 30, 3600) == 30
+            assert compute_backoff(3, 30, 3600) == 120
+            assert compute_backoff(20, 30, 3600) == 3600
+    
+    @patch('src.services.notification_service.db_service')
+    def test_failure_schedules_next_attempt(self, mock_db_service):
+        """Un fallo suma un intento y programa el siguiente en el índice de reintentos"""
+        mock_db_service.get_item.return_value = self._notification(attempts=1)
+        mock_db_service.update_item.return_value = {"Attributes": self._notification("failed", 2)}
+        
+        notification_service.mark_notification_failed("notif_1", "timeout")
+        
+        update_args = mock_db_service.update_item.call_args[0]
+        assert "next_attempt_at = :next_attempt_at" in update_args[2]
+        assert update_args[3][":status"] == "failed"
+        assert update_args[3][":attempts"] == 2
+        assert update_args[3][":next_attempt_at"] > "2025-01-01T00:00:00"
+        # Condicionado a los intentos leídos: dos fallos concurrentes no cuentan como uno
+        assert update_args[3][":previous_attempts"] == 1
+        assert mock_db_service.update_item.call_args.kwargs["condition_expression"].endswith(
+            "AND attempts = :previous_attempts"
+        )
+    
+    @patch('src.services.notification_service.db_service')
+    def test_exhausted_notification_moves_to_dead_letter(self, mock_db_service):
+        """Al agotar los intentos la notificación sale de los reintentos"""
+        from src.config import settings
+        mock_db_service.get_item.return_value = self._notification(attempts=settings.notification_max_attempts - 1)
+        mock_db_service.update_item.return_value = {"Attributes": self._notification("dead_letter")}
+        
+        notification_service.mark_notification_failed("notif_1", "timeout")
+        
+        update_args = mock_db_service.update_item.call_args[0]
+        assert update_args[2].startswith("REMOVE next_attempt_at")
+        assert update_args[3][":status"] == "dead_letter"
+    
+    @patch('src.services.notification_service.db_service')
+    def test_concurrent_failure_does_not_reuse_stale_attempts(self, mock_db_service):
+        """Si otro fallo ya sumó el intento, la transición se rechaza en vez de pisarlo"""
+        from botocore.exceptions import ClientError
+        from src.exceptions import InvalidNotificationTransitionException
+        mock_db_service.get_item.return_value = self._notification(attempts=1)
+        mock_db_service.update_item.side_effect = ClientError(
+            {"Error": {"Code": "ConditionalCheckFailedException", "Message": "condición"}}, "UpdateItem"
+        )
+        
+        with pytest.raises(InvalidNotificationTransitionException):
+            notification_service.mark_notification_failed("notif_1", "timeout")
+    
+    @patch('src.notifications.retry_scheduler.notification_service')
+    def test_scheduler_requeues_due_batch(self, mock_notification_service):
+        """Reencolo solo las que gano con la transición condicional"""
+        from src.notifications.retry_scheduler import RetryScheduler
+        from src.models.notification import NotificationResponse
+        
+        due = [NotificationResponse(**{**self._notification("failed", 1), "notification_id": f"notif_{i}"})
+               for i in range(3)]
+        mock_notification_service.get_due_retries.return_value = due
+        mock_notification_service.requeue_notification.side_effect = [True, False, True]
+        manager = Mock()
+        manager.enqueue_claimed.return_value = True
+        
+        requeued = RetryScheduler(manager, batch_size=10).run_once("2025-01-02T00:00:00")
+        
+        assert requeued == 2
+        mock_notification_service.get_due_retries.assert_called_once_with("2025-01-02T00:00:00", 10)
+        # Las reclamo (failed → processing) antes de encolarlas
+        mock_notification_service.requeue_notification.assert_any_call("notif_0", "failed", claim=True)
+        assert manager.enqueue_claimed.call_count == 2
+    
+    @patch('src.api.routes.retry_scheduler')
+    @patch('src.auth.jwt_handler.JWTHandler.verify_token')
+    def test_requeue_dead_letter_endpoint(self, mock_verify_token, mock_retry_scheduler, client, auth_headers):
+        """El admin reencola las notificaciones en dead_letter"""
+        mock_verify_token.return_value = {"sub": "admin_1", "email": "admin@example.com", "role": "admin"}
+        mock_retry_scheduler.requeue_dead_letters.return_value = ["notif_1"]
+        
+        response = client.post(
+            "/api/v1/admin/notifications/dead-letter/requeue",
+            json={"notification_ids": ["notif_1"]},
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 200
+        assert response.json() == {"requeued": 1, "notification_ids": ["notif_1"]}
+        mock_retry_scheduler.requeue_dead_letters.assert_called_once_with(["notif_1"], 100)
 
 class TestNotificationEndpoints:
     """Pruebas para endpoints de notificaciones"""
@@ -63,15 +456,401 @@ class TestNotificationEndpoints:
             "email": "test@example.com",
             "role": "client"
         }
-        mock_notification_service.get_user_notifications.return_value = []
+        mock_notification_service.get_user_notifications_page.return_value = ([], None)
         
         response = client.get("/api/v1/notifications/user/user_test_123", headers=auth_headers)
         
         assert response.status_code == 200
-        assert isinstance(response.json(), list)
+        assert response.json() == {"items": [], "next_cursor": None}
     
     def test_get_user_notifications_unauthorized(self, client):
         """Error cuando no hay autorización"""
         response = client.get("/api/v1/notifications/user/user_test_123")
         
         assert response.status_code == 403
+
+class TestNotificationManager:
+    """Pruebas para el despachador asíncrono de notificaciones"""
+    
+    def _job(self, channel="email", recipient="test@example.com"):
+        from src.notifications.notification_manager import NotificationJob
+        return NotificationJob(
+            notification_id="notif_1",
+            user_id="user_test_123",
+            type="subscription_confirmation",
+            channel=channel,
+            content="Su suscripción ha sido exitosa",
+            recipient=recipient
+        )
+    
+    @patch('src.notifications.notification_manager.notification_service')
+    def test_dispatch_through_loopback(self, mock_notification_service):
+        """Entrego la notificación en segundo plano y la marco como enviada"""
+        from src.notifications.notification_manager import NotificationManager
+        from src.notifications.email_service import EmailService
+        from src.notifications.base import LoopbackBackend
+        
+        backend = LoopbackBackend()
+        manager = NotificationManager(max_workers=2, queue_size=10)
+        manager.register_channel("email", EmailService(backend, window_seconds=0))
+        
+        assert manager.enqueue(self._job()) is True
+        manager.wait_idle()
+        manager.stop()
+        
+        message = backend.messages()[0]
+        assert message.recipient == "test@example.com"
+        assert message.subject == "BTG Pactual - Confirmación de suscripción"
+        mock_notification_service.mark_many.assert_any_call(["notif_1"], "sent")
+        assert manager.stats()["sent"] == 1
+    
+    @patch('src.notifications.notification_manager.notification_service')
+    def test_dispatch_renders_templates_at_send_time(self, mock_notification_service):
+        """El despachador renderiza la plantilla justo antes de entregar"""
+        from src.notifications.notification_manager import NotificationManager, NotificationJob
+        from src.notifications.sms_service import SMSService
+        from src.notifications.base import LoopbackBackend
+        
+        backend = LoopbackBackend()
+        manager = NotificationManager(max_workers=1, queue_size=10)
+        manager.register_channel("sms", SMSService(backend, window_seconds=0))
+        
+        manager.enqueue(NotificationJob(
+            notification_id="notif_1",
+            user_id="user_test_123",
+            type="cancellation_confirmation",
+            channel="sms",
+            recipient="+573001234567",
+            template_id="cancellation_confirmation.sms.es",
+            params={"fund_name": "FDO-ACCIONES", "amount": 250000}
+        ))
+        manager.wait_idle()
+        manager.stop()
+        
+        body = backend.messages()[0].body
+        assert "FDO-ACCIONES" in body and "COP $250,000" in body
+    
+    @patch('src.notifications.notification_manager.notification_service')
+    def test_dispatch_failure_marks_failed(self, mock_notification_service):
+        """Marco la notificación como fallida si el proveedor la rechaza"""
+        from src.notifications.notification_manager import NotificationManager
+        from src.notifications.sms_service import SMSService
+        
+        failing_backend = Mock()
+        failing_backend.send_bulk.side_effect = RuntimeError("proveedor caído")
+        manager = NotificationManager(max_workers=1, queue_size=10)
+        manager.register_channel("sms", SMSService(failing_backend, window_seconds=0))
+        
+        manager.enqueue(self._job(channel="sms", recipient="+573001234567"))
+        manager.wait_idle()
+        manager.stop()
+        
+        mock_notification_service.mark_many.assert_any_call(["notif_1"], "failed", {"notif_1": "proveedor caído"})
+        assert manager.stats()["failed"] == 1
+    
+    @patch('src.notifications.notification_manager.notification_service')
+    def test_drain_pending_claims_before_enqueueing(self, mock_notification_service):
+        """Solo encolo las pendientes que logro pasar a processing; las demás ya las tomó otro"""
+        from src.notifications.notification_manager import NotificationManager
+        from src.models.notification import NotificationResponse
+        from src.exceptions import InvalidNotificationTransitionException
+        
+        pending = [
+            NotificationResponse(notification_id=f"notif_{i}", user_id="user_test_123", type="subscription_confirmation",
+                                 channel="email", status="pending", content="Hola", created_at="2025-01-01T00:00:00")
+            for i in range(2)
+        ]
+        mock_notification_service.iter_queue.side_effect = lambda status, page_size: iter([pending] if status == "pending" else [])
+        mock_notification_service.claim_notification.side_effect = [
+            pending[0].model_copy(update={"status": "processing"}),
+            InvalidNotificationTransitionException("notif_1", "pending")
+        ]
+        manager = NotificationManager(max_workers=1, queue_size=10)
+        
+        with patch.object(manager, 'enqueue', return_value=True) as enqueue:
+            assert manager.drain_pending() == 1
+        
+        assert [call.args[0].notification_id for call in enqueue.call_args_list] == ["notif_0"]
+        assert mock_notification_service.claim_notification.call_count == 2
+    
+    @patch('src.notifications.notification_manager.notification_service')
+    def test_stale_claims_return_to_pending(self, mock_notification_service):
+        """Una notificación que quedó en processing por un proceso caído vuelve a pending"""
+        from src.notifications.notification_manager import NotificationManager
+        from src.models.notification import NotificationResponse
+        
+        def processing(notification_id, claimed_at):
+            return NotificationResponse(notification_id=notification_id, user_id="user_test_123",
+                                        type="subscription_confirmation", channel="email", status="processing",
+                                        content="Hola", created_at="2025-01-01T00:00:00", claimed_at=claimed_at)
+        
+        mock_notification_service.iter_queue.return_value = iter([[
+            processing("notif_old", "2025-01-01T00:00:00"),
+            processing("notif_recent", "2999-01-01T00:00:00")
+        ]])
+        mock_notification_service.requeue_notification.return_value = True
+        
+        assert NotificationManager(max_workers=1, queue_size=10).release_stale_claims() == 1
+        mock_notification_service.requeue_notification.assert_called_once_with("notif_old", "processing")
+    
+    def test_drain_pending_does_not_resend_held_digest(self):
+        """Mientras el resumen retiene una notificación ya encolada, drain_pending no la vuelve a enviar"""
+        from src.notifications.notification_manager import NotificationManager
+        from src.notifications.digest import DigestCoalescer
+        from src.notifications.sms_service import SMSService
+        from src.notifications.base import LoopbackBackend
+        from src.models.notification import NotificationResponse
+        from src.exceptions import InvalidNotificationTransitionException
+        
+        class Table:
+            """Tabla de notificaciones con las transiciones condicionales"""
+            def __init__(self):
+                self.rows = {}
+            
+            def create(self, status):
+                row = NotificationResponse(notification_id="notif_1", user_id="user_test_123",
+                                           type="subscription_confirmation", channel="sms", status=status,
+                                           content="Hola", created_at="2025-01-01T00:00:00")
+                self.rows[row.notification_id] = row
+                return row
+            
+            def iter_queue(self, status, page_size=100):
+                rows = [row for row in self.rows.values() if row.status == status]
+                return iter([rows] if rows else [])
+            
+            def claim_notification(self, notification_id):
+                if self.rows[notification_id].status != "pending":
+                    raise InvalidNotificationTransitionException(notification_id, "pending")
+                self.rows[notification_id] = self.rows[notification_id].model_copy(update={"status": "processing"})
+                return self.rows[notification_id]
+            
+            def requeue_notification(self, notification_id, expected_status, reset_attempts=False, claim=False):
+                return False
+            
+            def mark_many(self, notification_ids, status, errors=None):
+                for notification_id in notification_ids:
+                    assert self.rows[notification_id].status == "processing"
+                    self.rows[notification_id] = self.rows[notification_id].model_copy(update={"status": status})
+        
+        table = Table()
+        backend = LoopbackBackend()
+        manager = NotificationManager(max_workers=1, queue_size=10)
+        manager.register_channel("sms", SMSService(backend, window_seconds=0))
+        manager.digest = DigestCoalescer(manager._submit, window_seconds=60, rules={"sms": ["subscription_confirmation"]})
+        
+        with patch('src.notifications.notification_manager.notification_service', table):
+            # Como en la ruta: nace reclamada y se encola en proceso
+            manager.enqueue_claimed(table.create("processing"), recipient="+573001234567")
+            manager._queue.join()
+            assert manager.digest.pending() == 1
+            
+            assert manager.drain_pending() == 0
+            manager.wait_idle()
+            manager.stop()
+        
+        assert len(backend.messages()) == 1
+        assert table.rows["notif_1"].status == "sent"
+    
+    @patch('src.notifications.notification_manager.notification_service')
+    def test_enqueue_claimed_releases_when_full(self, mock_notification_service):
+        """Si la cola está llena la reclamada vuelve a pending para que la tome drain_pending"""
+        from src.notifications.notification_manager import NotificationManager
+        from src.models.notification import NotificationResponse
+        
+        notification = NotificationResponse(notification_id="notif_1", user_id="user_test_123",
+                                            type="subscription_confirmation", channel="email", status="processing",
+                                            content="Hola", created_at="2025-01-01T00:00:00")
+        manager = NotificationManager(max_workers=1, queue_size=10)
+        
+        with patch.object(manager, 'enqueue', return_value=False):
+            assert manager.enqueue_claimed(notification) is False
+        
+        mock_notification_service.requeue_notification.assert_called_once_with("notif_1", "processing")
+    
+    def test_enqueue_never_blocks_when_full(self):
+        """Si la cola está llena no bloqueo la petición"""
+        from src.notifications.notification_manager import NotificationManager
+        
+        manager = NotificationManager(max_workers=1, queue_size=1)
+        with patch.object(manager, 'start'):
+            assert manager.enqueue(self._job()) is True
+            assert manager.enqueue(self._job()) is False
+        
+        assert manager.stats()["rejected"] == 1
+
+class TestDigestCoalescer:
+    """Pruebas para los resúmenes por usuario y canal"""
+    
+    def _message(self, i, user_id="user_test_123", channel="sms"):
+        from src.notifications.base import OutboundMessage
+        return OutboundMessage(
+            notification_id=f"notif_{i}",
+            user_id=user_id,
+            channel=channel,
+            recipient="+573001234567",
+            body=f"Movimiento {i}"
+        )
+    
+    def _coalescer(self, emitted, window_seconds=60, max_items=10):
+        from src.notifications.digest import DigestCoalescer
+        return DigestCoalescer(
+            emitted.append,
+            window_seconds=window_seconds,
+            max_items=max_items,
+            rules={"sms": ["subscription_confirmation"]}
+        )
+    
+    def test_rules_by_type_and_channel(self):
+        """Solo se agrupan los tipos configurados para cada canal"""
+        coalescer = self._coalescer([])
+        
+        assert coalescer.accepts("subscription_confirmation", "sms")
+        assert not coalescer.accepts("cancellation_confirmation", "sms")
+        assert not coalescer.accepts("subscription_confirmation", "email")
+    
+    def test_merges_same_user_and_channel(self):
+        """Varias notificaciones del mismo usuario salen en un solo mensaje"""
+        emitted = []
+        coalescer = self._coalescer(emitted)
+        for i in range(3):
+            coalescer.add(self._message(i))
+        coalescer.add(self._message(9, user_id="otro_usuario"))
+        coalescer.flush()
+        
+        assert len(emitted) == 2
+        digest = emitted[0]
+        assert digest.notification_ids == ["notif_0", "notif_1", "notif_2"]
+        assert digest.body.startswith("BTG Pactual: 3 movimientos.")
+        assert len(digest.body) <= 160
+        assert emitted[1].notification_ids == ["notif_9"]
+        assert coalescer.merged == 3
+    
+    def test_window_and_max_items(self):
+        """El resumen sale al vencer la ventana o al llegar al máximo de elementos"""
+        import time
+        emitted = []
+        coalescer = self._coalescer(emitted, window_seconds=0.05, max_items=2)
+        coalescer.add(self._message(0))
+        coalescer.add(self._message(1))
+        assert len(emitted) == 1
+        
+        coalescer.add(self._message(2))
+        deadline = time.monotonic() + 2
+        while len(emitted) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert emitted[1].notification_ids == ["notif_2"]
+    
+    def test_long_sms_batch_is_split_without_losing_text(self):
+        """Con 3 o más SMS largos ninguno se recorta: salen varios resúmenes y cada id va en el que lo incluye"""
+        emitted = []
+        coalescer = self._coalescer(emitted)
+        body = "BTG Pactual: su suscripción al fondo FPV_BTG_PACTUAL_RECAUDADORA por COP $100,000 ha sido exitosa."
+        for i in range(4):
+            message = self._message(i)
+            message.body = f"{body} #{i}"
+            coalescer.add(message)
+        coalescer.flush()
+        
+        sent_ids = [notification_id for message in emitted for notification_id in message.notification_ids]
+        assert sorted(sent_ids) == ["notif_0", "notif_1", "notif_2", "notif_3"]
+        for message in emitted:
+            assert len(message.body) <= 160
+            assert "…" not in message.body
+            for notification_id in message.notification_ids:
+                assert f"#{notification_id[-1]}" in message.body
+    
+    @patch('src.notifications.notification_manager.notification_service')
+    def test_digest_acknowledges_every_notification(self, mock_notification_service):
+        """Al entregar el resumen se marcan como enviadas todas las que agrupa"""
+        from src.notifications.notification_manager import NotificationManager
+        
+        manager = NotificationManager(max_workers=1, queue_size=10)
+        digest = self._coalescer([]).merge([self._message(i) for i in range(3)])
+        manager._on_flush("sms", [digest], [None])
+        
+        mock_notification_service.mark_many.assert_any_call(["notif_0", "notif_1", "notif_2"], "sent")
+
+class TestBatchingChannels:
+    """Pruebas para el envío por lotes de los canales"""
+    
+    def _message(self, i, recipient="test@example.com"):
+        from src.notifications.base import OutboundMessage
+        return OutboundMessage(
+            notification_id=f"notif_{i}",
+            user_id="user_test_123",
+            channel="email",
+            recipient=recipient,
+            body="Mensaje de prueba"
+        )
+    
+    def test_flush_by_size_coalesces_provider_calls(self):
+        """Agrupo mil mensajes en una llamada al proveedor por lote"""
+        from src.notifications.email_service import EmailService
+        from src.notifications.base import LoopbackBackend
+        
+        backend = LoopbackBackend(max_messages=2000)
+        channel = EmailService(backend, batch_size=100, window_seconds=60)
+        futures = [channel.submit(self._message(i)) for i in range(1000)]
+        for future in futures:
+            future.result(timeout=5)
+        
+        assert backend.calls == 10
+        metrics = channel.metrics.snapshot()
+        assert metrics["messages"] == 1000
+        assert metrics["avg_batch_size"] == 100
+    
+    def test_flush_by_time_window(self):
+        """Envío un lote incompleto cuando vence la ventana de tiempo"""
+        from src.notifications.sms_service import SMSService
+        from src.notifications.base import LoopbackBackend
+        
+        backend = LoopbackBackend()
+        channel = SMSService(backend, batch_size=100, window_seconds=0.05)
+        futures = [channel.submit(self._message(i)) for i in range(3)]
+        for future in futures:
+            future.result(timeout=5)
+        
+        assert backend.calls == 1
+        assert len(backend.messages()) == 3
+    
+    def test_http_backend_against_stub_provider(self):
+        """Entrego por HTTP al stub local y reporto errores por mensaje"""
+        from src.notifications.base import HTTPBulkBackend, DeliveryError
+        from src.notifications.email_service import EmailService
+        from src.notifications.stub_provider import start_stub_provider, StubProviderState
+        
+        server = start_stub_provider(state=StubProviderState(fail_recipients={"malo@example.com"}))
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/email/bulk"
+            channel = EmailService(HTTPBulkBackend(url), batch_size=50, window_seconds=60)
+            futures = [channel.submit(self._message(i)) for i in range(49)]
+            failing = channel.submit(self._message(49, recipient="malo@example.com"))
+            
+            for future in futures:
+                future.result(timeout=5)
+            with pytest.raises(DeliveryError):
+                failing.result(timeout=5)
+            assert server.state.calls["email"] == 1
+            assert server.state.messages["email"] == 50
+        finally:
+            server.shutdown()
+    
+    def test_throttled_batches_wait_in_buffer(self):
+        """Sin tokens el lote vuelve al buffer y sale cuando el bucket se recarga"""
+        from src.notifications.email_service import EmailService
+        from src.notifications.base import LoopbackBackend
+        from src.rate_limit import TokenBucket
+        
+        backend = LoopbackBackend()
+        service = EmailService(backend, batch_size=100, window_seconds=0,
+                               rate_buckets=[TokenBucket(rate=200, capacity=10)])
+        futures = [service.submit(self._message(i)) for i in range(30)]
+        for future in futures:
+            future.result(timeout=5)
+        
+        metrics = service.metrics.snapshot()
+        assert service.batch_size == 10
+        assert len(backend.messages()) == 30
+        assert metrics["throttled"] >= 1
+        assert metrics["failures"] == 0
+
@@ -0,0 +1,126 @@
+"""
+Pruebas para la paginación por cursor y la selección de campos
+"""
+import base64
+import pytest
+from decimal import Decimal
+from unittest.mock import patch
+from fastapi import HTTPException
+from src.api.dependencies import encode_cursor, decode_cursor
+from src.services.transaction_service import transaction_service
+from src.services.notification_service import notification_service
+
+class TestCursor:
+    """Pruebas para los cursores opacos"""
+    
+    def test_round_trip(self):
+        """El cursor devuelve la misma clave de DynamoDB"""
+        key = {"transaction_id": "txn_1", "user_id": "user_1", "created_at": "2025-01-01T00:00:00"}
+        
+        cursor = encode_cursor(key)
+        
+        assert "=" not in cursor
+        assert decode_cursor(cursor) == key
+        assert encode_cursor(None) is None
+    
+    def test_tampered_cursor_is_rejected(self):
+        """Un cursor alterado es un 400, no un error interno"""
+        with pytest.raises(HTTPException) as error:
+            decode_cursor("no-es-un-cursor")
+        assert error.value.status_code == 400
+    
+    def test_forged_or_malformed_cursor_is_rejected(self):
+        """Sin la firma de la app el cliente no puede elegir la clave de inicio"""
+        genuine = encode_cursor({"transaction_id": "txn_1"})
+        payload, signature = genuine.split(".")
+        forged_payload = base64.urlsafe_b64encode(b'{"transaction_id":"txn_999"}').decode().rstrip("=")
+        
+        for cursor in (forged_payload, f"{forged_payload}.{signature}", f"{payload}.", f"{payload}.{signature}x!"):
+            with pytest.raises(HTTPException) as error:
+                decode_cursor(cursor)
+            assert error.value.status_code == 400
+        
+        # Firmado pero con una forma que no es una clave de DynamoDB
+        with pytest.raises(HTTPException):
+            decode_cursor(encode_cursor({"transaction_id": {"nested": True}}))
+
+class TestPaginatedEndpoints:
+    """Pruebas para el sobre {items, next_cursor}"""
+    
+    @patch('src.api.routes.fund_service')
+    def test_envelope_and_fields(self, mock_fund_service, client, mock_fund):
+        """Solo se devuelven los campos pedidos y el cursor de la siguiente página"""
+        mock_fund_service.get_funds_page.return_value = ([mock_fund], {"fund_id": "FDO-ACCIONES"})
+        
+        response = client.get("/api/v1/funds?limit=1&fields=fund_id,minimum_amount")
+        body = response.json()
+        
+        assert response.status_code == 200
+        assert body["items"] == [{"fund_id": "FPV_BTG_PACTUAL_RECAUDADORA", "minimum_amount": 75000.0}]
+        assert decode_cursor(body["next_cursor"]) == {"fund_id": "FDO-ACCIONES"}
+        mock_fund_service.get_funds_page.assert_called_once_with(1, None, ["fund_id", "minimum_amount"])
+    
+    @patch('src.api.routes.fund_service')
+    def test_cursor_is_passed_to_the_service(self, mock_fund_service, client):
+        """El cursor recibido se convierte en la clave de inicio"""
+        mock_fund_service.get_funds_page.return_value = ([], None)
+        
+        client.get(f"/api/v1/funds?cursor={encode_cursor({'fund_id': 'DEUDAPRIVADA'})}")
+        
+        assert mock_fund_service.get_funds_page.call_args.args[1] == {"fund_id": "DEUDAPRIVADA"}
+    
+    def test_invalid_parameters(self, client):
+        """Campos desconocidos o límites fuera de rango son errores del cliente"""
+        assert client.get("/api/v1/funds?fields=fund_id,password").status_code == 400
+        assert client.get("/api/v1/funds?limit=0").status_code == 422
+        assert client.get("/api/v1/funds?limit=100000").status_code == 422
+
+class TestServicePages:
+    """Pruebas para las páginas de los servicios"""
+    
+    @patch('src.services.transaction_service.db_service')
+    def test_client_page_uses_date_index(self, mock_db_service):
+        """El cliente lee su página del índice por fecha, de la más reciente a la más antigua"""
+        mock_db_service.query_page.return_value = ([], {"transaction_id": "txn_9"})
+        
+        _, last_key = transaction_service.get_user_transactions_page(
+            "user_1", {"role": "client"}, 25, {"transaction_id": "txn_5"}, ["amount"]
+        )
+        
+        kwargs = mock_db_service.query_page.call_args.kwargs
+        assert kwargs["index_name"] == "user_id-created_at-index"
+        assert kwargs["scan_index_forward"] is False
+        assert kwargs["limit"] == 25
+        assert kwargs["exclusive_start_key"] == {"transaction_id": "txn_5"}
+        assert kwargs["projection"] == ["amount"]
+        assert last_key == {"transaction_id": "txn_9"}
+        mock_db_service.scan_items.assert_not_called()
+    
+    @patch('src.services.transaction_service.archive_service')
+    @patch('src.services.transaction_service.db_service')
+    def test_archive_continues_after_table(self, mock_db_service, mock_archive_service):
+        """Con include_archived el cursor pasa al histórico cuando se agota la tabla"""
+        mock_db_service.query_page.return_value = ([], None)
+        mock_archive_service.read_archived_page.return_value = ([], None)
+        
+        _, last_key = transaction_service.get_user_transactions_page("user_1", limit=10, include_archived=True)
+        assert last_key == {"archive_offset": 0}
+        
+        _, last_key = transaction_service.get_user_transactions_page("user_1", limit=10, exclusive_start_key=last_key)
+        mock_archive_service.read_archived_page.assert_called_once_with("transactions", {"archive_offset": 0}, 10, user_id="user_1")
+        assert last_key is None
+    
+    @patch('src.services.notification_service.db_service')
+    def test_notification_content_brings_template(self, mock_db_service):
+        """Pedir content proyecta también la plantilla para poder renderizarlo"""
+        mock_db_service.query_page.return_value = ([{
+            "notification_id": "notif_1",
+            "template_id": "subscription_confirmation.sms.es",
+            "params": {"fund_name": "DEUDAPRIVADA", "amount": Decimal("50000")}
+        }], None)
+        
+        notifications, _ = notification_service.get_user_notifications_page("user_1", limit=10, fields=["content"])
+        
+        projection = mock_db_service.query_page.call_args.kwargs["projection"]
+        assert {"content", "template_id", "params", "notification_id"} <= set(projection)
+        assert "DEUDAPRIVADA" in notifications[0].content
@@ -0,0 +1,309 @@
+"""
+Pruebas para el portafolio consolidado
+"""
+import time
+import pytest
+from decimal import Decimal
+from unittest.mock import patch
+from botocore.exceptions import ClientError
+from src.services.portfolio_service import portfolio_service
+from src.services.subscription_service import subscription_service
+from src.models.portfolio import PortfolioResponse, PortfolioSummaryResponse
+from src.models.subscription import SubscriptionCreate
+from src.models.transaction import TransactionResponse
+from src.exceptions import BalanceChangedException, PortfolioTimeoutException, UserNotFoundException
+
+def _transaction():
+    return TransactionResponse(
+        transaction_id="txn_1",
+        user_id="user_test_123",
+        type="subscription",
+        fund_id="FPV_BTG_PACTUAL_RECAUDADORA",
+        amount=100000.0,
+        balance_before=500000.0,
+        balance_after=400000.0,
+        status="completed",
+        created_at="2025-01-01T00:00:00"
+    )
+
+def _document(**overrides):
+    """Documento materializado tal como lo devuelve DynamoDB"""
+    document = {
+        "user_id": "user_test_123",
+        "balance": Decimal("400000"),
+        "total_invested": Decimal("150000"),
+        "version": Decimal("7"),
+        "updated_at": "2025-01-02T00:00:00",
+        "positions": {
+            "sub_2": {"subscription_id": "sub_2", "fund_id": "FDO-ACCIONES", "fund_name": "FDO-ACCIONES",
+                      "category": "FIC", "amount": Decimal("50000"), "subscribed_at": "2025-01-02T00:00:00"},
+            "sub_1": {"subscription_id": "sub_1", "fund_id": "FPV_BTG_PACTUAL_RECAUDADORA",
+                      "fund_name": "FPV_BTG_PACTUAL_RECAUDADORA", "category": "FPV",
+                      "amount": Decimal("100000"), "subscribed_at": "2025-01-01T00:00:00"}
+        }
+    }
+    document.update(overrides)
+    return document
+
+def _transaction_cancelled(*codes):
+    """Error de TransactWriteItems con el motivo de cada operación"""
+    return ClientError(
+        {"Error": {"Code": "TransactionCanceledException"},
+         "CancellationReasons": [{"Code": code} for code in codes]},
+        "TransactWriteItems"
+    )
+
+@pytest.fixture
+def services(mock_user):
+    """Fuentes del portafolio con respuestas de prueba"""
+    with patch('src.services.portfolio_service.db_service') as db, \
+         patch('src.services.portfolio_service.user_service') as users, \
+         patch('src.services.portfolio_service.transaction_service') as transactions, \
+         patch('src.services.portfolio_service.notification_service') as notifications:
+        db.get_item.return_value = _document()
+        users.get_user.return_value = mock_user
+        transactions.get_user_transactions_page.return_value = ([_transaction()], None)
+        notifications.get_user_notifications_page.return_value = ([], None)
+        yield {
+            "document": db.get_item,
+            "transactions": transactions.get_user_transactions_page,
+            "notifications": notifications.get_user_notifications_page,
+            "db": db,
+            "user": users.get_user
+        }
+
+class TestPortfolioService:
+    """Pruebas para PortfolioService"""
+    
+    def test_reads_document_and_recent_activity(self, services):
+        """Saldo y posiciones salen del documento; la actividad reciente de sus tablas"""
+        portfolio = portfolio_service.get_portfolio("user_test_123", transactions_limit=5)
+        
+        assert portfolio.balance == 400000.0
+        assert portfolio.total_invested == 150000.0
+        assert portfolio.version == 7
+        assert [position.subscription_id for position in portfolio.positions] == ["sub_1", "sub_2"]
+        assert portfolio.positions[0].category == "FPV"
+        assert portfolio.recent_transactions[0].transaction_id == "txn_1"
+        assert portfolio.unavailable == []
+        services["document"].assert_called_once_with("portfolios", {"user_id": "user_test_123"})
+        services["transactions"].assert_called_once_with("user_test_123", limit=5)
+    
+    def test_sources_are_queried_concurrently(self, services):
+        """La espera total es la de la fuente más lenta, no la suma"""
+        for section in ("document", "transactions", "notifications"):
+            source = services[section]
+            result = source.return_value
+            source.side_effect = lambda *args, result=result, **kwargs: time.sleep(0.2) or result
+        
+        started = time.perf_counter()
+        portfolio_service.get_portfolio("user_test_123")
+        elapsed = time.perf_counter() - started
+        
+        assert elapsed < 0.45  # En serie serían 0.6 s
+    
+    def test_optional_section_failure_is_reported(self, services):
+        """Si fallan las notificaciones el portafolio sale igual, sin ellas"""
+        services["notifications"].side_effect = RuntimeError("throttled")
+        
+        portfolio = portfolio_service.get_portfolio("user_test_123")
+        
+        assert portfolio.unavailable == ["notifications"]
+        assert portfolio.recent_notifications == []
+        assert len(portfolio.positions) == 2
+    
+    def test_required_section_errors_propagate(self, services):
+        """Un usuario inexistente sigue siendo 404"""
+        services["document"].return_value = None
+        services["user"].side_effect = UserNotFoundException("user_test_123")
+        
+        with pytest.raises(UserNotFoundException):
+            portfolio_service.get_portfolio("user_test_123")
+    
+    def test_required_section_timeout(self, services):
+        """Si el documento no llega a tiempo respondo 504"""
+        document = services["document"].return_value
+        services["document"].side_effect = lambda *args: time.sleep(0.3) or document
+        
+        with patch('src.services.portfolio_service.settings') as mock_settings:
+            mock_settings.portfolio_timeout_seconds = 0.05
+            mock_settings.portfolio_recent_items = 10
+            with pytest.raises(PortfolioTimeoutException) as error:
+                portfolio_service.get_portfolio("user_test_123")
+        
+        assert error.value.status_code == 504
+
+class TestMaterializedPortfolio:
+    """Pruebas para el documento materializado y su reconstrucción"""
+    
+    def test_missing_document_is_rebuilt_from_sources(self, services, mock_fund):
+        """Sin documento lo calculo desde las tablas y lo creo solo si nadie lo creó antes"""
+        db = services["db"]
+        db.get_item.return_value = None
+        db.query_items.return_value = [{
+            "subscription_id": "sub_1", "user_id": "user_test_123", "fund_id": mock_fund.fund_id,
+            "amount": Decimal("100000"), "status": "active", "created_at": "2025-01-01T00:00:00"
+        }]
+        db.update_item.side_effect = lambda table, key, expression, values, **kwargs: {
+            "Attributes": {"user_id": "user_test_123", "version": Decimal("1"), "balance": values[":balance"],
+                           "positions": values[":positions"], "total_invested": values[":total_invested"]}
+        }
+        
+        with patch('src.services.portfolio_service.fund_service') as funds:
+            funds.get_all_funds.return_value = [mock_fund]
+            summary = portfolio_service.get_summary("user_test_123")
+        
+        assert summary.version == 1
+        assert summary.balance == 500000.0
+        assert summary.total_invested == 100000.0
+        assert summary.positions[0].fund_name == mock_fund.name
+        assert db.update_item.call_args.kwargs["condition_expression"] == "attribute_not_exists(user_id)"
+    
+    def test_rebuild_retries_when_version_changes(self, services, mock_fund):
+        """Si otra escritura sube la versión durante la reconstrucción, vuelvo a leer y reintento"""
+        db = services["db"]
+        db.get_item.side_effect = [_document(version=Decimal("7")), _document(version=Decimal("8"))]
+        db.query_items.return_value = []
+        db.update_item.side_effect = [
+            ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem"),
+            {"Attributes": _document(version=Decimal("9"), positions={})}
+        ]
+        
+        document = portfolio_service.rebuild_user("user_test_123", {mock_fund.fund_id: mock_fund})
+        
+        assert document["version"] == 9
+        expected_versions = [call.args[3][":version"] for call in db.update_item.call_args_list]
+        assert expected_versions == [Decimal("7"), Decimal("8")]
+    
+    def test_position_change_increments_version_without_reading(self, mock_fund):
+        """La operación sube la versión con ADD y exige que el documento exista"""
+        action, table, params = portfolio_service.position_added({
+            "subscription_id": "sub_1", "user_id": "user_test_123", "fund_id": mock_fund.fund_id,
+            "amount": 100000.0, "created_at": "2025-01-01T00:00:00"
+        }, mock_fund, 400000.0)
+        
+        assert (action, table) == ("Update", "portfolios")
+        assert params["UpdateExpression"].startswith("ADD version :one, total_invested :amount SET ")
+        assert params["ConditionExpression"] == "attribute_exists(positions)"
+        assert params["ExpressionAttributeNames"] == {"#subscription": "sub_1"}
+        assert params["ExpressionAttributeValues"][":balance"] == 400000.0
+
+class TestSubscriptionPortfolioWrites:
+    """Pruebas para la escritura conjunta de suscripción y portafolio"""
+    
+    @patch('src.services.subscription_service.db_service')
+    def test_subscription_and_portfolio_written_in_one_transaction(self, mock_db_service, mock_fund):
+        """La suscripción y su posición se escriben juntas"""
+        subscription_data = SubscriptionCreate(user_id="user_test_123", fund_id=mock_fund.fund_id, amount=100000.0)
+        
+        subscription_service.create_subscription(subscription_data, mock_fund, 400000.0, 500000.0)
+        
+        mock_db_service.transact_write.assert_called_once()
+        operations = mock_db_service.transact_write.call_args.args[0]
+        assert [(action, table) for action, table, _ in operations] == [
+            ("Put", "subscriptions"), ("Update", "portfolios"), ("Update", "users")
+        ]
+        balance = operations[2][2]
+        assert balance["Key"] == {"user_id": "user_test_123"}
+        assert balance["ConditionExpression"] == "balance = :balance_before"
+        assert balance["ExpressionAttributeValues"][":balance"] == 400000.0
+        assert balance["ExpressionAttributeValues"][":balance_before"] == 500000.0
+        mock_db_service.create_item.assert_not_called()
+    
+    @patch('src.services.subscription_service.portfolio_service.rebuild_user')
+    @patch('src.services.subscription_service.db_service')
+    def test_balance_changed_concurrently_is_not_retried(self, mock_db_service, mock_rebuild, mock_fund):
+        """Si otra operación movió el saldo la transacción completa se descarta y no reintento"""
+        mock_db_service.transact_write.side_effect = _transaction_cancelled("None", "None", "ConditionalCheckFailed")
+        subscription_data = SubscriptionCreate(user_id="user_test_123", fund_id=mock_fund.fund_id, amount=100000.0)
+        
+        with pytest.raises(BalanceChangedException):
+            subscription_service.create_subscription(subscription_data, mock_fund, 400000.0, 500000.0)
+        
+        mock_rebuild.assert_not_called()
+        mock_db_service.transact_write.assert_called_once()
+    
+    @patch('src.services.subscription_service.portfolio_service.rebuild_user')
+    @patch('src.services.subscription_service.db_service')
+    def test_missing_document_is_rebuilt_and_write_retried(self, mock_db_service, mock_rebuild, mock_fund):
+        """Si solo falla la condición del portafolio lo reconstruyo y repito la transacción"""
+        mock_db_service.transact_write.side_effect = [_transaction_cancelled("None", "ConditionalCheckFailed"), None]
+        subscription_data = SubscriptionCreate(user_id="user_test_123", fund_id=mock_fund.fund_id, amount=100000.0)
+        
+        subscription_service.create_subscription(subscription_data, mock_fund, 400000.0)
+        
+        mock_rebuild.assert_called_once_with("user_test_123")
+        assert mock_db_service.transact_write.call_count == 2
+    
+    @pytest.mark.parametrize("retry_reasons", [
+        ("None", "None", "ConditionalCheckFailed"),
+        ("None", "ConditionalCheckFailed", "None")
+    ])
+    @patch('src.services.subscription_service.portfolio_service.rebuild_user')
+    @patch('src.services.subscription_service.db_service')
+    def test_conflict_during_retry_is_reported_as_conflict(self, mock_db_service, mock_rebuild, retry_reasons, mock_fund):
+        """Si el saldo o el documento cambian otra vez durante el reintento respondo conflicto, no un error crudo"""
+        mock_db_service.transact_write.side_effect = [
+            _transaction_cancelled("None", "ConditionalCheckFailed", "None"),
+            _transaction_cancelled(*retry_reasons)
+        ]
+        subscription_data = SubscriptionCreate(user_id="user_test_123", fund_id=mock_fund.fund_id, amount=100000.0)
+        
+        with pytest.raises(BalanceChangedException):
+            subscription_service.create_subscription(subscription_data, mock_fund, 400000.0, 500000.0)
+        
+        mock_rebuild.assert_called_once_with("user_test_123")
+        assert mock_db_service.transact_write.call_count == 2
+    
+    @patch('src.services.subscription_service.portfolio_service.rebuild_user')
+    @patch('src.services.subscription_service.db_service')
+    def test_concurrent_cancellation_is_not_retried(self, mock_db_service, mock_rebuild, mock_subscription):
+        """Si otra petición ya canceló la suscripción no reintento ni devuelvo el monto dos veces"""
+        mock_db_service.scan_items.return_value = [mock_subscription.model_dump()]
+        mock_db_service.transact_write.side_effect = _transaction_cancelled("ConditionalCheckFailed", "None")
+        
+        with pytest.raises(ClientError):
+            subscription_service.cancel_subscription("sub_test_123", 600000.0)
+        
+        mock_rebuild.assert_not_called()
+
+class TestPortfolioEndpoint:
+    """Pruebas para GET /users/{user_id}/portfolio"""
+    
+    @patch('src.api.routes.portfolio_service')
+    def test_get_own_portfolio(self, mock_portfolio_service, client, auth_headers):
+        """El cliente ve su propio portafolio"""
+        mock_portfolio_service.get_portfolio.return_value = PortfolioResponse(
+            user_id="user_test_123", balance=500000.0, total_invested=0.0, positions=[], version=1,
+            recent_transactions=[], recent_notifications=[]
+        )
+        
+        response = client.get("/api/v1/users/user_test_123/portfolio?transactions_limit=3", headers=auth_headers)
+        
+        assert response.status_code == 200
+        assert response.json()["balance"] == 500000.0
+        mock_portfolio_service.get_portfolio.assert_called_once_with("user_test_123", 3, None)
+    
+    @patch('src.api.routes.portfolio_service')
+    def test_get_own_portfolio_summary(self, mock_portfolio_service, client, auth_headers):
+        """El resumen sale del documento materializado"""
+        mock_portfolio_service.get_summary.return_value = PortfolioSummaryResponse(
+            user_id="user_test_123", balance=400000.0, total_invested=100000.0, positions=[], version=3
+        )
+        
+        response = client.get("/api/v1/users/user_test_123/portfolio/summary", headers=auth_headers)
+        
+        assert response.status_code == 200
+        assert response.json()["version"] == 3
+        mock_portfolio_service.get_summary.assert_called_once_with("user_test_123")
+    
+    @patch('src.api.routes.portfolio_service')
+    def test_client_cannot_see_other_portfolio(self, mock_portfolio_service, client, auth_headers):
+        """Un cliente no puede ver el portafolio de otro usuario"""
+        response = client.get("/api/v1/users/otro_usuario/portfolio", headers=auth_headers)
+        summary = client.get("/api/v1/users/otro_usuario/portfolio/summary", headers=auth_headers)
+        
+        assert response.status_code == 403
+        assert summary.status_code == 403
+        mock_portfolio_service.get_portfolio.assert_not_called()
+        mock_portfolio_service.get_summary.assert_not_called()
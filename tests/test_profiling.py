@@ -0,0 +1,102 @@
+"""
+Pruebas para Server-Timing y el profiler por muestreo
+"""
+import os
+import threading
+import time
+from unittest.mock import patch
+from src.profiling import RequestTimings, StackSampler, current_timings, profiled
+
+class TestRequestTimings:
+    """Pruebas para la medición por fases"""
+    
+    def test_profiled_records_only_while_measuring(self):
+        """Fuera de una petición medida el decorador no registra nada"""
+        @profiled("db")
+        def query():
+            return "ok"
+        
+        timings = RequestTimings()
+        assert query() == "ok"
+        
+        token = current_timings.set(timings)
+        try:
+            query()
+            query()
+        finally:
+            current_timings.reset(token)
+        
+        assert timings.counts == {"db": 2}
+    
+    def test_server_timing_header(self):
+        """La cabecera separa el endpoint del trabajo de FastAPI y cuenta las llamadas"""
+        timings = RequestTimings()
+        timings.add("route", 0.010)
+        timings.add("handler", 0.004)
+        timings.add("db", 0.001)
+        timings.add("db", 0.002)
+        
+        header = timings.server_timing(0.012)
+        
+        assert 'db;dur=3.00;desc="2 llamadas"' in header
+        assert "framework;dur=6.00" in header
+        assert header.endswith("total;dur=12.00")
+
+class TestServerTimingMiddleware:
+    """Pruebas para ServerTimingMiddleware"""
+    
+    @patch('src.api.routes.fund_service')
+    def test_header_is_opt_in(self, mock_fund_service, client, mock_fund):
+        """Solo con SERVER_TIMING_ENABLED la respuesta trae el desglose"""
+        mock_fund_service.get_funds_page.return_value = ([mock_fund], None)
+        
+        assert "server-timing" not in client.get("/api/v1/funds").headers
+        
+        with patch('src.api.middleware.settings.server_timing_enabled', True):
+            header = client.get("/api/v1/funds").headers["server-timing"]
+        
+        for phase in ("handler", "framework", "serialize", "total"):
+            assert f"{phase};dur=" in header
+    
+    @patch('src.api.routes.fund_service')
+    def test_profile_header_is_admin_only(self, mock_fund_service, client, auth_headers,
+                                          mock_fund, mock_jwt_auth, tmp_path):
+        """La cabecera X-Profile guarda un perfil solo si la pide un admin"""
+        mock_fund_service.get_funds_page.return_value = ([mock_fund], None)
+        headers = {**auth_headers, "X-Profile": "1"}
+        
+        with patch('src.profiling.settings.profile_dir', str(tmp_path)):
+            client.get("/api/v1/funds", headers=headers)
+            assert os.listdir(tmp_path) == []
+            
+            mock_jwt_auth.return_value = {"sub": "admin_1", "email": "admin@example.com", "role": "admin"}
+            response = client.get("/api/v1/funds", headers=headers)
+        
+        assert "server-timing" in response.headers
+        assert len(os.listdir(tmp_path)) == 1
+        assert os.listdir(tmp_path)[0].endswith(".collapsed")
+
+class TestStackSampler:
+    """Pruebas para el profiler por muestreo"""
+    
+    def test_samples_the_target_thread(self, tmp_path):
+        """Las pilas muestreadas incluyen la función que estaba corriendo"""
+        stop = threading.Event()
+        
+        def busy_work():
+            while not stop.is_set():
+                sum(range(1000))
+        
+        worker = threading.Thread(target=busy_work)
+        worker.start()
+        sampler = StackSampler(worker.ident, interval_seconds=0.001).start()
+        time.sleep(0.05)
+        sampler.stop()
+        stop.set()
+        worker.join()
+        
+        path = sampler.write("GET_/api/v1/funds", directory=str(tmp_path))
+        with open(path, encoding="utf-8") as profile:
+            content = profile.read()
+        assert "busy_work" in content
+        assert "GET_api_v1_funds" in os.path.basename(path)
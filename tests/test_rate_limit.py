@@ -0,0 +1,209 @@
+"""
+Pruebas para el token bucket de límites de tasa
+"""
+import asyncio
+import pytest
+from unittest.mock import patch
+from botocore.exceptions import ClientError
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.api.middleware import RateLimitMiddleware
+from src.rate_limit import TokenBucket, acquire_all, InMemoryRateLimitStore, DynamoDBRateLimitStore
+
+class FakeClock:
+    """Reloj controlado para no depender del tiempo real"""
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+class TestTokenBucket:
+    """Pruebas para TokenBucket"""
+    
+    def test_burst_then_wait(self):
+        """Permito la ráfaga y después informo cuánto falta para el siguiente token"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, capacity=5, clock=clock)
+        
+        assert bucket.acquire(5) == 0.0
+        assert bucket.acquire(1) == pytest.approx(0.1)
+        
+        clock.now = 0.1
+        assert bucket.try_acquire(1) is True
+    
+    def test_refill_is_capped(self):
+        """Los tokens no superan la capacidad aunque pase mucho tiempo"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, capacity=5, clock=clock)
+        bucket.acquire(5)
+        
+        clock.now = 100
+        assert bucket.tokens == 5
+    
+    def test_acquire_all_is_all_or_nothing(self):
+        """Si un bucket no alcanza, devuelvo los tokens tomados de los demás"""
+        clock = FakeClock()
+        channel = TokenBucket(rate=100, capacity=100, clock=clock)
+        provider = TokenBucket(rate=10, capacity=10, clock=clock)
+        
+        assert acquire_all([channel, provider], 20) == pytest.approx(1.0)
+        assert channel.tokens == 100
+        assert acquire_all([channel, provider], 10) == 0.0
+        assert channel.tokens == 90
+    
+    def test_rate_must_be_positive(self):
+        """Una tasa en cero no es un límite válido"""
+        with pytest.raises(ValueError):
+            TokenBucket(rate=0)
+
+class TestRateLimitStores:
+    """Pruebas para los almacenes de límites por clave"""
+    
+    def test_memory_store_is_per_key(self):
+        """Cada clave tiene su propio bucket y las menos usadas se descartan"""
+        clock = FakeClock()
+        store = InMemoryRateLimitStore(max_keys=2, clock=clock)
+        
+        assert store.acquire("user:1:default", rate=1, capacity=2) == 0.0
+        assert store.acquire("user:1:default", rate=1, capacity=2) == 0.0
+        assert store.acquire("user:1:default", rate=1, capacity=2) == pytest.approx(1.0)
+        assert store.acquire("user:2:default", rate=1, capacity=2) == 0.0
+        
+        store.acquire("user:3:default", rate=1, capacity=2)
+        assert store.acquire("user:1:default", rate=1, capacity=2) == 0.0
+    
+    @patch('src.rate_limit.db_service')
+    def test_dynamodb_store_is_a_token_bucket(self, mock_db_service):
+        """El bucket compartido no admite el doble de la ráfaga en el borde de una ventana"""
+        clock = FakeClock()
+        clock.now = 1003.0
+        items = {}
+        
+        def update_item(table_name, key, update_expression, values, condition_expression=None):
+            item = items.get(key["limit_key"])
+            if (item["updated_at"] if item else None) != values.get(":previous"):
+                raise ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem")
+            items[key["limit_key"]] = {"tokens": values[":tokens"], "updated_at": values[":updated_at"]}
+        
+        mock_db_service.get_item.side_effect = lambda table_name, key: items.get(key["limit_key"])
+        mock_db_service.update_item.side_effect = update_item
+        store = DynamoDBRateLimitStore(clock=clock)
+        
+        assert [store.acquire("user:1:expensive", rate=0.5, capacity=5) for _ in range(5)] == [0.0] * 5
+        assert store.acquire("user:1:expensive", rate=0.5, capacity=5) == pytest.approx(2.0)
+        
+        # Con ventana fija aquí ya habría otras 5; el bucket solo repuso 0,5 tokens
+        clock.now = 1004.0
+        assert store.acquire("user:1:expensive", rate=0.5, capacity=5) == pytest.approx(1.0)
+        clock.now = 1005.0
+        assert store.acquire("user:1:expensive", rate=0.5, capacity=5) == 0.0
+    
+    @patch('src.rate_limit.db_service')
+    def test_dynamodb_store_retries_concurrent_writes(self, mock_db_service):
+        """Si otra instancia escribió entre mi lectura y mi escritura, vuelvo a leer"""
+        clock = FakeClock()
+        clock.now = 1000.0
+        mock_db_service.get_item.side_effect = [
+            {"tokens": 3, "updated_at": 999.0},
+            {"tokens": 2, "updated_at": 999.5}
+        ]
+        mock_db_service.update_item.side_effect = [
+            ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem"),
+            {}
+        ]
+        store = DynamoDBRateLimitStore(clock=clock)
+        
+        assert store.acquire("user:1:default", rate=1, capacity=5) == 0.0
+        
+        args = mock_db_service.update_item.call_args
+        assert args.args[3][":previous"] == 999.5
+        assert args.args[3][":tokens"] == pytest.approx(1.5)
+        assert args.kwargs["condition_expression"] == "updated_at = :previous"
+
+def build_app(store, **options) -> FastAPI:
+    """App mínima con una ruta normal y una costosa"""
+    app = FastAPI()
+
+    @app.get("/api/v1/funds")
+    async def funds():
+        return []
+
+    @app.get("/api/v1/admin/report")
+    async def report():
+        return {}
+
+    app.add_middleware(RateLimitMiddleware, store=store, **options)
+    return app
+
+class TestRateLimitMiddleware:
+    """Pruebas para RateLimitMiddleware"""
+    
+    def test_limits_per_principal(self, auth_headers):
+        """Al agotar su cupo el usuario recibe 429 con Retry-After; los demás siguen"""
+        client = TestClient(build_app(
+            InMemoryRateLimitStore(clock=FakeClock()),
+            class_limits={"default": {"rate": 0.5, "burst": 2}}
+        ))
+        
+        assert client.get("/api/v1/funds", headers=auth_headers).status_code == 200
+        assert client.get("/api/v1/funds", headers=auth_headers).status_code == 200
+        rejected = client.get("/api/v1/funds", headers=auth_headers)
+        
+        assert rejected.status_code == 429
+        assert rejected.headers["retry-after"] == "2"
+        assert rejected.json()["error"] is True
+        # Sin token se limita por IP, con su propio cupo
+        assert client.get("/api/v1/funds").status_code == 200
+    
+    def test_route_classes(self):
+        """Las rutas se clasifican por prefijo y, si se indica, por método"""
+        middleware = RateLimitMiddleware(None, store=InMemoryRateLimitStore(), route_classes={
+            "/api/v1/admin": "expensive",
+            "GET /api/v1/users": "expensive",
+            "/api/v1/auth": "auth"
+        })
+        
+        assert middleware.route_class_for("GET", "/api/v1/admin/report") == "expensive"
+        assert middleware.route_class_for("GET", "/api/v1/users") == "expensive"
+        assert middleware.route_class_for("POST", "/api/v1/users") == "default"
+        assert middleware.route_class_for("POST", "/api/v1/auth/login") == "auth"
+    
+    def test_concurrency_cap_sheds_load(self):
+        """Sobre el tope de concurrencia la petición se rechaza sin llegar a la ruta"""
+        release = asyncio.Event()
+        calls = []
+        
+        async def slow_app(scope, receive, send):
+            calls.append(scope["path"])
+            await release.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+        
+        middleware = RateLimitMiddleware(
+            slow_app,
+            store=InMemoryRateLimitStore(),
+            route_classes={"/api/v1/admin": "expensive"},
+            class_limits={"expensive": {"rate": 100, "burst": 100, "concurrency": 1}}
+        )
+        
+        async def request():
+            statuses = []
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    statuses.append(message["status"])
+            scope = {"type": "http", "method": "GET", "path": "/api/v1/admin/report",
+                     "headers": [], "client": ("10.0.0.1", 1234)}
+            await middleware(scope, None, send)
+            return statuses[0]
+        
+        async def scenario():
+            first = asyncio.create_task(request())
+            await asyncio.sleep(0)
+            second = await request()
+            release.set()
+            return await first, second
+        
+        assert asyncio.run(scenario()) == (200, 429)
+        assert len(calls) == 1
+        assert middleware.in_flight["expensive"] == 0
@@ -0,0 +1,66 @@
+"""
+Pruebas para la serialización rápida de respuestas
+"""
+import json
+from decimal import Decimal
+from unittest.mock import patch
+from src.api.responses import FastJSONResponse
+from src.models.user import UserResponse
+from src.models.transaction import TransactionResponse
+from src.utils import construct_many
+
+class TestFastJSON:
+    """Pruebas para construct_many y FastJSONResponse"""
+    
+    def test_construct_many_keeps_only_model_fields(self):
+        """Las filas confiables no se validan pero los campos internos no se filtran a la respuesta"""
+        row = {
+            "user_id": "user_1",
+            "email": "test@example.com",
+            "phone": "+573001234567",
+            "balance": Decimal("500000"),
+            "notification_preference": "email",
+            "role": "client",
+            "created_at": "2025-01-01T00:00:00",
+            "updated_at": "2025-01-01T00:00:00",
+            "password_hash": "secreto"
+        }
+        
+        users = construct_many(UserResponse, [row])
+        body = json.loads(FastJSONResponse(users).body)
+        
+        assert body[0]["balance"] == 500000
+        assert "password_hash" not in body[0]
+    
+    def test_matches_validated_serialization(self):
+        """El camino rápido produce el mismo JSON que la validación completa"""
+        row = {
+            "transaction_id": "txn_1",
+            "user_id": "user_1",
+            "type": "subscription",
+            "fund_id": "DEUDAPRIVADA",
+            "amount": Decimal("50000.5"),
+            "balance_before": Decimal("500000"),
+            "balance_after": Decimal("449999.5"),
+            "status": "completed",
+            "created_at": "2025-01-01T00:00:00"
+        }
+        
+        fast = json.loads(FastJSONResponse(construct_many(TransactionResponse, [row])).body)
+        validated = [TransactionResponse(**row).model_dump(mode="json")]
+        
+        assert fast == validated
+    
+    @patch('src.api.routes.transaction_service')
+    def test_list_endpoint_uses_fast_path(self, mock_transaction_service, client, auth_headers):
+        """El endpoint devuelve la lista sin pasar por el response_model"""
+        mock_transaction_service.get_user_transactions_page.return_value = construct_many(TransactionResponse, [{
+            "transaction_id": "txn_1", "user_id": "user_test_123", "type": "subscription",
+            "fund_id": "DEUDAPRIVADA", "amount": Decimal("50000"), "balance_before": Decimal("500000"),
+            "balance_after": Decimal("450000"), "status": "completed", "created_at": "2025-01-01T00:00:00"
+        }]), None
+        
+        response = client.get("/api/v1/transactions/user/user_test_123", headers=auth_headers)
+        
+        assert response.status_code == 200
+        assert response.json()["items"][0]["amount"] == 50000
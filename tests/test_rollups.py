@@ -0,0 +1,117 @@
+"""
+Pruebas para los agregados diarios de transacciones
+"""
+import pytest
+from unittest.mock import Mock, patch
+from botocore.exceptions import ClientError
+from src.services.rollup_service import rollup_service, _estimate_distinct, DISTINCT_REGISTERS
+from src.exceptions import BTGException
+
+def _transaction(user_id, amount, created_at="2025-01-01T10:00:00", fund_id="FDO-ACCIONES", type_="subscription"):
+    return {
+        "transaction_id": f"txn_{user_id}_{amount}",
+        "user_id": user_id,
+        "type": type_,
+        "fund_id": fund_id,
+        "amount": amount,
+        "created_at": created_at
+    }
+
+class TestRollupService:
+    """Pruebas para RollupService"""
+    
+    def test_aggregate_groups_by_day_fund_type(self):
+        """Agrego transacciones por día, fondo y tipo"""
+        accumulators = rollup_service.aggregate([
+            _transaction("user_1", 100000),
+            _transaction("user_2", 300000),
+            _transaction("user_1", 50000),
+            _transaction("user_1", 75000, created_at="2025-01-02T10:00:00")
+        ])
+        
+        day_one = accumulators[("2025-01-01", "FDO-ACCIONES", "subscription")]
+        assert day_one["count"] == 3
+        assert day_one["amount_sum"] == 450000
+        assert day_one["min_amount"] == 50000
+        assert day_one["max_amount"] == 300000
+        assert _estimate_distinct(day_one["registers"]) == 2
+        assert accumulators[("2025-01-02", "FDO-ACCIONES", "subscription")]["count"] == 1
+    
+    def test_distinct_users_item_stays_bounded(self):
+        """El sketch no crece con los usuarios: como mucho un registro por posición"""
+        accumulators = rollup_service.aggregate(
+            _transaction(f"user_{index}", 1000) for index in range(20000)
+        )
+        
+        registers = accumulators[("2025-01-01", "FDO-ACCIONES", "subscription")]["registers"]
+        assert len(registers) <= DISTINCT_REGISTERS
+        assert abs(_estimate_distinct(registers) - 20000) / 20000 < 0.15
+    
+    @patch('src.services.rollup_service.db_service')
+    def test_record_transaction_ignores_conditional_failures(self, mock_db_service):
+        """Ignoro el rechazo condicional cuando el mínimo, el máximo o el registro no mejora"""
+        conditional_error = ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem")
+        mock_db_service.update_item.side_effect = [{}, conditional_error, {}, conditional_error]
+        
+        rollup_service.record_transaction(_transaction("user_1", 100000))
+        
+        assert mock_db_service.update_item.call_count == 4
+        first_call = mock_db_service.update_item.call_args_list[0][0]
+        assert first_call[1] == {"day": "2025-01-01", "rollup_key": "FDO-ACCIONES#subscription"}
+        assert first_call[3][":day_key"] == "2025-01-01#FDO-ACCIONES#subscription"
+        register_call = mock_db_service.update_item.call_args_list[3]
+        assert register_call[0][2] == "SET registers.#register = :value"
+    
+    @patch('src.services.rollup_service.db_service')
+    def test_get_report(self, mock_db_service):
+        """Genero el reporte con una sola consulta por rango sobre el índice ordenado por día"""
+        accumulators = rollup_service.aggregate([_transaction("user_1", 100000), _transaction("user_2", 300000)])
+        registers = accumulators[("2025-01-01", "FDO-ACCIONES", "subscription")]["registers"]
+        mock_db_service.query_pages.return_value = iter([[
+            {"day": "2025-01-01", "fund_id": "FDO-ACCIONES", "type": "subscription", "count": 2,
+             "amount_sum": 400000, "min_amount": 100000, "max_amount": 300000, "registers": registers},
+            # Agregado anterior al sketch: todavía guarda el set de usuarios
+            {"day": "2025-01-02", "fund_id": "FDO-ACCIONES", "type": "subscription", "count": 1,
+             "amount_sum": 75000, "min_amount": 75000, "max_amount": 75000, "user_ids": {"user_1"}}
+        ]])
+        
+        result = rollup_service.get_report("2025-01-01", "2025-01-02")
+        
+        mock_db_service.query_pages.assert_called_once_with(
+            "rollups",
+            "report_scope = :scope AND day_key BETWEEN :date_from AND :date_to",
+            {":scope": "all", ":date_from": "2025-01-01", ":date_to": "2025-01-02~"},
+            index_name="report-index"
+        )
+        assert result.total_count == 3
+        assert result.total_amount == 475000
+        assert result.distinct_users == 2
+        assert [rollup.distinct_users for rollup in result.rollups] == [2, 1]
+    
+    @patch('src.services.rollup_service.archive_service')
+    @patch('src.services.rollup_service.db_service')
+    def test_backfill_includes_archived_transactions(self, mock_db_service, mock_archive_service):
+        """Un día parcialmente archivado se recalcula con lo archivado más lo que sigue en la tabla"""
+        archived = _transaction("user_1", 100000)
+        mock_archive_service.read_archived.return_value = iter([
+            archived,
+            # Fuera del rango: read_archived incluye el límite superior y aquí es exclusivo
+            _transaction("user_3", 10000, created_at="2025-01-02T00:00:00")
+        ])
+        mock_db_service.scan_pages.return_value = iter([[
+            _transaction("user_2", 300000, created_at="2025-01-01T15:00:00"),
+            # Quedó también en la tabla por un archivado interrumpido
+            archived
+        ]])
+        
+        summary = rollup_service.backfill("2025-01-01", "2025-01-01")
+        
+        mock_archive_service.read_archived.assert_called_once_with("transactions", "2025-01-01", "2025-01-02")
+        assert summary == {"transactions": 2, "archived": 1, "rollups_written": 1}
+        item = mock_db_service.batch_create_items.call_args[0][1][0]
+        assert (item["day"], item["count"], item["amount_sum"]) == ("2025-01-01", 2, 400000)
+    
+    def test_get_report_invalid_range(self):
+        """Error cuando el rango de fechas está invertido"""
+        with pytest.raises(BTGException):
+            rollup_service.get_report("2025-01-05", "2025-01-01")
@@ -0,0 +1,89 @@
+"""
+Pruebas para el agrupamiento de lecturas concurrentes (single-flight)
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from src.services.singleflight import SingleFlight, single_flight_groups
+from src.exceptions import FundNotFoundException
+
+def wait_until(predicate, timeout=5):
+    """Espero a que se cumpla la condición sin colgar la prueba si nunca ocurre"""
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+def run_concurrently(group, key, function, callers):
+    """Lanzo varias llamadas y suelto al líder cuando todas están esperando"""
+    release = threading.Event()
+    
+    def blocking():
+        release.wait(5)
+        return function()
+    
+    with ThreadPoolExecutor(max_workers=callers) as executor:
+        futures = [executor.submit(group.do, key, blocking) for _ in range(callers)]
+        # Espero a que los seguidores se sumen a la llamada en curso
+        wait_until(lambda: group.stats()["coalesced"] >= callers - 1)
+        release.set()
+        return [future.exception() or future.result() for future in futures]
+
+class TestSingleFlight:
+    """Pruebas para SingleFlight"""
+    
+    def test_concurrent_calls_share_one_execution(self):
+        """Cinco lecturas iguales hacen una sola llamada y reciben el mismo resultado"""
+        group = SingleFlight("test")
+        calls = []
+        
+        results = run_concurrently(group, "fund:1", lambda: calls.append(1) or {"fund_id": "1"}, 5)
+        
+        assert len(calls) == 1
+        assert all(result is results[0] for result in results)
+        assert group.stats() == {"calls": 1, "coalesced": 4, "in_flight": 0}
+    
+    def test_errors_are_shared(self):
+        """Si la llamada falla, todos los que esperaban reciben el error"""
+        group = SingleFlight("test")
+        
+        def fail():
+            raise FundNotFoundException("NO_EXISTE")
+        
+        results = run_concurrently(group, "fund:x", fail, 3)
+        
+        assert all(isinstance(result, FundNotFoundException) for result in results)
+    
+    def test_sequential_calls_are_not_cached(self):
+        """Terminada la llamada, la siguiente lectura vuelve al backend"""
+        group = SingleFlight("test")
+        calls = []
+        
+        group.do("fund:1", lambda: calls.append(1))
+        group.do("fund:1", lambda: calls.append(1))
+        
+        assert len(calls) == 2
+        assert group.stats()["coalesced"] == 0
+    
+    @patch('src.services.fund_service.db_service')
+    def test_service_reads_are_coalesced(self, mock_db_service):
+        """Las lecturas concurrentes de get_fund comparten un solo GetItem"""
+        from src.services.fund_service import fund_service
+        release = threading.Event()
+        
+        def get_item(table_name, key):
+            release.wait(5)
+            return {"fund_id": key["fund_id"], "name": "DEUDAPRIVADA", "category": "FPV",
+                    "minimum_amount": 50000, "is_active": True, "created_at": "2025-01-01T00:00:00"}
+        mock_db_service.get_item.side_effect = get_item
+        group = single_flight_groups["funds.get_fund"]
+        coalesced_before = group.coalesced
+        
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(fund_service.get_fund, "DEUDAPRIVADA") for _ in range(4)]
+            wait_until(lambda: group.coalesced >= coalesced_before + 3)
+            release.set()
+            funds = [future.result() for future in futures]
+        
+        assert mock_db_service.get_item.call_count == 1
+        assert {fund.fund_id for fund in funds} == {"DEUDAPRIVADA"}
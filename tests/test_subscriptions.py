@@ -69,7 +69,6 @@ class TestSubscriptionEndpoints:
         mock_fund_service.get_fund.return_value = mock_fund
         mock_user_service.get_user.return_value = mock_user
         mock_subscription_service.create_subscription.return_value = mock_subscription
-        mock_user_service.update_balance.return_value = mock_user
         
         subscription_data = {
             "user_id": "user_test_123",
@@ -81,6 +80,10 @@ class TestSubscriptionEndpoints:
         
         assert response.status_code == 201
         assert "subscription_id" in response.json()
+        # El saldo viaja en la transacción de la suscripción, no en una escritura aparte
+        args = mock_subscription_service.create_subscription.call_args.args
+        assert args[2:] == (mock_user.balance - 100000, mock_user.balance)
+        mock_user_service.update_balance.assert_not_called()
     
     @patch('src.api.routes.user_service')
     @patch('src.api.routes.fund_service')
@@ -131,12 +134,15 @@ class TestSubscriptionEndpoints:
         cancelled_subscription = mock_subscription.model_dump()
         cancelled_subscription["status"] = "cancelled"
         mock_subscription_service.cancel_subscription.return_value = cancelled_subscription
-        mock_user_service.update_balance.return_value = mock_user
         
         response = client.delete("/api/v1/subscriptions/sub_test_123", headers=auth_headers)
         
         assert response.status_code == 200
         assert response.json()["status"] == "cancelled"
+        mock_subscription_service.cancel_subscription.assert_called_once_with(
+            "sub_test_123", mock_user.balance + mock_subscription.amount, mock_user.balance
+        )
+        mock_user_service.update_balance.assert_not_called()
     
     def test_create_subscription_unauthorized(self, client):
         """Error cuando no hay autorización"""
@@ -1,6 +1,7 @@
 """
 Pruebas para módulo de transacciones
 """
+import os
 import pytest
 from unittest.mock import Mock, patch
 from fastapi.testclient import TestClient
@@ -52,6 +53,77 @@ class TestTransactionService:
         
         assert len(result) == 1
         assert result[0].user_id == "user_test_123"
+    
+    @patch('src.services.transaction_service.db_service')
+    def test_iter_transactions_filters(self, mock_db_service):
+        """Recorro transacciones por páginas con filtros"""
+        mock_db_service.scan_pages.return_value = iter([[{"transaction_id": "txn_1"}], [{"transaction_id": "txn_2"}]])
+        
+        result = list(transaction_service.iter_transactions(fund_id="FDO-ACCIONES", transaction_type="subscription"))
+        
+        assert [txn["transaction_id"] for txn in result] == ["txn_1", "txn_2"]
+        args = mock_db_service.scan_pages.call_args[0]
+        assert args[1] == "fund_id = :fund_id AND #type = :type"
+        assert args[3] == {"#type": "type"}
+    
+    @patch('src.services.transaction_service.db_service')
+    def test_iter_transactions_includes_whole_date_to_day(self, mock_db_service):
+        """Un date_to de solo fecha incluye todo ese día (límite exclusivo al día siguiente)"""
+        mock_db_service.scan_pages.return_value = iter([])
+        
+        list(transaction_service.iter_transactions(date_from="2025-01-01", date_to="2025-01-31"))
+        
+        args = mock_db_service.scan_pages.call_args[0]
+        assert args[1] == "created_at >= :date_from AND created_at < :date_to"
+        assert args[2] == {":date_from": "2025-01-01", ":date_to": "2025-02-01"}
+    
+    def test_iter_transactions_rejects_invalid_dates(self):
+        """Una fecha mal formada es un 400 antes de empezar a exportar"""
+        from src.exceptions import BTGException
+        with pytest.raises(BTGException) as error:
+            transaction_service.iter_transactions(date_to="31/01/2025")
+        assert error.value.status_code == 400
+
+class TestExportService:
+    """Pruebas para ExportService"""
+    
+    def _rows(self):
+        from decimal import Decimal
+        return [
+            {
+                "transaction_id": f"txn_{i}",
+                "user_id": "user_test_123",
+                "type": "subscription",
+                "fund_id": "FDO-ACCIONES",
+                "amount": Decimal("250000"),
+                "balance_before": Decimal("500000"),
+                "balance_after": Decimal("250000.5"),
+                "status": "completed",
+                "created_at": "2025-01-01T00:00:00"
+            }
+            for i in range(3)
+        ]
+    
+    def test_to_ndjson(self):
+        """Serializo transacciones como NDJSON en bloques"""
+        import json
+        from src.services.export_service import ExportService
+        
+        chunks = list(ExportService(chunk_size=2).to_ndjson(self._rows()))
+        
+        assert len(chunks) == 2
+        lines = "".join(chunks).splitlines()
+        assert json.loads(lines[0])["amount"] == 250000
+        assert json.loads(lines[0])["balance_after"] == 250000.5
+    
+    def test_to_csv(self):
+        """Serializo transacciones como CSV con encabezado"""
+        from src.services.export_service import ExportService
+        
+        lines = "".join(ExportService(chunk_size=2).to_csv(self._rows())).splitlines()
+        
+        assert lines[0].startswith("transaction_id,user_id,type")
+        assert len(lines) == 4
 
 class TestTransactionEndpoints:
     """Pruebas para endpoints de transacciones"""
@@ -66,15 +138,185 @@ class TestTransactionEndpoints:
             "email": "test@example.com",
             "role": "client"
         }
-        mock_transaction_service.get_user_transactions.return_value = []
+        mock_transaction_service.get_user_transactions_page.return_value = ([], None)
         
         response = client.get("/api/v1/transactions/user/user_test_123", headers=auth_headers)
         
         assert response.status_code == 200
-        assert isinstance(response.json(), list)
+        assert response.json() == {"items": [], "next_cursor": None}
     
     def test_get_user_transactions_unauthorized(self, client):
         """Error cuando no hay autorización"""
         response = client.get("/api/v1/transactions/user/user_test_123")
         
         assert response.status_code == 403
+    
+    @patch('src.api.routes.export_service')
+    @patch('src.auth.jwt_handler.JWTHandler.verify_token')
+    def test_export_transactions_csv(self, mock_verify_token, mock_export_service, client, auth_headers):
+        """Exporto transacciones como CSV en streaming"""
+        mock_verify_token.return_value = {"sub": "admin_1", "email": "admin@gtc.com", "role": "admin"}
+        mock_export_service.export_transactions.return_value = iter(["transaction_id\n", "txn_1\n"])
+        
+        response = client.get("/api/v1/admin/transactions/export?format=csv&fund_id=FDO-ACCIONES", headers=auth_headers)
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        assert response.text == "transaction_id\ntxn_1\n"
+    
+    @patch('src.auth.jwt_handler.JWTHandler.verify_token')
+    def test_export_rejects_invalid_date_to(self, mock_verify_token, client, auth_headers):
+        """Una fecha inválida responde 400 en vez de cortar el streaming"""
+        mock_verify_token.return_value = {"sub": "admin_1", "email": "admin@gtc.com", "role": "admin"}
+        
+        response = client.get("/api/v1/admin/transactions/export?date_to=2025-13-45", headers=auth_headers)
+        
+        assert response.status_code == 400
+    
+    def test_export_transactions_requires_admin(self, client, auth_headers):
+        """Error cuando un cliente intenta exportar"""
+        response = client.get("/api/v1/admin/transactions/export", headers=auth_headers)
+        
+        assert response.status_code == 403
+
+class TestArchiveService:
+    """Pruebas para ArchiveService (capa fría)"""
+    
+    @patch('src.services.archive_service.db_service')
+    def test_archive_and_read_with_pruning(self, mock_db_service, tmp_path):
+        """Archivo transacciones antiguas y las leo podando particiones"""
+        from src.services.archive_service import ArchiveService
+        
+        rows = [
+            {"transaction_id": "txn_1", "user_id": "user_1", "created_at": "2020-01-01T10:00:00", "amount": 100000},
+            {"transaction_id": "txn_2", "user_id": "user_2", "created_at": "2020-01-01T11:00:00", "amount": 50000},
+            {"transaction_id": "txn_3", "user_id": "user_1", "created_at": "2020-01-02T10:00:00", "amount": 75000},
+            {"transaction_id": "txn_4", "user_id": "user_1", "created_at": "2020-01-03T10:00:00", "amount": 25000}
+        ]
+        checkpoints = {
+            "user_1": {"checkpoint_at": "2020-01-02T10:00:00", "transaction_id": "txn_3"},
+            "user_2": {"checkpoint_at": "2020-01-01T11:00:00", "transaction_id": "txn_2"}
+        }
+        mock_db_service.scan_pages.return_value = iter([rows])
+        mock_db_service.query_items.side_effect = lambda table, condition, values, **kwargs: [checkpoints[values[":user_id"]]]
+        archive = ArchiveService(archive_dir=str(tmp_path))
+        
+        summary = archive.archive_table("transactions", horizon_days=30)
+        
+        # txn_4 es posterior al último checkpoint de user_1: el ledger todavía la necesita en la tabla
+        assert summary == {"archived": 3, "skipped": 1, "partitions": 2}
+        deleted_keys = mock_db_service.batch_delete_items.call_args[0][1]
+        assert {"transaction_id": "txn_2"} in deleted_keys
+        assert {"transaction_id": "txn_4"} not in deleted_keys
+        
+        # Una instancia nueva lee el índice desde disco
+        reader = ArchiveService(archive_dir=str(tmp_path))
+        assert reader._candidate_partitions("transactions", None, None, "user_2") == ["2020-01-01"]
+        user_rows = list(reader.read_archived("transactions", user_id="user_1"))
+        assert [row["transaction_id"] for row in user_rows] == ["txn_1", "txn_3"]
+        ranged_rows = list(reader.read_archived("transactions", date_from="2020-01-02"))
+        assert [row["transaction_id"] for row in ranged_rows] == ["txn_3"]
+    
+    def test_archived_pages_newest_first_by_partition(self, tmp_path):
+        """El cursor guarda (día, fila): sigue el orden de la tabla y cada página solo lee las particiones que toca"""
+        from src.services.archive_service import ArchiveService
+        
+        archive = ArchiveService(archive_dir=str(tmp_path))
+        os.makedirs(archive._table_dir("transactions"))
+        index = archive.load_index("transactions")
+        for day in ("2020-01-01", "2020-01-02", "2020-01-03"):
+            archive._append_partition("transactions", day, [
+                {"transaction_id": f"txn_{day}_{hour}", "user_id": "user_1", "created_at": f"{day}T{hour}:00:00"}
+                for hour in ("08", "12", "10")
+            ], index)
+        
+        read = []
+        partition_rows = archive._partition_rows
+        def counting_rows(table_name, day):
+            read.append(day)
+            return partition_rows(table_name, day)
+        
+        pages = []
+        cursor = {"archive_offset": 0}
+        with patch.object(archive, '_partition_rows', side_effect=counting_rows):
+            while cursor:
+                read.clear()
+                rows, cursor = archive.read_archived_page("transactions", cursor, 4, user_id="user_1")
+                pages.append(([row["created_at"][:13] for row in rows], list(read), cursor))
+        
+        assert pages[0] == (["2020-01-03T12", "2020-01-03T10", "2020-01-03T08", "2020-01-02T12"],
+                            ["2020-01-03", "2020-01-02"], {"archive_day": "2020-01-02", "archive_offset": 1})
+        assert pages[1] == (["2020-01-02T10", "2020-01-02T08", "2020-01-01T12", "2020-01-01T10"],
+                            ["2020-01-02", "2020-01-01"], {"archive_day": "2020-01-01", "archive_offset": 2})
+        assert pages[2] == (["2020-01-01T08"], ["2020-01-01"], None)
+    
+    @patch('src.services.archive_service.db_service')
+    def test_archive_skips_users_without_checkpoint(self, mock_db_service, tmp_path):
+        """Sin checkpoint del ledger ninguna transacción del usuario sale de la tabla"""
+        from src.services.archive_service import ArchiveService
+        
+        mock_db_service.scan_pages.return_value = iter([[
+            {"transaction_id": "txn_1", "user_id": "user_1", "created_at": "2020-01-01T10:00:00", "amount": 100000}
+        ]])
+        mock_db_service.query_items.return_value = []
+        
+        summary = ArchiveService(archive_dir=str(tmp_path)).archive_table("transactions", horizon_days=30)
+        
+        assert summary == {"archived": 0, "skipped": 1, "partitions": 0}
+        mock_db_service.batch_delete_items.assert_not_called()
+    
+    @patch('src.services.archive_service.db_service')
+    def test_archive_notifications_only_in_final_status(self, mock_db_service, tmp_path):
+        """pending, failed y dead_letter quedan en la tabla para los jobs de envío y reintento"""
+        from src.services.archive_service import ArchiveService
+        
+        mock_db_service.scan_pages.return_value = iter([])
+        
+        ArchiveService(archive_dir=str(tmp_path)).archive_table("notifications", horizon_days=30)
+        
+        filter_expression, values, names = mock_db_service.scan_pages.call_args[0][1:]
+        assert filter_expression == "created_at < :cutoff AND #status IN (:status_0)"
+        assert values[":status_0"] == "sent"
+        assert names == {"#status": "status"}
+    
+    @patch('src.services.transaction_service.archive_service')
+    @patch('src.services.transaction_service.db_service')
+    def test_user_range_reads_archived_partitions_first(self, mock_db_service, mock_archive_service):
+        """El ledger recorre también lo archivado, en orden y sin repetir filas"""
+        archived = [
+            {"transaction_id": "txn_2", "created_at": "2020-01-02T00:00:00"},
+            {"transaction_id": "txn_1", "created_at": "2020-01-01T00:00:00"}
+        ]
+        mock_archive_service.read_archived.return_value = iter(archived)
+        mock_db_service.query_pages.return_value = iter([[
+            {"transaction_id": "txn_2", "created_at": "2020-01-02T00:00:00"},
+            {"transaction_id": "txn_3", "created_at": "2025-01-01T00:00:00"}
+        ]])
+        
+        rows = list(transaction_service.iter_user_transactions_between("user_1", date_to="2025-02-01T00:00:00"))
+        
+        assert [row["transaction_id"] for row in rows] == ["txn_1", "txn_2", "txn_3"]
+        mock_archive_service.read_archived.assert_called_once_with("transactions", None, "2025-02-01T00:00:00", "user_1")
+    
+    @patch('src.services.transaction_service.archive_service')
+    @patch('src.services.transaction_service.db_service')
+    def test_get_user_transactions_include_archived(self, mock_db_service, mock_archive_service):
+        """Incluyo el histórico archivado cuando se solicita"""
+        archived = {
+            "transaction_id": "txn_old",
+            "user_id": "user_test_123",
+            "type": "subscription",
+            "fund_id": "FDO-ACCIONES",
+            "amount": 250000,
+            "balance_before": 500000,
+            "balance_after": 250000,
+            "status": "completed",
+            "created_at": "2020-01-01T00:00:00"
+        }
+        mock_db_service.query_items.return_value = []
+        mock_archive_service.read_archived.return_value = iter([archived])
+        
+        result = transaction_service.get_user_transactions("user_test_123", include_archived=True)
+        
+        assert [txn.transaction_id for txn in result] == ["txn_old"]
+        mock_archive_service.read_archived.assert_called_once_with("transactions", user_id="user_test_123")